@@ -15,6 +15,7 @@ import os
 from dotenv import load_dotenv
 from datetime import timedelta
 import sys
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'users',
     'catalog',
@@ -47,6 +49,7 @@ INSTALLED_APPS = [
     'sales',
     'notifications',
     'dashboard',
+    'promotions',
 
     'rest_framework',
     'corsheaders',
@@ -99,6 +102,16 @@ DATABASES = {
     }
 }
 
+# Per-process memory cache unless CACHE_BACKEND/CACHE_LOCATION name a shared
+# one (e.g. django.core.cache.backends.redis.RedisCache, redis://...), which
+# lets a deletion in one worker reach all of them.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,6 +134,7 @@ AUTH_PASSWORD_VALIDATORS = [
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:3000',
 ]
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 LOGIN_URL = "/login/"
 LOGIN_REDIRECT_URL = "/profile/"
 LOGOUT_REDIRECT_URL = "/login/"
@@ -163,6 +177,62 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 20,
 }
 
+# Receipt/invoice numbers are reserved from the counter table in blocks of
+# this size per worker thread (see sales.utils).
+DOCUMENT_NUMBER_BLOCK_SIZE = int(os.getenv("DOCUMENT_NUMBER_BLOCK_SIZE", "20"))
+
+# How long a POST's stored response is replayed for its Idempotency-Key.
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+# How long a request still in flight holds its key; after that a retry may
+# take it over (the worker is presumed dead). Keep above the slowest POST.
+IDEMPOTENCY_IN_FLIGHT_SECONDS = int(os.getenv("IDEMPOTENCY_IN_FLIGHT_SECONDS", "120"))
+
+# Checkout/void transactions aborted by a deadlock or serialization failure
+# are retried this many times in total, backing off from the base delay (s).
+CONTENTION_RETRY_ATTEMPTS = int(os.getenv("CONTENTION_RETRY_ATTEMPTS", "3"))
+CONTENTION_RETRY_BASE_DELAY = float(os.getenv("CONTENTION_RETRY_BASE_DELAY", "0.05"))
+
+# Owner notifications are written after the sale/stock transaction commits:
+# "thread" hands them to a background writer, "sync" writes them inline.
+NOTIFICATIONS_DISPATCH = os.getenv("NOTIFICATIONS_DISPATCH", "sync" if "test" in sys.argv else "thread")
+# Owner ids are cached in CACHES["default"]. With the per-process default,
+# an owner's role/active change is seen at once by the worker that saved it
+# and by the others once their copy expires after this many seconds.
+NOTIFICATIONS_OWNER_CACHE_SECONDS = int(os.getenv("NOTIFICATIONS_OWNER_CACHE_SECONDS", "300"))
+
+# The cart quote price book is patched by Product signals in-process and
+# fully reloaded after this many seconds to catch other workers' edits.
+PRICE_BOOK_TTL_SECONDS = int(os.getenv("PRICE_BOOK_TTL_SECONDS", "60"))
+
+# Compiled promotion index used at checkout/quote; dropped by Promotion
+# signals in-process and rebuilt after this many seconds regardless.
+PROMOTIONS_TTL_SECONDS = int(os.getenv("PROMOTIONS_TTL_SECONDS", "60"))
+
+# Optional group commit for POST /api/sales/create/: a committer thread per
+# process batches sales arriving within the window (ms) into one transaction.
+SALES_GROUP_COMMIT = os.getenv("SALES_GROUP_COMMIT") == "True"
+SALES_GROUP_COMMIT_WINDOW_MS = float(os.getenv("SALES_GROUP_COMMIT_WINDOW_MS", "5"))
+SALES_GROUP_COMMIT_MAX_BATCH = int(os.getenv("SALES_GROUP_COMMIT_MAX_BATCH", "50"))
+# How long a request waits for the committer before giving up with a 503.
+SALES_GROUP_COMMIT_TIMEOUT_SECONDS = float(os.getenv("SALES_GROUP_COMMIT_TIMEOUT_SECONDS", "30"))
+
+# Which products keep their stock in buckets (Inventory.bucket_count > 0) is
+# cached per process for this many seconds.
+INVENTORY_SHARDS_TTL_SECONDS = int(os.getenv("INVENTORY_SHARDS_TTL_SECONDS", "60"))
+
+# Customer phones are stored normalized: local numbers starting with 0 are
+# rewritten with this country code (see sales.customers).
+CUSTOMER_PHONE_COUNTRY_CODE = os.getenv("CUSTOMER_PHONE_COUNTRY_CODE", "254")
+
+# M-Pesa confirmations are stored on arrival and applied to sales in batches
+# (see sales.mpesa): "thread" by a background worker per process, "sync"
+# right after the insert, "off" only by `manage.py process_mpesa_callbacks`.
+MPESA_CALLBACK_DISPATCH = os.getenv("MPESA_CALLBACK_DISPATCH", "sync" if "test" in sys.argv else "thread")
+MPESA_CALLBACK_BATCH_SIZE = int(os.getenv("MPESA_CALLBACK_BATCH_SIZE", "200"))
+# Shared secret the provider must send as ?token= on the callback URL.
+# Unset, callbacks are refused unless DEBUG is on (local development).
+MPESA_CALLBACK_TOKEN = os.getenv("MPESA_CALLBACK_TOKEN", "")
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
@@ -25,4 +25,5 @@ urlpatterns = [
     path("api/inventory/", include("inventory.urls")),
     path("api/sales/", include("sales.urls")),
     path("api/notifications/", include("notifications.urls")),
+    path("api/promotions/", include("promotions.urls")),
 ]
\ No newline at end of file
@@ -0,0 +1,104 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from sales.models import Sale, SaleItem, Payment
+from inventory.models import StockMovement
+
+# Rows fetched per round trip from the server-side cursor.
+EXPORT_CHUNK_SIZE = 2000
+
+
+# dataset name -> (model, date column used for the range filter, [(header, ORM path), ...])
+DATASETS = {
+    "sales": (Sale, "created_at", [
+        ("id", "id"),
+        ("created_at", "created_at"),
+        ("cashier", "cashier__username"),
+        ("status", "status"),
+        ("payment_type", "payment_type"),
+        ("payment_status", "payment_status"),
+        ("payment_method", "payment_method"),
+        ("subtotal", "subtotal"),
+        ("discount", "discount"),
+        ("total", "total"),
+        ("amount_paid", "amount_paid"),
+        ("due_date", "due_date"),
+        ("customer_name", "customer_name"),
+        ("customer_phone", "customer_phone"),
+    ]),
+    "sale-items": (SaleItem, "sale__created_at", [
+        ("id", "id"),
+        ("sale_id", "sale_id"),
+        ("sale_created_at", "sale__created_at"),
+        ("product_id", "product_id"),
+        ("sku", "sku_snapshot"),
+        ("product_name", "product_name_snapshot"),
+        ("quantity", "quantity"),
+        ("returned_quantity", "returned_quantity"),
+        ("unit_price", "unit_price_snapshot"),
+        ("unit_cost", "unit_cost_snapshot"),
+        ("line_total", "line_total"),
+    ]),
+    "payments": (Payment, "received_at", [
+        ("id", "id"),
+        ("sale_id", "sale_id"),
+        ("method", "method"),
+        ("amount", "amount"),
+        ("reference", "reference"),
+        ("received_by", "received_by__username"),
+        ("received_at", "received_at"),
+    ]),
+    "stock-movements": (StockMovement, "created_at", [
+        ("id", "id"),
+        ("created_at", "created_at"),
+        ("product_id", "product_id"),
+        ("sku", "product__sku"),
+        ("movement_type", "movement_type"),
+        ("direction", "direction"),
+        ("quantity", "quantity"),
+        ("sale_id", "sale_id"),
+        ("unit_cost", "unit_cost"),
+        ("unit_sp", "unit_sp"),
+        ("created_by", "created_by__username"),
+        ("notes", "notes"),
+    ]),
+}
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(dataset: str, start, end):
+    """
+    Headers plus a lazy iterator of value tuples for dataset in [start, end].
+
+    The rows come from a server-side cursor, so only EXPORT_CHUNK_SIZE rows
+    are held in memory at a time however large the range is.
+    """
+    model, date_field, columns = DATASETS[dataset]
+    headers = [header for header, _ in columns]
+    rows = (
+        model.objects.filter(**{f"{date_field}__range": (start, end)})
+        .order_by(date_field, "id")
+        .values_list(*[path for _, path in columns])
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return headers, rows
+
+
+def stream_csv(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + "\n"
@@ -1,3 +1,139 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.models import UserProfile
+from catalog.models import Product
+from inventory.ledger import record_movement
+from inventory.models import StockMovement
+from sales.models import Sale, Invoice
+from sales.services import create_sale, mark_overdue_invoices, void_sale
+
+
+User = get_user_model()
+
+
+class DashboardReportTests(TestCase):
+    BASE = "/api/dashboard/export"
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.cashier = User.objects.create_user(username="cash1", password="pass1234")
+        self.cashier.profile.role = UserProfile.Role.CASHIER
+        self.cashier.profile.save()
+
+        self.owner = User.objects.create_user(username="own", password="pass1234")
+        self.owner.profile.role = UserProfile.Role.OWNER
+        self.owner.profile.save()
+
+        self.product = Product.objects.create(
+            name="Milk",
+            sku="MILK-1",
+            selling_price=Decimal("60.00"),
+            cost_price=Decimal("45.00"),
+            is_active=True,
+        )
+        record_movement(
+            product=self.product,
+            movement_type=StockMovement.MovementType.SUPPLY,
+            direction=StockMovement.Direction.IN,
+            quantity=50,
+            created_by=self.owner,
+        )
+        self.sales = [
+            create_sale(
+                cashier=self.cashier,
+                payment_method=Sale.PaymentMethod.CASH,
+                items=[{"product_id": self.product.id, "quantity": 2}],
+            )
+            for _ in range(3)
+        ]
+
+    def _body(self, res):
+        return b"".join(res.streaming_content).decode()
+
+    def test_sales_export_streams_csv_for_date_range(self):
+        self.client.force_authenticate(user=self.owner)
+        today = timezone.localdate().isoformat()
+
+        res = self.client.get(f"{self.BASE}/sales/", {"date_from": today, "date_to": today})
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res["Content-Type"], "text/csv")
+
+        rows = list(csv.DictReader(io.StringIO(self._body(res))))
+        self.assertEqual([int(r["id"]) for r in rows], [s.id for s in self.sales])
+        self.assertEqual(rows[0]["total"], "120.00")
+        self.assertEqual(rows[0]["cashier"], "cash1")
+
+        res = self.client.get(f"{self.BASE}/sales/", {"date_from": "2020-01-01", "date_to": "2020-01-31"})
+        self.assertEqual(len(self._body(res).splitlines()), 1)  # header only
+
+    def test_stock_movement_export_as_ndjson_and_owner_only(self):
+        self.client.force_authenticate(user=self.owner)
+        res = self.client.get(f"{self.BASE}/stock-movements/", {"output": "ndjson"})
+        self.assertEqual(res.status_code, 200)
+
+        lines = [json.loads(line) for line in self._body(res).splitlines()]
+        self.assertEqual([line["movement_type"] for line in lines], ["SUPPLY", "SALE", "SALE", "SALE"])
+        self.assertEqual(lines[1]["sale_id"], self.sales[0].id)
+
+        self.assertEqual(self.client.get(f"{self.BASE}/refunds/").status_code, 404)
+        self.assertEqual(self.client.get(f"{self.BASE}/sales/", {"output": "xlsx"}).status_code, 400)
+
+        self.client.force_authenticate(user=self.cashier)
+        self.assertEqual(self.client.get(f"{self.BASE}/sales/").status_code, 403)
+
+    def test_receivables_aging_groups_unsettled_balances_by_days_past_due(self):
+        today = timezone.localdate()
+        for days_ago, qty in [(-5, 1), (10, 2), (45, 1), (120, 3)]:
+            create_sale(
+                cashier=self.cashier,
+                payment_type=Sale.PaymentType.CREDIT,
+                due_date=today - timedelta(days=days_ago),
+                items=[{"product_id": self.product.id, "quantity": qty}],
+            )
+        Invoice.objects.filter(due_date=today - timedelta(days=10)).update(status=Invoice.Status.OVERDUE)
+
+        self.client.force_authenticate(user=self.owner)
+        with self.assertNumQueries(1):
+            res = self.client.get("/api/dashboard/receivables-aging/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            [(b["bucket"], b["count"], b["balance"]) for b in res.data["buckets"]],
+            [("0-30", 2, "180.00"), ("31-60", 1, "60.00"), ("61-90", 0, "0.00"), ("90+", 1, "180.00")],
+        )
+        self.assertEqual(res.data["total"], "420.00")
+
+    def test_voided_credit_sales_are_not_swept_overdue_or_aged(self):
+        today = timezone.localdate()
+        voided, legacy = [
+            create_sale(
+                cashier=self.cashier,
+                payment_type=Sale.PaymentType.CREDIT,
+                due_date=today - timedelta(days=45),
+                items=[{"product_id": self.product.id, "quantity": 1}],
+            )
+            for _ in range(2)
+        ]
+        void_sale(sale_id=voided.id, voided_by=self.owner)
+        self.assertEqual(Invoice.objects.get(sale=voided).status, Invoice.Status.CANCELLED)
+
+        # Voided before void_sale cancelled invoices: still OPEN.
+        Sale.objects.filter(pk=legacy.pk).update(status=Sale.Status.VOIDED)
+
+        self.assertEqual(mark_overdue_invoices(), 0)
+        self.assertEqual(Invoice.objects.get(sale=legacy).status, Invoice.Status.OPEN)
 
-# Create your tests here.
+        self.client.force_authenticate(user=self.owner)
+        res = self.client.get("/api/dashboard/receivables-aging/")
+        self.assertEqual(res.data["total"], "0.00")
+        self.assertEqual([b["count"] for b in res.data["buckets"]], [0, 0, 0, 0])
@@ -6,6 +6,8 @@ from .views import (
     CashierPerformanceAPIView,
     InventoryHealthAPIView,
     RecentActivityAPIView,
+    ExportAPIView,
+    ReceivablesAgingAPIView,
     CashierSummaryAPIView,
     CashierSalesTrendAPIView,
     CashierRecentSalesAPIView,
@@ -18,6 +20,8 @@ urlpatterns = [
     path("cashiers/", CashierPerformanceAPIView.as_view()),
     path("inventory-health/", InventoryHealthAPIView.as_view()),
     path("recent-activity/", RecentActivityAPIView.as_view()),
+    path("export/<str:dataset>/", ExportAPIView.as_view()),
+    path("receivables-aging/", ReceivablesAgingAPIView.as_view()),
     path("cashier/summary/", CashierSummaryAPIView.as_view()),
     path("cashier/sales-trend/", CashierSalesTrendAPIView.as_view()),
     path("cashier/recent-sales/", CashierRecentSalesAPIView.as_view()),
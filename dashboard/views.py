@@ -1,15 +1,19 @@
 from datetime import timedelta
+from decimal import Decimal
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Sum, Count, F, DecimalField
+from django.db.models import Case, Count, DecimalField, F, Sum, Value, When
 from django.db.models.functions import TruncDay, TruncMonth
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
 from users.permissions import IsOwner, IsCashier
-from sales.models import Sale, SaleItem
+from sales.models import Sale, SaleItem, Invoice
+from sales.serializers import SaleSummarySerializer, attach_sale_relations, parse_sale_list_params
 from inventory.models import Inventory, StockMovement
 from notifications.models import Notification
+from .exports import DATASETS, export_rows, stream_csv, stream_ndjson
 
 
 def _date_range_from_query(request):
@@ -251,98 +255,88 @@ class RecentActivityAPIView(APIView):
                 "created_at": n.created_at,
             } for n in notifs],
         })
-    
-from django.db.models import Sum, Count
-from django.db.models.functions import TruncDay, TruncMonth
 
-from users.permissions import IsCashier
-from sales.models import Sale
 
+AGING_BUCKETS = [("0-30", 30), ("31-60", 60), ("61-90", 90)]
 
-class CashierSummaryAPIView(APIView):
-    permission_classes = [IsAuthenticated, IsCashier]
+
+class ReceivablesAgingAPIView(APIView):
+    """
+    Outstanding credit by days past the invoice due date:
+    0-30 (including not yet due), 31-60, 61-90, 90+.
+    One grouped query over unsettled (OPEN/OVERDUE) invoices.
+    """
+    permission_classes = [IsAuthenticated, IsOwner]
 
     def get(self, request):
-        start, end = _date_range_from_query(request)
+        today = timezone.localdate()
 
-        qs = Sale.objects.filter(
-            cashier=request.user,
-            created_at__range=(start, end),
-            status=Sale.Status.COMPLETED,
+        bucket = Case(
+            *[When(due_date__gte=today - timedelta(days=days), then=Value(name)) for name, days in AGING_BUCKETS],
+            default=Value("90+"),
         )
-
-        totals = qs.aggregate(
-            revenue=Sum("total"),
-            sales_count=Count("id"),
+        rows = (
+            Invoice.objects.filter(
+                status__in=[Invoice.Status.OPEN, Invoice.Status.OVERDUE],
+                sale__status=Sale.Status.COMPLETED,
+            )
+            .annotate(bucket=bucket)
+            .values("bucket")
+            .annotate(
+                count=Count("id"),
+                balance=Sum(
+                    F("sale__total") - F("sale__amount_paid"),
+                    output_field=DecimalField(max_digits=14, decimal_places=2),
+                ),
+            )
+            .order_by()
         )
-        revenue = totals["revenue"] or 0
-        sales_count = totals["sales_count"] or 0
-        avg_sale = (revenue / sales_count) if sales_count else 0
-
-        return Response({
-            "range": {"from": start, "to": end},
-            "revenue": str(revenue),
-            "sales_count": sales_count,
-            "avg_sale": str(avg_sale),
-        })
+        by_bucket = {r["bucket"]: r for r in rows}
 
+        buckets = []
+        total = Decimal("0.00")
+        for name in [name for name, _ in AGING_BUCKETS] + ["90+"]:
+            row = by_bucket.get(name, {})
+            balance = row.get("balance") or Decimal("0.00")
+            total += balance
+            buckets.append({"bucket": name, "count": row.get("count", 0), "balance": str(balance)})
 
-class CashierSalesTrendAPIView(APIView):
-    permission_classes = [IsAuthenticated, IsCashier]
+        return Response({"as_of": today, "buckets": buckets, "total": str(total)})
 
-    def get(self, request):
-        start, end = _date_range_from_query(request)
-        period = request.query_params.get("period", "day") 
-
-        qs = Sale.objects.filter(
-            cashier=request.user,
-            created_at__range=(start, end),
-            status=Sale.Status.COMPLETED,
-        )
 
-        trunc = TruncMonth("created_at") if period == "month" else TruncDay("created_at")
+class ExportAPIView(APIView):
+    """
+    Streams a dataset (sales, sale-items, payments, stock-movements) for a
+    date range.
+      ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD  (or ?days=30)
+      ?output=csv (default) | ndjson
+    """
+    permission_classes = [IsAuthenticated, IsOwner]
 
-        rows = (
-            qs.annotate(bucket=trunc)
-              .values("bucket")
-              .annotate(
-                  revenue=Sum("total"),
-                  count=Count("id"),
-              )
-              .order_by("bucket")
-        )
+    def perform_content_negotiation(self, request, force=False):
+        # The body is CSV/NDJSON whatever the Accept header says.
+        return super().perform_content_negotiation(request, force=True)
 
-        return Response({
-            "range": {"from": start, "to": end},
-            "period": period,
-            "data": [{
-                "bucket": r["bucket"],
-                "revenue": str(r["revenue"] or 0),
-                "count": r["count"],
-            } for r in rows],
-        })
+    def get(self, request, dataset):
+        if dataset not in DATASETS:
+            return Response({"detail": "Unknown dataset."}, status=404)
 
+        output = request.query_params.get("output", "csv")
+        if output not in ("csv", "ndjson"):
+            return Response({"detail": "output must be csv or ndjson."}, status=400)
 
-class CashierRecentSalesAPIView(APIView):
-    permission_classes = [IsAuthenticated, IsCashier]
+        start, end = _date_range_from_query(request)
+        headers, rows = export_rows(dataset, start, end)
 
-    def get(self, request):
-        limit = request.query_params.get("limit", 20)
-        try:
-            limit = int(limit)
-        except ValueError:
-            limit = 20
+        if output == "csv":
+            response = StreamingHttpResponse(stream_csv(headers, rows), content_type="text/csv")
+        else:
+            response = StreamingHttpResponse(stream_ndjson(headers, rows), content_type="application/x-ndjson")
 
-        qs = (
-            Sale.objects.filter(cashier=request.user)
-            .select_related("receipt")
-            .prefetch_related("items__product")
-            .order_by("-created_at")[:limit]
-        )
+        filename = f"{dataset}-{start.date()}-{end.date()}.{output}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
 
-        from sales.serializers import SaleDetailSerializer
-        return Response(SaleDetailSerializer(qs, many=True).data)
-    
 
 class CashierSummaryAPIView(APIView):
     permission_classes = [IsAuthenticated, IsCashier]
@@ -418,12 +412,11 @@ class CashierRecentSalesAPIView(APIView):
         except ValueError:
             limit = 20
 
-        qs = (
+        fields, include = parse_sale_list_params(request.query_params)
+        rows = list(
             Sale.objects.filter(cashier=request.user)
-            .select_related("receipt")
-            .prefetch_related("items__product")
-            .order_by("-created_at")[:limit]
+            .order_by("-created_at", "-id")
+            .values(*SaleSummarySerializer.value_columns(fields))[:limit]
         )
-
-        from sales.serializers import SaleDetailSerializer
-        return Response(SaleDetailSerializer(qs, many=True).data)
+        rows = attach_sale_relations(rows, include)
+        return Response(SaleSummarySerializer(rows, many=True, fields=fields, include=include).data)
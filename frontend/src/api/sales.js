@@ -2,7 +2,10 @@ import { api } from "./client";
 
 export const salesApi = {
   list: (params) => api.get("/api/sales/", { params }),
-  create: (payload) => api.post("/api/sales/create/", payload),
+  create: (payload, idempotencyKey) =>
+    api.post("/api/sales/create/", payload, {
+      headers: idempotencyKey ? { "Idempotency-Key": idempotencyKey } : {},
+    }),
   detail: (id) => api.get(`/api/sales/${id}/`),
   voidSale: (id, payload) => api.post(`/api/sales/${id}/void/`, payload),
 };
\ No newline at end of file
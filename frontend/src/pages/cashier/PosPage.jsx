@@ -1,5 +1,5 @@
 // pages/cashier/PosPage.jsx
-import React, { useEffect, useMemo, useState } from "react";
+import React, { useEffect, useMemo, useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { catalogApi } from "../../api/catalog";
 import { salesApi } from "../../api/sales";
@@ -30,6 +30,9 @@ export default function PosPage() {
 
   const [qtyDraft, setQtyDraft] = useState({});
 
+  // Same cart + payment => same key, so a retried checkout is not charged twice.
+  const checkoutKey = useRef({ body: null, key: null });
+
   const [search, setSearch] = useState("");
   const [results, setResults] = useState([]);
   const [searching, setSearching] = useState(false);
@@ -192,8 +195,14 @@ export default function PosPage() {
         items: cart.map((row) => ({ product_id: row.product.id, quantity: row.quantity })),
       };
 
-      const res = await salesApi.create(payload);
+      const body = JSON.stringify(payload);
+      if (checkoutKey.current.body !== body) {
+        checkoutKey.current = { body, key: crypto.randomUUID() };
+      }
+
+      const res = await salesApi.create(payload, checkoutKey.current.key);
       setOk(res.data);
+      checkoutKey.current = { body: null, key: null };
 
       setCart([]);
       setQtyDraft({});
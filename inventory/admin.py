@@ -3,7 +3,7 @@ from .models import Inventory, StockMovement
 
 @admin.register(Inventory)
 class InventoryAdmin(admin.ModelAdmin):
-    list_display = ("product", "quantity", "reorder_threshold_percent", "reorder_level", "low_stock_flag", "updated_at")
+    list_display = ("product", "quantity", "reorder_threshold_percent", "reorder_level", "low_stock_flag", "bucket_count", "updated_at")
     search_fields = ("product__name", "product__sku")
     list_filter = ("low_stock_flag",)
 
@@ -0,0 +1,111 @@
+import functools
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+logger = logging.getLogger(__name__)
+
+# deadlock_detected, serialization_failure
+RETRYABLE_SQLSTATES = {"40P01", "40001"}
+
+_lock = threading.Lock()
+_stats: dict[int, dict] = {}
+_retries_by_sqlstate: dict[str, int] = {}
+_local = threading.local()
+
+
+def _entry(product_id: int) -> dict:
+    entry = _stats.get(product_id)
+    if entry is None:
+        entry = _stats[product_id] = {
+            "lock_acquisitions": 0,
+            "lock_wait_seconds": 0.0,
+            "max_lock_wait_seconds": 0.0,
+            "retries": 0,
+        }
+    return entry
+
+
+def record_lock_wait(product_ids, seconds: float) -> None:
+    """
+    Count one row-lock acquisition for each product. The wait is for the
+    whole locking statement, so it is charged to every product in it.
+    """
+    product_ids = list(product_ids)
+    _local.locked = product_ids
+    with _lock:
+        for pid in product_ids:
+            entry = _entry(pid)
+            entry["lock_acquisitions"] += 1
+            entry["lock_wait_seconds"] += seconds
+            entry["max_lock_wait_seconds"] = max(entry["max_lock_wait_seconds"], seconds)
+
+
+def _record_retry(product_ids, sqlstate: str) -> None:
+    with _lock:
+        _retries_by_sqlstate[sqlstate] = _retries_by_sqlstate.get(sqlstate, 0) + 1
+        for pid in product_ids:
+            _entry(pid)["retries"] += 1
+
+
+def contention_snapshot() -> dict[int, dict]:
+    """
+    Per-product counters for this process since start-up (or reset).
+    """
+    with _lock:
+        return {pid: dict(entry) for pid, entry in _stats.items()}
+
+
+def retry_counts() -> dict[str, int]:
+    """
+    Retries this process has made, by SQLSTATE (40P01 deadlock, 40001
+    serialization failure).
+    """
+    with _lock:
+        return dict(_retries_by_sqlstate)
+
+
+def reset_contention_stats() -> None:
+    with _lock:
+        _stats.clear()
+        _retries_by_sqlstate.clear()
+
+
+def is_retryable(exc: Exception) -> bool:
+    return getattr(exc.__cause__, "pgcode", None) in RETRYABLE_SQLSTATES
+
+
+def retry_on_contention(func):
+    """
+    Re-run a transactional service when the database aborts it with a
+    deadlock or serialization failure, with bounded exponential backoff.
+
+    Must wrap the outermost transaction.atomic: when called inside an
+    already-open transaction the error is re-raised for the owner of that
+    transaction to handle.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        attempts = max(1, int(getattr(settings, "CONTENTION_RETRY_ATTEMPTS", 3)))
+        base_delay = float(getattr(settings, "CONTENTION_RETRY_BASE_DELAY", 0.05))
+
+        for attempt in range(1, attempts + 1):
+            _local.locked = []
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if not is_retryable(exc) or connection.in_atomic_block or attempt == attempts:
+                    raise
+                locked = getattr(_local, "locked", [])
+                _record_retry(locked, exc.__cause__.pgcode)
+                logger.warning(
+                    "%s aborted by %s (attempt %s/%s, products %s); retrying",
+                    func.__name__, exc.__cause__.pgcode, attempt, attempts, locked,
+                )
+                time.sleep(base_delay * (2 ** (attempt - 1)) * (1 + random.random()))
+
+    return wrapper
@@ -0,0 +1,192 @@
+"""
+Stock ledger: writes StockMovements and applies them to Inventory.
+
+A batch of movements is inserted with one bulk INSERT and its net effect
+per product is applied with one statement (update_stock):
+
+    WITH locked AS (SELECT ... ORDER BY product_id FOR UPDATE)
+    UPDATE inventory SET quantity = quantity + delta, low_stock_flag = ...
+     WHERE quantity + delta >= 0
+    RETURNING ...
+
+A decrement that would take a product below zero simply matches no row,
+and the CHECK (quantity >= 0) that PositiveIntegerField gives the column
+backs that up in the database. Rows are locked in product id order, like lock_inventories, so
+overlapping batches queue instead of deadlocking.
+
+Bucketed (hot) products take their delta in their buckets first; the same
+statement then rewrites their quantity as the bucket sum. A row that turns
+out to be bucketed without the caller knowing (a stale
+sharded_product_ids cache) is left alone by the UPDATE and redone through
+its buckets.
+"""
+import time
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from catalog.models import Product
+from notifications.models import Notification
+from notifications.services import notify_owners
+from .contention import record_lock_wait
+from .models import Inventory, InventoryBucket, StockMovement
+from .sharding import add_to_buckets, invalidate_sharded_products, sharded_product_ids, take_from_buckets
+from .utils import REORDER_POINT_SQL, reorder_point
+
+
+class StockConflict(ValueError):
+    pass
+
+
+def update_stock(deltas: dict[int, int], bucketed=frozenset()) -> dict[int, tuple[int, bool, bool]]:
+    """
+    Add signed deltas to the quantity of each product's inventory in one
+    statement and re-evaluate its low-stock flag.
+
+    deltas: {product_id: signed_delta}
+    bucketed: product ids whose delta has already gone to their buckets;
+      their quantity becomes the bucket sum.
+
+    Returns {product_id: (quantity, low_stock_flag, low_stock_flag before)}.
+    Raises StockConflict if any product lacks the stock for its decrement;
+    the other rows are already updated, so the caller's transaction (or
+    savepoint) must roll back.
+    """
+    rows = _update_rows(deltas, bucketed)
+    _check_applied(deltas, rows)
+    return rows
+
+
+def _update_rows(deltas: dict[int, int], bucketed) -> dict[int, tuple[int, bool, bool]]:
+    """The UPDATE behind update_stock; products it could not apply are missing from the result."""
+    if not deltas:
+        return {}
+
+    inventories = Inventory._meta.db_table
+    buckets = InventoryBucket._meta.db_table
+    new_quantity = (
+        "CASE WHEN d.in_buckets "
+        f"THEN COALESCE((SELECT SUM(b.quantity) FROM {buckets} b WHERE b.inventory_id = i.id), 0) "
+        "ELSE i.quantity + d.delta END"
+    )
+    sql = f"""
+        WITH d (product_id, delta, in_buckets) AS (VALUES {", ".join(["(%s, %s, %s)"] * len(deltas))}),
+        locked AS (
+            SELECT i.id, i.low_stock_flag AS was_low
+            FROM {inventories} i JOIN d ON d.product_id = i.product_id
+            ORDER BY i.product_id
+            FOR UPDATE OF i
+        )
+        UPDATE {inventories} AS i
+        SET quantity = {new_quantity},
+            low_stock_flag = ({new_quantity}) <= {REORDER_POINT_SQL},
+            updated_at = %s
+        FROM d, locked
+        WHERE d.product_id = i.product_id AND locked.id = i.id
+          AND (d.in_buckets OR (i.bucket_count = 0 AND i.quantity + d.delta >= 0))
+        RETURNING i.product_id, i.quantity, i.low_stock_flag, locked.was_low
+    """
+    params = [value for pid, delta in deltas.items() for value in (pid, delta, pid in bucketed)]
+
+    started = time.monotonic()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [timezone.now()])
+        rows = {pid: (quantity, low, was_low) for pid, quantity, low, was_low in cursor.fetchall()}
+    record_lock_wait(deltas, time.monotonic() - started)
+    return rows
+
+
+def _check_applied(deltas: dict[int, int], rows: dict) -> None:
+    short = set(deltas) - set(rows)
+    if short:
+        skus = sorted(Product.objects.filter(id__in=short).values_list("sku", flat=True))
+        raise StockConflict(f"Insufficient stock for {', '.join(skus) or sorted(short)}.")
+
+
+def record_movements(movements: list[StockMovement]) -> list[StockMovement]:
+    """
+    Save movements and apply them to stock: one INSERT for the movements and
+    one UPDATE for their net effect per product (plus the bucket writes of
+    hot products). Runs in the caller's transaction if there is one.
+
+    Raises StockConflict, saving nothing, if an OUT movement would take a
+    product below zero. Owners hear about products that went low once the
+    transaction commits.
+    """
+    net = {}
+    for m in movements:
+        sign = 1 if m.direction == StockMovement.Direction.IN else -1
+        net[m.product_id] = net.get(m.product_id, 0) + sign * m.quantity
+
+    with transaction.atomic():
+        bucketed = _apply_to_buckets(net, sharded_product_ids())
+        deltas = {pid: delta for pid, delta in net.items() if delta or pid in bucketed}
+        rows = _update_rows(deltas, bucketed)
+
+        missed = set(deltas) - set(rows)
+        if missed:
+            # Bucketed since this process last loaded sharded_product_ids().
+            stale = set(
+                Inventory.objects.filter(product_id__in=missed, bucket_count__gt=0).values_list("product_id", flat=True)
+            )
+            if stale:
+                invalidate_sharded_products()
+                redo = {pid: deltas[pid] for pid in stale}
+                rows.update(_update_rows(redo, _apply_to_buckets(redo, stale)))
+        _check_applied(deltas, rows)
+
+        StockMovement.objects.bulk_create(movements)
+
+        went_low = [pid for pid, (_, low, was_low) in rows.items() if low and not was_low]
+        if went_low:
+            notify_low_stock(list(Inventory.objects.select_related("product").filter(product_id__in=went_low)))
+    return movements
+
+
+def record_movement(**fields) -> StockMovement:
+    """record_movements for a single movement, e.g. record_movement(product=..., direction=..., ...)."""
+    return record_movements([StockMovement(**fields)])[0]
+
+
+def _apply_to_buckets(net: dict[int, int], hot) -> set[int]:
+    """
+    Put the deltas of the hot products that really are bucketed into their
+    buckets. Their Inventory rows are locked first, so a product cannot be
+    folded back into a single row meanwhile. Returns the product ids
+    handled here.
+    """
+    hot = net.keys() & hot
+    if not hot:
+        return set()
+
+    rows = (
+        Inventory.objects.select_for_update()
+        .filter(product_id__in=hot, bucket_count__gt=0)
+        .order_by("product_id")
+        .values_list("product_id", "id")
+    )
+    bucketed = set()
+    for pid, inventory_id in rows:
+        delta = net[pid]
+        if delta > 0:
+            add_to_buckets(inventory_id, delta)
+        elif delta < 0 and not take_from_buckets(inventory_id, -delta):
+            sku = Product.objects.filter(id=pid).values_list("sku", flat=True).first()
+            raise StockConflict(f"Insufficient stock for {sku}: tried to subtract {-delta}.")
+        bucketed.add(pid)
+    return bucketed
+
+
+def notify_low_stock(inventories: list[Inventory]) -> None:
+    """
+    Queue a LOW_STOCK notification to owners for each inventory.
+    """
+    for inv in inventories:
+        notify_owners(
+            Notification.Type.LOW_STOCK,
+            (
+                f"Low stock: {inv.product.name} ({inv.product.sku}). "
+                f"Qty: {inv.quantity} (<= {reorder_point(inv)})"
+            ),
+            product_id=inv.product_id,
+        )
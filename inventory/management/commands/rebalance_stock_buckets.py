@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.services import rebalance_stock_buckets
+
+
+class Command(BaseCommand):
+    help = (
+        "Even out the stock buckets of hot SKUs and re-sync their Inventory.quantity. "
+        "Run every few seconds (--interval) alongside the web workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, help="Repeat every N seconds instead of running once.")
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            respread = rebalance_stock_buckets()
+            if respread or not interval:
+                self.stdout.write(f"Rebalanced {respread} inventories.")
+            if not interval:
+                return
+            time.sleep(interval)
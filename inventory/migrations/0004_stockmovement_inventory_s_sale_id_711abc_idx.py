@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_category_product_category'),
+        ('inventory', '0003_stockmovement_unit_cost_stockmovement_unit_sp'),
+        ('sales', '0006_saleitem_returned_quantity_salereturn_salereturnitem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['sale', 'movement_type'], name='inventory_s_sale_id_711abc_idx'),
+        ),
+    ]
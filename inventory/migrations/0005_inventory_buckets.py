@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_stockmovement_inventory_s_sale_id_711abc_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='bucket_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='InventoryBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='inventory.inventory')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('inventory', 'index'), name='uniq_inventory_bucket_index')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_category_product_category'),
+        ('inventory', '0005_inventory_buckets'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='inventory',
+            constraint=models.CheckConstraint(condition=models.Q(('quantity__gte', 0)), name='inventory_quantity_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='inventorybucket',
+            constraint=models.CheckConstraint(condition=models.Q(('quantity__gte', 0)), name='inventory_bucket_quantity_non_negative'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:35
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_quantity_non_negative'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='inventory',
+            name='inventory_quantity_non_negative',
+        ),
+        migrations.RemoveConstraint(
+            model_name='inventorybucket',
+            name='inventory_bucket_quantity_non_negative',
+        ),
+    ]
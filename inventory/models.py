@@ -13,12 +13,35 @@ class Inventory(models.Model):
     reorder_level = models.PositiveIntegerField(null=True, blank=True)
     low_stock_flag = models.BooleanField(default=False)
 
+    # 0 = quantity is the stock row itself. N > 0 = stock is held in N
+    # InventoryBuckets (hot SKUs) and quantity is their aggregate.
+    bucket_count = models.PositiveSmallIntegerField(default=0)
+
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
         return f"Inventory: {self.product.sku} = {self.quantity}"
     
 
+class InventoryBucket(models.Model):
+    """
+    One slice of a sharded product's stock. Checkouts lock a single bucket
+    instead of the Inventory row, so concurrent sales of the product
+    proceed in parallel; see inventory.sharding.
+    """
+    inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE, related_name="buckets")
+    index = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["inventory", "index"], name="uniq_inventory_bucket_index"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Bucket {self.index} of inventory {self.inventory_id} = {self.quantity}"
+
+
 class StockMovement(models.Model):
     class MovementType(models.TextChoices):
         SALE = "SALE", "Sale"
@@ -53,6 +76,9 @@ class StockMovement(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["sale", "movement_type"]),
+        ]
 
     def __str__(self) -> str:
         return f"{self.product.sku} {self.direction} {self.quantity} ({self.movement_type})"
\ No newline at end of file
@@ -12,6 +12,7 @@ class ProductMiniSerializer(serializers.ModelSerializer):
 
 class InventoryReadSerializer(serializers.ModelSerializer):
     product = ProductMiniSerializer(read_only=True)
+    quantity = serializers.SerializerMethodField()
     reorder_point = serializers.SerializerMethodField()
 
     class Meta:
@@ -24,10 +25,17 @@ class InventoryReadSerializer(serializers.ModelSerializer):
             "reorder_level",
             "reorder_point",
             "low_stock_flag",
+            "bucket_count",
             "updated_at",
         ]
 
 
+    def get_quantity(self, obj):
+        # Live stock of a bucketed product, when the queryset was annotated
+        # with sharding.with_bucket_totals; its row's quantity lags.
+        bucket_total = getattr(obj, "bucket_total", None)
+        return bucket_total if obj.bucket_count and bucket_total is not None else obj.quantity
+
     def get_reorder_point(self, obj):
         return reorder_point(obj)
 
@@ -40,6 +48,13 @@ class InventoryUpdateSerializer(serializers.ModelSerializer):
         fields = ["reorder_threshold_percent", "reorder_level"]
 
 
+class BucketCountSerializer(serializers.Serializer):
+    """
+    Owner: split a hot SKU's stock into this many buckets (0 = single row).
+    """
+    bucket_count = serializers.IntegerField(min_value=0, max_value=32)
+
+
 class StockMovementReadSerializer(serializers.ModelSerializer):
     product = ProductMiniSerializer(read_only=True)
     created_by_username = serializers.CharField(source="created_by.username", read_only=True)
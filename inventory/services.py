@@ -0,0 +1,158 @@
+import time
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .contention import record_lock_wait, retry_on_contention
+from .ledger import StockConflict, notify_low_stock, update_stock
+from .models import Inventory, InventoryBucket
+from .sharding import (
+    add_to_buckets,
+    bucket_totals,
+    even_split,
+    invalidate_sharded_products,
+    sharded_product_ids,
+    spread_stock,
+    take_from_buckets,
+)
+from .utils import is_low_stock
+
+def lock_inventories(product_ids, *, skip_sharded: bool = False) -> dict[int, Inventory]:
+    """
+    Lock the inventory rows for product_ids, always in product id order so
+    overlapping baskets queue behind each other instead of deadlocking.
+
+    With skip_sharded, rows of bucketed (hot) products are read without a
+    lock; the caller takes their stock from buckets (see inventory.sharding).
+    """
+    product_ids = set(product_ids)
+    hot = product_ids & sharded_product_ids() if skip_sharded else set()
+    locking = Inventory.objects.select_for_update(of=("self",)).select_related("product").order_by("product_id")
+
+    started = time.monotonic()
+    inventories = list(locking.filter(product_id__in=product_ids - hot))
+    record_lock_wait((inv.product_id for inv in inventories), time.monotonic() - started)
+
+    if hot:
+        read = list(Inventory.objects.select_related("product").filter(product_id__in=hot))
+        inventories += [inv for inv in read if inv.bucket_count]
+        # Folded back into a single row since the cache was loaded.
+        unsharded = [inv.product_id for inv in read if not inv.bucket_count]
+        if unsharded:
+            inventories += list(locking.filter(product_id__in=unsharded))
+    return {inv.product_id: inv for inv in inventories}
+
+
+def apply_stock_deltas(deltas: dict[int, tuple[Inventory, int]]) -> list[Inventory]:
+    """
+    Apply per-product quantity deltas to inventory rows the caller has already
+    locked, in a single conditional UPDATE (see inventory.ledger.update_stock).
+
+    deltas: {product_id: (locked_inventory, signed_delta)}
+
+    A row only takes a decrement while it still holds enough stock; if any
+    does not, the whole call fails with StockConflict. For bucketed
+    inventories the delta goes to their buckets and quantity is rewritten
+    as the bucket sum. The in-memory Inventory objects are updated to the
+    new values.
+
+    Returns the inventories that crossed into low stock.
+    """
+    if not deltas:
+        return []
+
+    bucketed = set()
+    for pid, (inv, delta) in deltas.items():
+        if not inv.bucket_count:
+            continue
+        if delta > 0:
+            add_to_buckets(inv.pk, delta)
+        elif delta < 0 and not take_from_buckets(inv.pk, -delta):
+            raise StockConflict(f"Insufficient stock for product_id={pid}: tried to subtract {-delta}")
+        bucketed.add(pid)
+
+    rows = update_stock({pid: delta for pid, (_, delta) in deltas.items()}, bucketed)
+
+    now = timezone.now()
+    went_low = []
+    for pid, (inv, _) in deltas.items():
+        inv.quantity, inv.low_stock_flag, was_low = rows[pid]
+        inv.updated_at = now
+        if inv.low_stock_flag and not was_low:
+            went_low.append(inv)
+    return went_low
+
+
+@retry_on_contention
+def refresh_inventory_totals(product_ids) -> None:
+    """
+    Rewrite the quantity and low-stock flag of bucketed inventories from
+    their bucket sums, holding each Inventory row lock only for this short
+    transaction. Run by rebalance_stock_buckets, not per checkout.
+    """
+    with transaction.atomic():
+        inv_map = lock_inventories(product_ids)
+        sharded = [inv for inv in inv_map.values() if inv.bucket_count]
+        if not sharded:
+            return
+
+        totals = bucket_totals(inv.pk for inv in sharded)
+        now = timezone.now()
+        went_low = []
+        for inv in sharded:
+            old_low = inv.low_stock_flag
+            inv.quantity = totals.get(inv.pk, 0)
+            inv.low_stock_flag = is_low_stock(inv)
+            inv.updated_at = now
+            if old_low is False and inv.low_stock_flag is True:
+                went_low.append(inv)
+
+        Inventory.objects.bulk_update(sharded, ["quantity", "low_stock_flag", "updated_at"])
+        notify_low_stock(went_low)
+
+
+@transaction.atomic
+def set_bucket_count(inventory: Inventory, count: int) -> Inventory:
+    """
+    Move a product's stock into count buckets, spread evenly (0 folds the
+    buckets back into the Inventory row). The total does not change.
+    """
+    inv = Inventory.objects.select_for_update().select_related("product").get(pk=inventory.pk)
+    buckets = list(InventoryBucket.objects.select_for_update().filter(inventory=inv).order_by("index"))
+    total = sum(b.quantity for b in buckets) if inv.bucket_count else inv.quantity
+
+    InventoryBucket.objects.filter(inventory=inv).delete()
+    InventoryBucket.objects.bulk_create([
+        InventoryBucket(inventory=inv, index=i, quantity=quantity)
+        for i, quantity in enumerate(even_split(total, count) if count else [])
+    ])
+
+    inv.bucket_count = count
+    inv.quantity = total
+    inv.save(update_fields=["bucket_count", "quantity", "updated_at"])
+    transaction.on_commit(invalidate_sharded_products)
+    return inv
+
+
+def rebalance_stock_buckets() -> int:
+    """
+    Even out bucketed inventories whose buckets have drifted apart (so a
+    checkout keeps finding a bucket that covers it), then re-sync every
+    bucketed Inventory.quantity with its buckets.
+
+    Each inventory is respread in its own short transaction. Returns how
+    many were respread.
+    """
+    uneven = list(
+        InventoryBucket.objects.values("inventory_id")
+        .annotate(spread=Max("quantity") - Min("quantity"))
+        .filter(spread__gt=1)
+        .values_list("inventory_id", flat=True)
+    )
+    for inventory_id in uneven:
+        with transaction.atomic():
+            spread_stock(inventory_id)
+
+    refresh_inventory_totals(Inventory.objects.filter(bucket_count__gt=0).values_list("product_id", flat=True))
+    return len(uneven)
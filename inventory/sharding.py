@@ -0,0 +1,143 @@
+"""
+Stock buckets for hot SKUs.
+
+A product with Inventory.bucket_count = N > 0 keeps its stock in N
+InventoryBucket rows. A checkout locks one bucket that can cover its
+quantity instead of the single Inventory row, so up to N checkouts of the
+product commit in parallel. Checkouts do not write the Inventory row at
+all, so Inventory.quantity is an aggregate that lags: it is rewritten
+from the bucket sums by stock ops that lock the row anyway and by the
+periodic rebalance (see inventory.services). The inventory API reads
+bucketed stock from the buckets (with_bucket_totals).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F, OuterRef, Subquery, Sum
+
+from .models import Inventory, InventoryBucket
+
+_lock = threading.Lock()
+_sharded = None
+_loaded_at = 0.0
+
+
+def sharded_product_ids() -> frozenset[int]:
+    """
+    Products currently kept in buckets, cached per process for
+    INVENTORY_SHARDS_TTL_SECONDS. A stale answer only costs a lock: callers
+    re-check bucket_count on the rows they read.
+    """
+    global _sharded, _loaded_at
+
+    ttl = getattr(settings, "INVENTORY_SHARDS_TTL_SECONDS", 60)
+    sharded = _sharded
+    if sharded is not None and time.monotonic() - _loaded_at < ttl:
+        return sharded
+
+    with _lock:
+        if _sharded is None or time.monotonic() - _loaded_at >= ttl:
+            _sharded = frozenset(Inventory.objects.filter(bucket_count__gt=0).values_list("product_id", flat=True))
+            _loaded_at = time.monotonic()
+        return _sharded
+
+
+def invalidate_sharded_products() -> None:
+    global _sharded
+    with _lock:
+        _sharded = None
+
+
+def even_split(total: int, count: int) -> list[int]:
+    base, extra = divmod(total, count)
+    return [base + (1 if i < extra else 0) for i in range(count)]
+
+
+def take_from_buckets(inventory_id: int, quantity: int) -> bool:
+    """
+    Remove quantity from a sharded inventory's buckets.
+
+    Tries, in order: a random bucket that covers the whole quantity and no
+    other checkout holds (SKIP LOCKED); waiting for one such bucket; and,
+    when stock is spread too thin for any single bucket, locking them all
+    in index order and draining the fullest first.
+
+    Returns False, changing nothing, if the buckets hold less in total.
+    """
+    buckets = InventoryBucket.objects.filter(inventory_id=inventory_id)
+    for skip_locked in (True, False):
+        pk = (
+            buckets.select_for_update(skip_locked=skip_locked)
+            .filter(quantity__gte=quantity)
+            .order_by("?")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if pk is not None:
+            InventoryBucket.objects.filter(pk=pk).update(quantity=F("quantity") - quantity)
+            return True
+
+    locked = list(buckets.select_for_update().order_by("index"))
+    if sum(b.quantity for b in locked) < quantity:
+        return False
+
+    left = quantity
+    for bucket in sorted(locked, key=lambda b: -b.quantity):
+        taken = min(left, bucket.quantity)
+        bucket.quantity -= taken
+        left -= taken
+        if not left:
+            break
+    InventoryBucket.objects.bulk_update(locked, ["quantity"])
+    return True
+
+
+def add_to_buckets(inventory_id: int, quantity: int) -> None:
+    """Put supplied or returned stock into the emptiest bucket."""
+    buckets = InventoryBucket.objects.filter(inventory_id=inventory_id).order_by("quantity", "index")
+    pk = (
+        buckets.select_for_update(skip_locked=True).values_list("pk", flat=True).first()
+        or buckets.select_for_update().values_list("pk", flat=True).first()
+    )
+    InventoryBucket.objects.filter(pk=pk).update(quantity=F("quantity") + quantity)
+
+
+def spread_stock(inventory_id: int, delta: int = 0) -> tuple[int, int]:
+    """
+    Lock every bucket (index order), apply delta and spread the total
+    evenly again. A total that would go negative is clamped to 0.
+
+    Returns (new total, units added by the clamp).
+    """
+    locked = list(InventoryBucket.objects.select_for_update().filter(inventory_id=inventory_id).order_by("index"))
+    if not locked:
+        return 0, 0
+
+    total = sum(b.quantity for b in locked) + delta
+    shortfall = max(-total, 0)
+    total += shortfall
+    for bucket, quantity in zip(locked, even_split(total, len(locked))):
+        bucket.quantity = quantity
+    InventoryBucket.objects.bulk_update(locked, ["quantity"])
+    return total, shortfall
+
+
+def bucket_totals(inventory_ids) -> dict[int, int]:
+    return dict(
+        InventoryBucket.objects.filter(inventory_id__in=list(inventory_ids))
+        .values("inventory_id")
+        .annotate(total=Sum("quantity"))
+        .values_list("inventory_id", "total")
+    )
+
+
+def with_bucket_totals(queryset):
+    """Annotate Inventory rows with bucket_total, their bucket sum (None without buckets)."""
+    totals = (
+        InventoryBucket.objects.filter(inventory=OuterRef("pk"))
+        .values("inventory")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    return queryset.annotate(bucket_total=Subquery(totals))
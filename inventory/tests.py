@@ -1,14 +1,28 @@
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 
 from users.models import UserProfile
 from catalog.models import Product
-from inventory.models import Inventory, StockMovement
+from inventory.ledger import record_movement, record_movements
+from inventory.models import Inventory, InventoryBucket, StockMovement
+from inventory.services import rebalance_stock_buckets
+from inventory.sharding import invalidate_sharded_products
 from inventory.utils import reorder_point, is_low_stock
+from inventory.contention import (
+    contention_snapshot,
+    record_lock_wait,
+    reset_contention_stats,
+    retry_counts,
+    retry_on_contention,
+)
 from notifications.models import Notification
+from sales.models import Sale
+from sales.services import create_sale
 
 User = get_user_model()
 
@@ -69,7 +83,7 @@ class InventoryMinimalTests(TestCase):
         self.inv.low_stock_flag = False
         self.inv.save()
 
-        StockMovement.objects.create(
+        record_movement(
             product=self.product,
             movement_type=StockMovement.MovementType.SUPPLY,
             direction=StockMovement.Direction.IN,
@@ -90,13 +104,14 @@ class InventoryMinimalTests(TestCase):
 
         Notification.objects.all().delete()
 
-        StockMovement.objects.create(
-            product=self.product,
-            movement_type=StockMovement.MovementType.SALE,
-            direction=StockMovement.Direction.OUT,
-            quantity=3,
-            created_by=self.cashier,
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            record_movement(
+                product=self.product,
+                movement_type=StockMovement.MovementType.SALE,
+                direction=StockMovement.Direction.OUT,
+                quantity=3,
+                created_by=self.cashier,
+            )
 
         self.inv.refresh_from_db()
         self.assertEqual(self.inv.quantity, 9)
@@ -106,13 +121,14 @@ class InventoryMinimalTests(TestCase):
         self.assertEqual(notifs.count(), 1)
         self.assertEqual(notifs.first().recipient, self.owner)
 
-        StockMovement.objects.create(
-            product=self.product,
-            movement_type=StockMovement.MovementType.SALE,
-            direction=StockMovement.Direction.OUT,
-            quantity=1,
-            created_by=self.cashier,
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            record_movement(
+                product=self.product,
+                movement_type=StockMovement.MovementType.SALE,
+                direction=StockMovement.Direction.OUT,
+                quantity=1,
+                created_by=self.cashier,
+            )
         self.assertEqual(
             Notification.objects.filter(type=Notification.Type.LOW_STOCK).count(),
             1,
@@ -123,7 +139,7 @@ class InventoryMinimalTests(TestCase):
         self.inv.save()
 
         with self.assertRaises(ValueError):
-            StockMovement.objects.create(
+            record_movement(
                 product=self.product,
                 movement_type=StockMovement.MovementType.SALE,
                 direction=StockMovement.Direction.OUT,
@@ -134,6 +150,42 @@ class InventoryMinimalTests(TestCase):
         self.inv.refresh_from_db()
         self.assertEqual(self.inv.quantity, 1)
 
+    def test_record_movements_applies_batch_in_one_update_and_keeps_stock_non_negative(self):
+        other = Product.objects.create(name="Bread", sku="BREAD-1", selling_price=Decimal("50.00"), cost_price=Decimal("30.00"))
+        record_movement(
+            product=self.product, movement_type=StockMovement.MovementType.SUPPLY,
+            direction=StockMovement.Direction.IN, quantity=20, created_by=self.owner,
+        )
+
+        def move(product, direction, quantity):
+            return StockMovement(
+                product=product, movement_type=StockMovement.MovementType.ADJUSTMENT,
+                direction=direction, quantity=quantity, created_by=self.owner,
+            )
+
+        with CaptureQueriesContext(connection) as ctx:
+            record_movements([
+                move(self.product, StockMovement.Direction.OUT, 15),
+                move(other, StockMovement.Direction.IN, 30),
+                move(self.product, StockMovement.Direction.IN, 2),
+            ])
+        statements = [q["sql"].lstrip().split()[0].upper() for q in ctx.captured_queries]
+        self.assertEqual(statements.count("WITH"), 1)  # the locking UPDATE ... RETURNING
+        self.assertEqual(statements.count("INSERT"), 1)
+        self.assertNotIn("UPDATE", statements)
+        self.assertEqual(
+            dict(Inventory.objects.values_list("product__sku", "quantity")), {"MILK-1": 7, "BREAD-1": 30}
+        )
+        self.assertTrue(Inventory.objects.get(product=self.product).low_stock_flag)
+
+        with self.assertRaises(ValueError):
+            record_movements([move(other, StockMovement.Direction.OUT, 1), move(self.product, StockMovement.Direction.OUT, 8)])
+        self.assertEqual(Inventory.objects.get(product=other).quantity, 30)
+        self.assertEqual(StockMovement.objects.count(), 4)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Inventory.objects.filter(product=other).update(quantity=-1)
+
     def test_inventory_list_requires_auth_and_cashier_can_read(self):
         res = self.client.get(f"{self.BASE}/items/")
         self.assertEqual(res.status_code, 401)
@@ -241,7 +293,8 @@ class InventoryMinimalTests(TestCase):
         self.assertEqual(res.status_code, 403)
 
         self.client.force_authenticate(user=self.owner)
-        res = self.client.patch(url, payload, format="json")
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(url, payload, format="json")
         self.assertEqual(res.status_code, 200)
 
         self.inv.refresh_from_db()
@@ -251,7 +304,8 @@ class InventoryMinimalTests(TestCase):
         self.assertEqual(notifs.count(), 1)
         self.assertEqual(notifs.first().recipient, self.owner)
 
-        res = self.client.patch(url, payload, format="json")
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(url, payload, format="json")
         self.assertEqual(res.status_code, 200)
         self.assertEqual(
             Notification.objects.filter(type=Notification.Type.LOW_STOCK, product_id=self.product.id).count(),
@@ -267,3 +321,161 @@ class InventoryMinimalTests(TestCase):
         self.assertEqual(res.status_code, 200)
 
         self.assertEqual(res.data["reorder_point"], 10)
+
+    def test_ops_supply_retry_with_same_idempotency_key_applies_once(self):
+        payload = {"sku": self.product.sku, "quantity": 5, "notes": "restock"}
+        self.client.force_authenticate(user=self.owner)
+
+        res = self.client.post(f"{self.BASE}/ops/supply/", payload, format="json", HTTP_IDEMPOTENCY_KEY="sup-1")
+        self.assertEqual(res.status_code, 201)
+        res = self.client.post(f"{self.BASE}/ops/supply/", payload, format="json", HTTP_IDEMPOTENCY_KEY="sup-1")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res["Idempotent-Replayed"], "true")
+
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 5)
+
+    def test_contention_stats_owner_only_reports_lock_waits_per_sku(self):
+        reset_contention_stats()
+        record_movement(
+            product=self.product,
+            movement_type=StockMovement.MovementType.SUPPLY,
+            direction=StockMovement.Direction.IN,
+            quantity=5,
+            created_by=self.owner,
+        )
+
+        self.client.force_authenticate(user=self.cashier)
+        self.assertEqual(self.client.get(f"{self.BASE}/contention/").status_code, 403)
+
+        self.client.force_authenticate(user=self.owner)
+        res = self.client.get(f"{self.BASE}/contention/")
+        self.assertEqual(res.status_code, 200)
+        row = res.data["data"][0]
+        self.assertEqual(row["sku"], self.product.sku)
+        self.assertEqual(row["lock_acquisitions"], 1)
+        self.assertEqual(row["retries"], 0)
+
+    def _buckets(self):
+        return list(InventoryBucket.objects.filter(inventory=self.inv).order_by("index").values_list("quantity", flat=True))
+
+    def _move(self, direction, quantity):
+        record_movement(
+            product=self.product,
+            movement_type=StockMovement.MovementType.ADJUSTMENT,
+            direction=direction,
+            quantity=quantity,
+            created_by=self.owner,
+        )
+
+    def test_buckets_api_spreads_stock_and_stock_ops_keep_aggregate(self):
+        self.addCleanup(invalidate_sharded_products)
+        self._move(StockMovement.Direction.IN, 50)
+
+        self.client.force_authenticate(user=self.cashier)
+        self.assertEqual(self.client.post(f"{self.BASE}/items/{self.inv.id}/buckets/", {"bucket_count": 4}).status_code, 403)
+
+        self.client.force_authenticate(user=self.owner)
+        res = self.client.post(f"{self.BASE}/items/{self.inv.id}/buckets/", {"bucket_count": 4})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data["bucket_count"], res.data["quantity"]), (4, 50))
+        self.assertEqual(self._buckets(), [13, 13, 12, 12])
+
+        self._move(StockMovement.Direction.IN, 10)
+        self.assertEqual(sorted(self._buckets()), [12, 13, 13, 22])
+
+        self._move(StockMovement.Direction.OUT, 55)  # more than any one bucket holds
+        self.inv.refresh_from_db()
+        self.assertEqual((self.inv.quantity, sum(self._buckets())), (5, 5))
+        self.assertTrue(self.inv.low_stock_flag)
+
+        with self.assertRaises(ValueError):
+            self._move(StockMovement.Direction.OUT, 6)
+
+        res = self.client.post(f"{self.BASE}/items/{self.inv.id}/buckets/", {"bucket_count": 0})
+        self.assertEqual((res.data["bucket_count"], res.data["quantity"]), (0, 5))
+        self.assertEqual(self._buckets(), [])
+
+    def test_sale_of_bucketed_product_leaves_inventory_row_to_rebalance(self):
+        self.addCleanup(invalidate_sharded_products)
+        self._move(StockMovement.Direction.IN, 40)
+        self.client.force_authenticate(user=self.owner)
+        self.client.post(f"{self.BASE}/items/{self.inv.id}/buckets/", {"bucket_count": 4})
+        invalidate_sharded_products()
+        Notification.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                create_sale(
+                    cashier=self.cashier,
+                    payment_method=Sale.PaymentMethod.CASH,
+                    items=[{"product_id": self.product.id, "quantity": 8}],
+                )
+            self.assertFalse(any(
+                'inventory_inventory"' in q["sql"] and ("FOR UPDATE" in q["sql"] or q["sql"].startswith("UPDATE"))
+                for q in ctx.captured_queries
+            ))
+
+        self.assertEqual(sorted(self._buckets()), [2, 10, 10, 10])
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 40)  # until the next rebalance
+        self.assertEqual(self.client.get(f"{self.BASE}/items/{self.inv.id}/").data["quantity"], 32)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(rebalance_stock_buckets(), 1)
+        self.assertEqual(self._buckets(), [8, 8, 8, 8])
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 32)
+
+        InventoryBucket.objects.filter(inventory=self.inv, index=0).update(quantity=6)
+        Inventory.objects.filter(pk=self.inv.pk).update(quantity=99)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(rebalance_stock_buckets(), 1)
+        self.assertEqual(self._buckets(), [8, 8, 7, 7])
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 30)
+        self.assertEqual(rebalance_stock_buckets(), 0)
+
+
+class _PgError(Exception):
+    def __init__(self, pgcode):
+        self.pgcode = pgcode
+
+
+@override_settings(CONTENTION_RETRY_ATTEMPTS=3, CONTENTION_RETRY_BASE_DELAY=0)
+class ContentionRetryTests(SimpleTestCase):
+    def setUp(self):
+        reset_contention_stats()
+
+    def _failing(self, pgcode, failures):
+        calls = []
+
+        @retry_on_contention
+        def work():
+            calls.append(1)
+            record_lock_wait([7, 3], 0.0)
+            if len(calls) <= failures:
+                raise OperationalError("aborted") from _PgError(pgcode)
+            return "done"
+
+        return work, calls
+
+    def test_retries_deadlocks_and_counts_them_per_product(self):
+        work, calls = self._failing("40P01", failures=2)
+        self.assertEqual(work(), "done")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(contention_snapshot()[7]["retries"], 2)
+        self.assertEqual(contention_snapshot()[3]["lock_acquisitions"], 3)
+        self.assertEqual(retry_counts(), {"40P01": 2})
+
+    def test_gives_up_after_bounded_attempts(self):
+        work, calls = self._failing("40001", failures=5)
+        with self.assertRaises(OperationalError):
+            work()
+        self.assertEqual(len(calls), 3)
+
+    def test_other_database_errors_are_not_retried(self):
+        work, calls = self._failing("23505", failures=1)
+        with self.assertRaises(OperationalError):
+            work()
+        self.assertEqual(len(calls), 1)
+
@@ -2,6 +2,8 @@ from django.urls import path
 
 from .views import (
     AdjustStockAPIView,
+    ContentionStatsAPIView,
+    InventoryBucketsAPIView,
     InventoryDetailAPIView,
     InventoryListAPIView,
     InventoryUpdateAPIView,
@@ -15,6 +17,7 @@ urlpatterns = [
     path("items/", InventoryListAPIView.as_view(), name="inventory-list"),
     path("items/<int:pk>/", InventoryDetailAPIView.as_view(), name="inventory-detail"),
     path("items/<int:pk>/config/", InventoryUpdateAPIView.as_view(), name="inventory-config"),
+    path("items/<int:pk>/buckets/", InventoryBucketsAPIView.as_view(), name="inventory-buckets"),
 
     path("movements/", StockMovementListAPIView.as_view(), name="stock-movement-list"),
 
@@ -22,4 +25,6 @@ urlpatterns = [
     path("ops/adjust/", AdjustStockAPIView.as_view(), name="stock-adjust"),
     path("ops/return/", ReturnStockAPIView.as_view(), name="stock-return"),
     path("ops/set-reorder/", SetReorderAPIView.as_view(), name="set-reorder"),
+
+    path("contention/", ContentionStatsAPIView.as_view(), name="inventory-contention"),
 ]
\ No newline at end of file
@@ -3,6 +3,12 @@ from .models import Inventory
 
 DEFAULT_LOW_STOCK_QTY = 10
 
+# reorder_point() as SQL over an inventory row aliased "i" (see inventory.ledger).
+REORDER_POINT_SQL = (
+    f"(CASE WHEN COALESCE(i.reorder_level, 0) <= 0 THEN {DEFAULT_LOW_STOCK_QTY} "
+    "ELSE (i.reorder_level * LEAST(GREATEST(i.reorder_threshold_percent, 1), 100) + 99) / 100 END)"
+)
+
 
 def reorder_point(inv: Inventory) -> int:
     """
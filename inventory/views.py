@@ -1,5 +1,4 @@
 from django.contrib.auth import get_user_model
-from django.db import transaction
 
 from rest_framework import generics, status
 from rest_framework.filters import OrderingFilter, SearchFilter
@@ -8,11 +7,17 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from users.permissions import IsCashier, IsOwner
-from notifications.models import Notification
+from sales.idempotency import idempotent
+from catalog.models import Product
+from .contention import contention_snapshot
+from .ledger import StockConflict, notify_low_stock, record_movement
+from .services import set_bucket_count
+from .sharding import with_bucket_totals
 from .utils import reorder_point, is_low_stock
 
 from .models import Inventory, StockMovement
 from .serializers import (
+    BucketCountSerializer,
     InventoryReadSerializer,
     InventoryUpdateSerializer,
     SetReorderSerializer,
@@ -32,7 +37,7 @@ class InventoryListAPIView(generics.ListAPIView):
     ordering = ["-updated_at"]
 
     def get_queryset(self):
-        qs = Inventory.objects.select_related("product").order_by("-updated_at")
+        qs = with_bucket_totals(Inventory.objects.select_related("product")).order_by("-updated_at")
         
         low_stock = self.request.query_params.get("low_stock")
         out_of_stock = self.request.query_params.get("out_of_stock")
@@ -47,7 +52,7 @@ class InventoryListAPIView(generics.ListAPIView):
 class InventoryDetailAPIView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated, IsCashier]
     serializer_class = InventoryReadSerializer
-    queryset = Inventory.objects.select_related("product")
+    queryset = with_bucket_totals(Inventory.objects.select_related("product"))
 
 
 class InventoryUpdateAPIView(generics.UpdateAPIView):
@@ -69,18 +74,26 @@ class InventoryUpdateAPIView(generics.UpdateAPIView):
         inv.save(update_fields=["low_stock_flag", "updated_at"])
 
         if (old_low is False) and (inv.low_stock_flag is True):
-            rp = reorder_point(inv)
-            owners = User.objects.filter(profile__role="OWNER", is_active=True)
-            for owner in owners:
-                Notification.objects.create(
-                    recipient=owner,
-                    type=Notification.Type.LOW_STOCK,
-                    message=(
-                        f"Low stock: {inv.product.name} ({inv.product.sku}). "
-                        f"Qty: {inv.quantity} (<= {rp})"
-                    ),
-                    product_id=inv.product_id,
-                )
+            notify_low_stock([inv])
+
+class InventoryBucketsAPIView(APIView):
+    """
+    OWNER: spread a hot SKU's stock over N buckets so concurrent checkouts
+    stop queueing on its Inventory row (0 folds it back into the row).
+    """
+    permission_classes = [IsAuthenticated, IsOwner]
+
+    def post(self, request, pk):
+        s = BucketCountSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+
+        inv = Inventory.objects.filter(pk=pk).first()
+        if inv is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        inv = set_bucket_count(inv, s.validated_data["bucket_count"])
+        return Response(InventoryReadSerializer(inv).data, status=status.HTTP_200_OK)
+
 
 class StockMovementListAPIView(generics.ListAPIView):
     permission_classes = [IsAuthenticated, IsCashier]
@@ -95,9 +108,12 @@ class StockMovementListAPIView(generics.ListAPIView):
         sku = self.request.query_params.get("sku")
         movement_type = self.request.query_params.get("movement_type")
         direction = self.request.query_params.get("direction")
+        sale_id = self.request.query_params.get("sale_id")
 
         if sku:
             qs = qs.filter(product__sku=sku)
+        if sale_id:
+            qs = qs.filter(sale_id=sale_id)
         if movement_type:
             qs = qs.filter(movement_type=movement_type)
         if direction:
@@ -112,6 +128,7 @@ class SupplyStockAPIView(APIView):
     """
     permission_classes = [IsAuthenticated, IsOwner]
 
+    @idempotent
     def post(self, request):
         s = StockOpBaseSerializer(data=request.data)
         s.is_valid(raise_exception=True)
@@ -123,8 +140,7 @@ class SupplyStockAPIView(APIView):
         new_cost = s.validated_data.get("new_cp", None)
         new_sell = s.validated_data.get("new_sp", None)
 
-        with transaction.atomic():
-            StockMovement.objects.create(
+        record_movement(
             product=product,
             movement_type=StockMovement.MovementType.SUPPLY,
             direction=StockMovement.Direction.IN,
@@ -133,7 +149,7 @@ class SupplyStockAPIView(APIView):
             notes=notes,
             unit_cost=new_cost,
             unit_sp=new_sell,
-            )
+        )
 
         updates = []
         if new_cost is not None:
@@ -157,6 +173,7 @@ class AdjustStockAPIView(APIView):
     """
     permission_classes = [IsAuthenticated, IsOwner]
 
+    @idempotent
     def post(self, request):
         s = StockAdjustSerializer(data=request.data)
         s.is_valid(raise_exception=True)
@@ -166,14 +183,17 @@ class AdjustStockAPIView(APIView):
         direction = s.validated_data["direction"]
         notes = s.validated_data.get("notes", "")
 
-        StockMovement.objects.create(
-            product=product,
-            movement_type=StockMovement.MovementType.ADJUSTMENT,
-            direction=direction,
-            quantity=qty,
-            created_by=request.user,
-            notes=notes,
-        )
+        try:
+            record_movement(
+                product=product,
+                movement_type=StockMovement.MovementType.ADJUSTMENT,
+                direction=direction,
+                quantity=qty,
+                created_by=request.user,
+                notes=notes,
+            )
+        except StockConflict as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({"message": "Adjustment recorded."}, status=status.HTTP_201_CREATED)
 
 
@@ -184,6 +204,7 @@ class ReturnStockAPIView(APIView):
     """
     permission_classes = [IsAuthenticated, IsCashier]
 
+    @idempotent
     def post(self, request):
         s = StockOpBaseSerializer(data=request.data)
         s.is_valid(raise_exception=True)
@@ -192,7 +213,7 @@ class ReturnStockAPIView(APIView):
         qty = s.validated_data["quantity"]
         notes = s.validated_data.get("notes", "")
 
-        StockMovement.objects.create(
+        record_movement(
             product=product,
             movement_type=StockMovement.MovementType.RETURN,
             direction=StockMovement.Direction.IN,
@@ -224,4 +245,25 @@ class SetReorderAPIView(APIView):
 
         inv.save(update_fields=["reorder_level", "reorder_threshold_percent", "low_stock_flag", "updated_at"])
 
-        return Response({"message": "Reorder settings updated."}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({"message": "Reorder settings updated."}, status=status.HTTP_200_OK)
+
+
+class ContentionStatsAPIView(APIView):
+    """
+    OWNER: per-SKU row-lock waits and deadlock/serialization retries seen
+    by this server process, busiest first.
+    """
+    permission_classes = [IsAuthenticated, IsOwner]
+
+    def get(self, request):
+        stats = contention_snapshot()
+        skus = dict(Product.objects.filter(id__in=stats.keys()).values_list("id", "sku"))
+
+        rows = [
+            {"product_id": pid, "sku": skus.get(pid), **entry}
+            for pid, entry in stats.items()
+        ]
+        rows.sort(key=lambda r: (r["retries"], r["lock_wait_seconds"]), reverse=True)
+
+        return Response({"data": rows})
+
@@ -0,0 +1,107 @@
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+OWNER_IDS_CACHE_KEY = "notifications:owner_ids"
+
+_queue: "queue.Queue[list[tuple]]" = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def owner_ids() -> list[int]:
+    """
+    Ids of active OWNER users, cached until someone's role or active flag
+    changes. The cache is CACHES["default"], per process unless configured
+    otherwise; see NOTIFICATIONS_OWNER_CACHE_SECONDS.
+    """
+    ids = cache.get(OWNER_IDS_CACHE_KEY)
+    if ids is None:
+        User = get_user_model()
+        ids = list(User.objects.filter(profile__role="OWNER", is_active=True).values_list("id", flat=True))
+        cache.set(OWNER_IDS_CACHE_KEY, ids, getattr(settings, "NOTIFICATIONS_OWNER_CACHE_SECONDS", 300))
+    return ids
+
+
+def invalidate_owner_cache() -> None:
+    cache.delete(OWNER_IDS_CACHE_KEY)
+
+
+def update_owner_cache(user_id: int, is_owner: bool) -> None:
+    """Drop the cached owner ids if user_id has joined or left them."""
+    ids = cache.get(OWNER_IDS_CACHE_KEY)
+    if ids is not None and (user_id in ids) != is_owner:
+        invalidate_owner_cache()
+
+
+def notify_owners(type: str, message: str, *, sale_id: int | None = None, product_id: int | None = None) -> None:
+    """
+    Queue a notification for every active owner.
+
+    Nothing is written inside the caller's transaction: the event is handed
+    to the dispatcher once it commits (and dropped if it rolls back).
+    """
+    event = (type, message, sale_id, product_id)
+    transaction.on_commit(lambda: _dispatch([event]))
+
+
+def write_notifications(events: list[tuple]) -> int:
+    """
+    Fan events out to owners with a single bulk insert.
+    """
+    recipients = owner_ids()
+    rows = [
+        Notification(recipient_id=rid, type=type, message=message, sale_id=sale_id, product_id=product_id)
+        for type, message, sale_id, product_id in events
+        for rid in recipients
+    ]
+    Notification.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def _dispatch(events: list[tuple]) -> None:
+    if getattr(settings, "NOTIFICATIONS_DISPATCH", "thread") == "sync":
+        write_notifications(events)
+        return
+
+    _ensure_worker()
+    _queue.put(events)
+
+
+def _ensure_worker() -> None:
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name="notifications-writer", daemon=True)
+            _worker.start()
+
+
+def _run_worker() -> None:
+    """
+    Drain everything queued since the last write and insert it in one go.
+    """
+    while True:
+        events = list(_queue.get())
+        while True:
+            try:
+                events.extend(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            write_notifications(events)
+        except Exception:
+            logger.exception("Failed to write %s owner notification(s)", len(events))
+        finally:
+            close_old_connections()
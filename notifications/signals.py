@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import UserProfile
+from .services import update_owner_cache
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Sign-ins save last_login alone; only is_active bears on owner_ids.
+    if created or (update_fields is not None and "is_active" not in update_fields):
+        return
+    role = UserProfile.objects.filter(user_id=instance.pk).values_list("role", flat=True).first()
+    update_owner_cache(instance.pk, instance.is_active and role == UserProfile.Role.OWNER)
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and "role" not in update_fields:
+        return
+    is_active = get_user_model().objects.filter(pk=instance.user_id).values_list("is_active", flat=True).first()
+    update_owner_cache(instance.user_id, bool(is_active) and instance.role == UserProfile.Role.OWNER)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    update_owner_cache(instance.pk, False)
+
+
+@receiver(post_delete, sender=UserProfile)
+def profile_deleted(sender, instance, **kwargs):
+    update_owner_cache(instance.user_id, False)
@@ -1,3 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from users.models import UserProfile
+from .services import OWNER_IDS_CACHE_KEY, owner_ids
+
+User = get_user_model()
+
+
+class OwnerCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="own", password="pass1234")
+        self.owner.profile.role = UserProfile.Role.OWNER
+        self.owner.profile.save()
+        self.cashier = User.objects.create_user(username="cash", password="pass1234")
+
+    def test_owner_ids_are_dropped_only_when_an_owner_joins_or_leaves(self):
+        self.assertEqual(owner_ids(), [self.owner.id])
+
+        update_last_login(None, self.owner)
+        self.cashier.first_name = "Amani"
+        self.cashier.save()
+        self.cashier.profile.phone = "0700000000"
+        self.cashier.profile.save()
+        self.assertEqual(cache.get(OWNER_IDS_CACHE_KEY), [self.owner.id])
+
+        self.cashier.profile.role = UserProfile.Role.OWNER
+        self.cashier.profile.save(update_fields=["role"])
+        self.assertIsNone(cache.get(OWNER_IDS_CACHE_KEY))
+        self.assertEqual(sorted(owner_ids()), sorted([self.owner.id, self.cashier.id]))
+
+        self.owner.is_active = False
+        self.owner.save()
+        self.assertEqual(owner_ids(), [self.cashier.id])
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Promotion
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ("name", "kind", "product", "category", "starts_at", "ends_at", "is_active")
+    search_fields = ("name",)
+    list_filter = ("kind", "is_active")
+    list_select_related = ("product", "category")
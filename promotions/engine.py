@@ -0,0 +1,177 @@
+import logging
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Promotion
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_index = None
+_loaded_at = 0.0
+
+CENT = Decimal("0.01")
+
+
+class CompiledPromotion(NamedTuple):
+    id: int
+    kind: str
+    rate: Decimal | None  # percent / 100
+    buy: int
+    get: int
+    starts_at: object
+    ends_at: object
+
+    def is_live(self, at) -> bool:
+        return (self.starts_at is None or self.starts_at <= at) and (self.ends_at is None or at < self.ends_at)
+
+    def free_units(self, quantity: int) -> int:
+        return (quantity // (self.buy + self.get)) * self.get
+
+
+class PromotionIndex(NamedTuple):
+    by_product: dict[int, tuple[CompiledPromotion, ...]]
+    by_category: dict[int, tuple[CompiledPromotion, ...]]
+
+    def candidates(self, product_id, category_id) -> tuple[CompiledPromotion, ...]:
+        return self.by_product.get(product_id, ()) + self.by_category.get(category_id, ())
+
+
+def _rule(pk, kind, percent, buy, get, starts_at, ends_at) -> CompiledPromotion:
+    """Compile one Promotion row. Raises ValueError for a row that cannot be applied."""
+    if kind == Promotion.Kind.PERCENT_OFF:
+        if percent is None or not (Decimal("0") < percent <= Decimal("100")):
+            raise ValueError(f"percent must be > 0 and <= 100, got {percent}")
+        return CompiledPromotion(pk, kind, percent / Decimal("100"), 0, 0, starts_at, ends_at)
+    if kind == Promotion.Kind.BUY_X_GET_Y:
+        if not buy or not get:
+            raise ValueError(f"buy_quantity and get_quantity must be >= 1, got {buy} and {get}")
+        return CompiledPromotion(pk, kind, None, buy, get, starts_at, ends_at)
+    raise ValueError(f"unknown kind {kind!r}")
+
+
+def _compile() -> PromotionIndex:
+    rows = (
+        Promotion.objects.filter(is_active=True)
+        .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=timezone.now()))
+        .order_by("id")
+        .values_list(
+            "id", "kind", "product_id", "category_id", "percent",
+            "buy_quantity", "get_quantity", "starts_at", "ends_at",
+        )
+    )
+    by_product, by_category = {}, {}
+    for pk, kind, product_id, category_id, percent, buy, get, starts_at, ends_at in rows:
+        try:
+            rule = _rule(pk, kind, percent, buy, get, starts_at, ends_at)
+        except ValueError as e:
+            # A bad rule must not take checkout down with it.
+            logger.error("Skipping promotion #%s: %s", pk, e)
+            continue
+
+        if product_id is not None:
+            by_product.setdefault(product_id, []).append(rule)
+        else:
+            by_category.setdefault(category_id, []).append(rule)
+
+    return PromotionIndex(
+        {k: tuple(v) for k, v in by_product.items()},
+        {k: tuple(v) for k, v in by_category.items()},
+    )
+
+
+def get_promotion_index() -> PromotionIndex:
+    """
+    Process-local index of active promotions keyed by product and by
+    category, compiled with one query. Promotion signals drop it on commit;
+    it is also rebuilt every PROMOTIONS_TTL_SECONDS for other workers' edits.
+    """
+    global _index, _loaded_at
+
+    ttl = getattr(settings, "PROMOTIONS_TTL_SECONDS", 60)
+    index = _index
+    if index is not None and time.monotonic() - _loaded_at < ttl:
+        return index
+
+    with _lock:
+        if _index is None or time.monotonic() - _loaded_at >= ttl:
+            _index = _compile()
+            _loaded_at = time.monotonic()
+        return _index
+
+
+def invalidate_promotion_index() -> None:
+    global _index
+    with _lock:
+        _index = None
+
+
+def apply_promotions(lines, *, at=None) -> list[tuple[Decimal, int | None]]:
+    """
+    Discount for each basket line.
+
+    lines: [(product_id, category_id, unit_price, quantity)]
+    Returns [(discount, promotion_id or None)] in the same order.
+
+    Each product gets the single best promotion among those indexed under
+    it or its category (no stacking). Buy-X-get-Y counts every line of the
+    product together and hands the free units to its lines in order.
+    Cost is linear in the basket, however many promotions exist.
+    """
+    lines = list(lines)
+    index = get_promotion_index()
+    if not index.by_product and not index.by_category:
+        return [(Decimal("0.00"), None)] * len(lines)
+
+    at = at or timezone.now()
+
+    units = {}
+    for product_id, _, _, quantity in lines:
+        units[product_id] = units.get(product_id, 0) + quantity
+
+    best = {}
+    for product_id, category_id, unit_price, _ in lines:
+        if product_id in best:
+            continue
+        chosen, chosen_value = None, Decimal("0.00")
+        for rule in index.candidates(product_id, category_id):
+            if not rule.is_live(at):
+                continue
+            if rule.rate is not None:
+                value = unit_price * units[product_id] * rule.rate
+            else:
+                value = unit_price * rule.free_units(units[product_id])
+            if value > chosen_value:
+                chosen, chosen_value = rule, value
+        best[product_id] = chosen
+
+    free_left = {
+        pid: rule.free_units(units[pid])
+        for pid, rule in best.items()
+        if rule is not None and rule.rate is None
+    }
+
+    result = []
+    for product_id, _, unit_price, quantity in lines:
+        rule = best[product_id]
+        if rule is None:
+            result.append((Decimal("0.00"), None))
+            continue
+
+        if rule.rate is not None:
+            discount = unit_price * quantity * rule.rate
+        else:
+            free = min(quantity, free_left[product_id])
+            free_left[product_id] -= free
+            discount = unit_price * free
+
+        discount = discount.quantize(CENT, rounding=ROUND_HALF_UP)
+        result.append((discount, rule.id) if discount > 0 else (Decimal("0.00"), None))
+
+    return result
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:29
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def check_existing_rules(apps, schema_editor):
+    # Fail with the offending ids rather than a bare constraint violation;
+    # fix or delete them (e.g. in the admin) and migrate again.
+    Promotion = apps.get_model("promotions", "Promotion")
+    bad = Promotion.objects.filter(
+        (Q(kind="PERCENT_OFF") & (Q(percent__isnull=True) | Q(percent__lte=0) | Q(percent__gt=100)))
+        | (Q(kind="BUY_X_GET_Y") & (Q(buy_quantity__isnull=True) | Q(buy_quantity__lt=1)
+                                    | Q(get_quantity__isnull=True) | Q(get_quantity__lt=1)))
+    ).values_list("id", flat=True)
+    if bad:
+        raise RuntimeError(f"Promotions with invalid percent/quantities: {sorted(bad)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_category_product_category'),
+        ('promotions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_existing_rules, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='promotion',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('kind', 'PERCENT_OFF'), _negated=True), models.Q(('percent__gt', 0), ('percent__lte', 100)), _connector='OR'), name='promotion_percent_off_in_range'),
+        ),
+        migrations.AddConstraint(
+            model_name='promotion',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('kind', 'BUY_X_GET_Y'), _negated=True), models.Q(('buy_quantity__gte', 1), ('get_quantity__gte', 1)), _connector='OR'), name='promotion_buy_x_get_y_quantities'),
+        ),
+    ]
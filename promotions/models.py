@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from catalog.models import Category, Product
+
+
+class Promotion(models.Model):
+    """
+    A discount rule for one product or every product in one category,
+    optionally limited to a time window.
+
+    PERCENT_OFF takes percent off the line.
+    BUY_X_GET_Y makes get_quantity units free for every buy_quantity +
+    get_quantity units of the same product in the basket.
+    """
+    class Kind(models.TextChoices):
+        PERCENT_OFF = "PERCENT_OFF", "Percent off"
+        BUY_X_GET_Y = "BUY_X_GET_Y", "Buy X get Y"
+
+    name = models.CharField(max_length=120)
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+
+    product = models.ForeignKey(
+        Product, null=True, blank=True, on_delete=models.CASCADE, related_name="promotions"
+    )
+    category = models.ForeignKey(
+        Category, null=True, blank=True, on_delete=models.CASCADE, related_name="promotions"
+    )
+
+    percent = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    buy_quantity = models.PositiveIntegerField(null=True, blank=True)
+    get_quantity = models.PositiveIntegerField(null=True, blank=True)
+
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    Q(product__isnull=False, category__isnull=True)
+                    | Q(product__isnull=True, category__isnull=False)
+                ),
+                name="promotion_targets_product_or_category",
+            ),
+            models.CheckConstraint(
+                condition=~Q(kind="PERCENT_OFF") | Q(percent__gt=0, percent__lte=100),
+                name="promotion_percent_off_in_range",
+            ),
+            models.CheckConstraint(
+                condition=~Q(kind="BUY_X_GET_Y") | Q(buy_quantity__gte=1, get_quantity__gte=1),
+                name="promotion_buy_x_get_y_quantities",
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        if self.kind == self.Kind.PERCENT_OFF:
+            if self.percent is None or not (Decimal("0.00") < self.percent <= Decimal("100.00")):
+                raise ValidationError({"percent": "Must be > 0 and <= 100."})
+        elif self.kind == self.Kind.BUY_X_GET_Y:
+            if not self.buy_quantity or not self.get_quantity:
+                raise ValidationError(
+                    {"buy_quantity": "buy_quantity and get_quantity are required for BUY_X_GET_Y."}
+                )
+
+    def is_live(self, at=None) -> bool:
+        at = at or timezone.now()
+        return (
+            self.is_active
+            and (self.starts_at is None or self.starts_at <= at)
+            and (self.ends_at is None or at < self.ends_at)
+        )
@@ -0,0 +1,45 @@
+from decimal import Decimal
+from rest_framework import serializers
+
+from .models import Promotion
+
+
+class PromotionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Promotion
+        fields = [
+            "id", "name", "kind",
+            "product", "category",
+            "percent", "buy_quantity", "get_quantity",
+            "starts_at", "ends_at", "is_active",
+            "created_at",
+        ]
+        read_only_fields = ["id", "created_at"]
+
+    def validate(self, attrs):
+        data = {**self._current(), **attrs}
+
+        if bool(data.get("product")) == bool(data.get("category")):
+            raise serializers.ValidationError("Set exactly one of product or category.")
+
+        if data.get("kind") == Promotion.Kind.PERCENT_OFF:
+            percent = data.get("percent")
+            if percent is None or not (Decimal("0.00") < percent <= Decimal("100.00")):
+                raise serializers.ValidationError({"percent": "Must be > 0 and <= 100."})
+        elif data.get("kind") == Promotion.Kind.BUY_X_GET_Y:
+            if not data.get("buy_quantity") or not data.get("get_quantity"):
+                raise serializers.ValidationError(
+                    {"buy_quantity": "buy_quantity and get_quantity are required for BUY_X_GET_Y."}
+                )
+
+        starts_at, ends_at = data.get("starts_at"), data.get("ends_at")
+        if starts_at and ends_at and ends_at <= starts_at:
+            raise serializers.ValidationError({"ends_at": "Must be after starts_at."})
+        return attrs
+
+    def _current(self) -> dict:
+        if self.instance is None:
+            return {}
+        return {name: getattr(self.instance, name) for name in (
+            "kind", "product", "category", "percent", "buy_quantity", "get_quantity", "starts_at", "ends_at",
+        )}
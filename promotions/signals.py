@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .engine import invalidate_promotion_index
+from .models import Promotion
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def refresh_promotion_index(sender, instance: Promotion, **kwargs):
+    transaction.on_commit(invalidate_promotion_index)
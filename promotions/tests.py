@@ -0,0 +1,140 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.models import UserProfile
+from catalog.models import Category, Product
+from inventory.ledger import record_movement
+from inventory.models import StockMovement
+from sales.models import Sale
+from sales.services import create_sale, quote_cart
+
+from .engine import _rule, invalidate_promotion_index
+from .models import Promotion
+
+
+User = get_user_model()
+
+
+class PromotionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.addCleanup(invalidate_promotion_index)
+
+        self.cashier = User.objects.create_user(username="cash1", password="pass1234")
+        self.cashier.profile.role = UserProfile.Role.CASHIER
+        self.cashier.profile.save()
+
+        self.owner = User.objects.create_user(username="own", password="pass1234")
+        self.owner.profile.role = UserProfile.Role.OWNER
+        self.owner.profile.save()
+
+        self.dairy = Category.objects.create(name="Dairy")
+        self.milk = Product.objects.create(
+            name="Milk", sku="MILK-1", category=self.dairy,
+            selling_price=Decimal("60.00"), cost_price=Decimal("45.00"), is_active=True,
+        )
+        self.bread = Product.objects.create(
+            name="Bread", sku="BRD-1",
+            selling_price=Decimal("50.00"), cost_price=Decimal("35.00"), is_active=True,
+        )
+        for product in (self.milk, self.bread):
+            record_movement(
+                product=product,
+                movement_type=StockMovement.MovementType.SUPPLY,
+                direction=StockMovement.Direction.IN,
+                quantity=50,
+                created_by=self.owner,
+            )
+
+    def _promotion(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Promotion.objects.create(**kwargs)
+
+    def test_create_sale_applies_best_promotion_per_product_and_stores_it_per_item(self):
+        now = timezone.now()
+        self._promotion(name="Dairy week", kind=Promotion.Kind.PERCENT_OFF, category=self.dairy, percent=Decimal("10"))
+        best = self._promotion(name="Milk 25%", kind=Promotion.Kind.PERCENT_OFF, product=self.milk, percent=Decimal("25"))
+        self._promotion(
+            name="Expired", kind=Promotion.Kind.PERCENT_OFF, product=self.bread, percent=Decimal("50"),
+            starts_at=now - timedelta(days=2), ends_at=now - timedelta(days=1),
+        )
+        self._promotion(
+            name="Next week", kind=Promotion.Kind.PERCENT_OFF, product=self.bread, percent=Decimal("50"),
+            starts_at=now + timedelta(days=7),
+        )
+
+        sale = create_sale(
+            cashier=self.cashier,
+            payment_method=Sale.PaymentMethod.CASH,
+            items=[{"product_id": self.milk.id, "quantity": 2}, {"product_id": self.bread.id, "quantity": 1}],
+        )
+
+        self.assertEqual(sale.subtotal, Decimal("170.00"))
+        self.assertEqual(sale.discount, Decimal("30.00"))
+        self.assertEqual(sale.total, Decimal("140.00"))
+        self.assertEqual(sale.amount_paid, Decimal("140.00"))
+        self.assertEqual(sale.payment_status, Sale.PaymentStatus.PAID)
+
+        milk_item, bread_item = sale.items.order_by("id")
+        self.assertEqual((milk_item.discount, milk_item.promotion_id, milk_item.line_total), (Decimal("30.00"), best.id, Decimal("90.00")))
+        self.assertEqual((bread_item.discount, bread_item.promotion_id), (Decimal("0.00"), None))
+
+    def test_buy_x_get_y_counts_repeated_lines_together_in_quote_and_checkout(self):
+        promo = self._promotion(
+            name="Bread 2+1", kind=Promotion.Kind.BUY_X_GET_Y, product=self.bread, buy_quantity=2, get_quantity=1,
+        )
+        items = [{"product_id": self.bread.id, "quantity": 2}, {"product_id": self.bread.id, "quantity": 4}]
+
+        quote = quote_cart(items)
+        self.assertEqual(quote["discount"], "100.00")
+        self.assertEqual(quote["total"], "200.00")
+        self.assertEqual([line["promotion_id"] for line in quote["lines"]], [promo.id, None])
+
+        sale = create_sale(cashier=self.cashier, payment_method=Sale.PaymentMethod.CASH, items=items)
+        self.assertEqual(sale.total, Decimal("200.00"))
+        self.assertEqual(list(sale.items.order_by("id").values_list("discount", flat=True)), [Decimal("100.00"), Decimal("0.00")])
+
+    def test_promotion_api_owner_writes_and_validates_kind_fields(self):
+        self.client.force_authenticate(user=self.cashier)
+        payload = {"name": "Milk 10%", "kind": "PERCENT_OFF", "product": self.milk.id, "percent": "10.00"}
+        self.assertEqual(self.client.post("/api/promotions/", payload, format="json").status_code, 403)
+        self.assertEqual(self.client.get("/api/promotions/").status_code, 200)
+
+        self.client.force_authenticate(user=self.owner)
+        res = self.client.post("/api/promotions/", {**payload, "percent": None}, format="json")
+        self.assertEqual(res.status_code, 400)
+        res = self.client.post("/api/promotions/", {**payload, "category": self.dairy.id}, format="json")
+        self.assertEqual(res.status_code, 400)
+
+        res = self.client.post("/api/promotions/", payload, format="json")
+        self.assertEqual(res.status_code, 201)
+
+    def test_malformed_rules_are_refused_by_the_model_and_skipped_by_the_engine(self):
+        bad = Promotion(name="Too much", kind=Promotion.Kind.PERCENT_OFF, product=self.milk, percent=Decimal("150"))
+        with self.assertRaises(ValidationError):
+            bad.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            bad.save()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Promotion.objects.create(
+                name="Free", kind=Promotion.Kind.BUY_X_GET_Y, product=self.milk, buy_quantity=0, get_quantity=0,
+            )
+
+        with self.assertRaises(ValueError):
+            _rule(1, Promotion.Kind.PERCENT_OFF, None, None, None, None, None)
+        with self.assertRaises(ValueError):
+            _rule(2, Promotion.Kind.BUY_X_GET_Y, None, 0, 0, None, None)
+
+        self._promotion(name="Milk 10%", kind=Promotion.Kind.PERCENT_OFF, product=self.milk, percent=Decimal("10"))
+        with self.assertLogs("promotions.engine", "ERROR"), \
+                mock.patch("promotions.engine._rule", side_effect=ValueError("bad")):
+            invalidate_promotion_index()
+            self.assertEqual(quote_cart([{"product_id": self.milk.id, "quantity": 1}])["discount"], "0.00")
@@ -0,0 +1,11 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from .views import PromotionViewSet
+
+router = DefaultRouter()
+router.register(r"", PromotionViewSet, basename="promotion")
+
+urlpatterns = [
+    path("", include(router.urls)),
+]
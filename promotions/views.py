@@ -0,0 +1,33 @@
+from rest_framework import viewsets
+from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.permissions import IsAuthenticated
+
+from users.permissions import IsCashier, IsOwner
+
+from .models import Promotion
+from .serializers import PromotionSerializer
+
+
+class PromotionViewSet(viewsets.ModelViewSet):
+    """
+    - CASHIER/OWNER can read
+    - OWNER can create/update/delete
+      ?is_active=1|0
+    """
+    queryset = Promotion.objects.select_related("product", "category")
+    serializer_class = PromotionSerializer
+    filter_backends = [SearchFilter, OrderingFilter]
+    search_fields = ["name"]
+    ordering_fields = ["created_at", "starts_at", "ends_at"]
+
+    def get_permissions(self):
+        if self.action in ["create", "update", "partial_update", "destroy"]:
+            return [IsOwner()]
+        return [IsAuthenticated(), IsCashier()]
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        is_active = self.request.query_params.get("is_active")
+        if is_active in ("0", "1"):
+            qs = qs.filter(is_active=(is_active == "1"))
+        return qs
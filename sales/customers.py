@@ -0,0 +1,132 @@
+import re
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Customer, Sale
+
+_SEPARATORS_RE = re.compile(r"[\s\-().]")
+
+ZERO = Decimal("0.00")
+
+
+class CreditLimitExceeded(ValueError):
+    pass
+
+
+def normalize_phone(phone: str) -> str:
+    """
+    Canonical form of a phone number as typed at the till: separators
+    dropped and local numbers ("0712...") or bare country-code numbers
+    ("254712...") written with +CUSTOMER_PHONE_COUNTRY_CODE.
+    """
+    phone = _SEPARATORS_RE.sub("", phone or "")
+    if phone.startswith("00"):
+        phone = "+" + phone[2:]
+
+    code = getattr(settings, "CUSTOMER_PHONE_COUNTRY_CODE", "")
+    if code and not phone.startswith("+"):
+        if phone.startswith("0"):
+            phone = f"+{code}{phone[1:]}"
+        elif phone.startswith(code):
+            phone = "+" + phone
+    return phone
+
+
+def lock_customer(phone: str, name: str = "") -> Customer | None:
+    """
+    The customer for phone, row-locked until the caller's transaction ends
+    and created on first sight; None when no phone was given.
+    """
+    phone = normalize_phone(phone)
+    if not phone:
+        return None
+
+    customer = Customer.objects.select_for_update().filter(phone=phone).first()
+    if customer is None:
+        try:
+            with transaction.atomic():
+                return Customer.objects.create(phone=phone, name=name or "")
+        except IntegrityError:
+            # Created by a concurrent checkout since we looked.
+            customer = Customer.objects.select_for_update().get(phone=phone)
+
+    if name and not customer.name:
+        customer.name = name
+        customer.save(update_fields=["name"])
+    return customer
+
+
+def check_credit(customer: Customer, owed: Decimal) -> None:
+    """Refuse a sale that would leave the (locked) customer past their limit."""
+    if owed <= ZERO or customer.credit_limit is None:
+        return
+    if customer.balance + owed > customer.credit_limit:
+        raise CreditLimitExceeded(
+            f"Credit limit exceeded for {customer.phone}: "
+            f"owes {customer.balance}, limit {customer.credit_limit}, this sale adds {owed}."
+        )
+
+
+def customer_figures(sale: Sale) -> tuple[Decimal, Decimal]:
+    """(balance owed, spend) that a sale contributes to its customer."""
+    if sale.status != Sale.Status.COMPLETED:
+        return ZERO, ZERO
+    return max(ZERO, sale.total - sale.amount_paid), sale.total
+
+
+def add_to_customer(customer_id: int | None, *, balance: Decimal = ZERO, lifetime_spend: Decimal = ZERO) -> None:
+    """Add to a customer's running figures in one UPDATE."""
+    if customer_id is None:
+        return
+
+    changes = {field: F(field) + amount for field, amount in
+               (("balance", balance), ("lifetime_spend", lifetime_spend)) if amount}
+    if changes:
+        Customer.objects.filter(pk=customer_id).update(**changes)
+
+
+def track_sale_change(sale: Sale, before: tuple[Decimal, Decimal]) -> None:
+    """Move the sale's customer by the change since customer_figures(sale) was `before`."""
+    balance, spend = customer_figures(sale)
+    add_to_customer(sale.customer_id, balance=balance - before[0], lifetime_spend=spend - before[1])
+
+
+def rebuild_customer_ledger() -> int:
+    """
+    Link sales that carry a phone but no customer (e.g. bulk-imported
+    history) and recompute every customer's balance and lifetime spend from
+    their sales in one UPDATE. Repairs any drift in the running figures.
+
+    Returns the number of customers.
+    """
+    with transaction.atomic():
+        unlinked = Sale.objects.filter(customer__isnull=True).exclude(customer_phone="")
+        names = {}
+        for raw, name in unlinked.values_list("customer_phone").annotate(name=Max("customer_name")):
+            phone = normalize_phone(raw)
+            if phone:
+                names.setdefault(phone, {})[raw] = name
+
+        Customer.objects.bulk_create(
+            [Customer(phone=phone, name=max(by_raw.values())) for phone, by_raw in names.items()],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+        ids = dict(Customer.objects.filter(phone__in=list(names)).values_list("phone", "id"))
+        for phone, by_raw in names.items():
+            unlinked.filter(customer_phone__in=list(by_raw)).update(customer_id=ids[phone])
+
+        money = DecimalField(max_digits=14, decimal_places=2)
+        completed = Sale.objects.filter(customer=OuterRef("pk"), status=Sale.Status.COMPLETED).values("customer")
+        owed = completed.annotate(
+            s=Sum(Greatest(F("total") - F("amount_paid"), Value(ZERO), output_field=money))
+        ).values("s")
+        spent = completed.annotate(s=Sum("total")).values("s")
+        return Customer.objects.update(
+            balance=Coalesce(Subquery(owed, output_field=money), Value(ZERO)),
+            lifetime_spend=Coalesce(Subquery(spent, output_field=money), Value(ZERO)),
+        )
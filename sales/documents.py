@@ -0,0 +1,51 @@
+from django.db import transaction
+
+from .models import Sale, SaleDocument
+from .serializers import SaleDetailSerializer
+
+
+def write_sale_documents(sale_ids) -> dict[int, SaleDocument]:
+    """
+    Render and store the detail document of each sale, bumping its version.
+
+    Callers hold the sale row locks, so reading the current versions and
+    upserting the new ones cannot interleave with another writer. The query
+    count does not depend on how many sales are written.
+    """
+    sale_ids = list(sale_ids)
+    if not sale_ids:
+        return {}
+
+    sales = (
+        Sale.objects.filter(pk__in=sale_ids)
+        .select_related("cashier", "receipt", "invoice")
+        .prefetch_related("items", "payments__received_by")
+    )
+    versions = dict(SaleDocument.objects.filter(sale_id__in=sale_ids).values_list("sale_id", "version"))
+
+    docs = [
+        SaleDocument(sale=sale, version=versions.get(sale.id, 0) + 1, body=SaleDetailSerializer(sale).data)
+        for sale in sales
+    ]
+    SaleDocument.objects.bulk_create(
+        docs,
+        update_conflicts=True,
+        unique_fields=["sale"],
+        update_fields=["version", "body", "updated_at"],
+    )
+    return {doc.sale_id: doc for doc in docs}
+
+
+def get_sale_document(sale_id: int) -> SaleDocument:
+    """
+    The stored document for a sale, rendering it first for sales recorded
+    before documents existed. Raises Sale.DoesNotExist.
+    """
+    doc = SaleDocument.objects.filter(sale_id=sale_id).first()
+    if doc is not None:
+        return doc
+
+    with transaction.atomic():
+        if not Sale.objects.select_for_update().filter(pk=sale_id).exists():
+            raise Sale.DoesNotExist(f"Sale {sale_id} does not exist.")
+        return SaleDocument.objects.filter(sale_id=sale_id).first() or write_sale_documents([sale_id])[sale_id]
@@ -0,0 +1,181 @@
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import Sale
+from .services import commit_sales_group, create_sale
+
+logger = logging.getLogger(__name__)
+
+_queue: "queue.Queue[_Ticket]" = queue.Queue()
+_committer = None
+_committer_lock = threading.Lock()
+
+
+class GroupCommitTimeout(Exception):
+    pass
+
+
+class _Ticket:
+    """
+    One submitted sale, waited on by the request thread that queued it.
+
+    It goes from QUEUED to either CLAIMED (the committer has taken it into
+    a group) or ABANDONED (its caller gave up waiting), never both.
+    """
+    QUEUED, CLAIMED, ABANDONED = "QUEUED", "CLAIMED", "ABANDONED"
+
+    def __init__(self, cashier, data: dict):
+        self.cashier = cashier
+        self.data = data
+        self.result = None
+        self.done = threading.Event()
+        self.state = self.QUEUED
+        self._lock = threading.Lock()
+
+    def _leave_queue(self, state: str) -> bool:
+        with self._lock:
+            if self.state != self.QUEUED:
+                return False
+            self.state = state
+            return True
+
+    def claim(self) -> bool:
+        return self._leave_queue(self.CLAIMED)
+
+    def abandon(self) -> bool:
+        return self._leave_queue(self.ABANDONED)
+
+    def resolve(self, result) -> None:
+        self.result = result
+        self.done.set()
+
+
+def submit_sale(*, cashier, data: dict) -> Sale:
+    """
+    Create a sale from a validated SaleCreateSerializer payload.
+
+    With SALES_GROUP_COMMIT on, the sale is handed to this process's
+    committer thread, which commits everything that arrives within
+    SALES_GROUP_COMMIT_WINDOW_MS in one transaction (one lock pass over the
+    products, one commit/fsync), and the caller blocks until its sale has
+    committed. Otherwise it is create_sale in the caller's thread.
+
+    Raises InsufficientStock/ValueError like create_sale, and
+    GroupCommitTimeout if the committer has not taken the sale up within
+    SALES_GROUP_COMMIT_TIMEOUT_SECONDS; the sale is then never committed,
+    so the request can safely be retried.
+    """
+    if not getattr(settings, "SALES_GROUP_COMMIT", False):
+        return create_sale(
+            cashier=cashier,
+            payment_type=data.get("payment_type", Sale.PaymentType.PAY_NOW),
+            payment_method=data.get("payment_method"),
+            amount_paid=data.get("amount_paid"),
+            due_date=data.get("due_date"),
+            customer_name=data.get("customer_name", ""),
+            customer_phone=data.get("customer_phone", ""),
+            items=data["items"],
+        )
+
+    ticket = _Ticket(cashier, data)
+    _ensure_committer()
+    _queue.put(ticket)
+    timeout = getattr(settings, "SALES_GROUP_COMMIT_TIMEOUT_SECONDS", 30)
+    if not ticket.done.wait(timeout):
+        if ticket.abandon():
+            raise GroupCommitTimeout(f"Sale not taken up within {timeout:g}s and not recorded; retry.")
+        # Already claimed into a group: its outcome is coming, as
+        # _commit_next_group resolves every ticket it collected.
+        ticket.done.wait()
+
+    if isinstance(ticket.result, Exception):
+        raise ticket.result
+    return ticket.result
+
+
+def _ensure_committer() -> None:
+    global _committer
+    if _committer is not None and _committer.is_alive():
+        return
+    with _committer_lock:
+        if _committer is None or not _committer.is_alive():
+            _committer = threading.Thread(target=_run_committer, name="sales-group-commit", daemon=True)
+            _committer.start()
+
+
+def _collect_group() -> list[_Ticket]:
+    """
+    Block for the first sale, then take whatever else arrives within the
+    window, up to SALES_GROUP_COMMIT_MAX_BATCH. An idle till pays at most
+    one window of extra latency; a busy one fills the batch sooner.
+    """
+    window = getattr(settings, "SALES_GROUP_COMMIT_WINDOW_MS", 5) / 1000
+    max_batch = max(1, int(getattr(settings, "SALES_GROUP_COMMIT_MAX_BATCH", 50)))
+
+    group = [_queue.get()]
+    deadline = time.monotonic() + window
+    while len(group) < max_batch:
+        remaining = deadline - time.monotonic()
+        try:
+            group.append(_queue.get(timeout=remaining) if remaining > 0 else _queue.get_nowait())
+        except queue.Empty:
+            break
+    return group
+
+
+def _run_committer() -> None:
+    while True:
+        try:
+            _commit_next_group()
+        finally:
+            close_old_connections()
+
+
+def _commit_next_group() -> None:
+    """
+    Collect and commit one group. Whatever escapes commit_group still
+    resolves the group's waiting tickets, so no request thread is left
+    blocked and the committer carries on with the next group.
+    """
+    group = _collect_group()
+    error = None
+    try:
+        commit_group(group)
+    except Exception as e:
+        logger.exception("Group commit of %s sale(s) crashed", len(group))
+        error = e
+    finally:
+        for ticket in group:
+            if not ticket.done.is_set():
+                ticket.resolve(error or RuntimeError("Group commit stopped before this sale was committed."))
+
+
+def commit_group(group: list[_Ticket]) -> None:
+    """
+    Commit a group and resolve every ticket. If the shared transaction
+    fails as a whole (anything but a per-sale stock/validation error), each
+    sale is retried in its own transaction so a bad sale cannot fail its
+    neighbours. Tickets whose caller gave up waiting are dropped; the rest
+    are claimed first, so their callers can no longer give up on them.
+    """
+    group = [t for t in group if t.claim()]
+    if not group:
+        return
+    try:
+        outcomes = commit_sales_group([(t.cashier, t.data) for t in group])
+    except Exception:
+        logger.exception("Group commit of %s sale(s) failed; committing them one by one", len(group))
+        outcomes = []
+        for ticket in group:
+            try:
+                outcomes.append(commit_sales_group([(ticket.cashier, ticket.data)])[0])
+            except Exception as e:
+                outcomes.append(e)
+
+    for ticket, outcome in zip(group, outcomes):
+        ticket.resolve(outcome)
@@ -0,0 +1,113 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+def _request_hash(request) -> str:
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def _replay(record: IdempotencyKey, request_hash: str) -> Response:
+    if record.request_hash != request_hash:
+        return Response(
+            {"detail": "Idempotency-Key was already used with a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.status_code is None:
+        return Response(
+            {"detail": "A request with this Idempotency-Key is still being processed."},
+            status=status.HTTP_409_CONFLICT,
+        )
+
+    response = Response(record.response_body, status=record.status_code)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(view_method):
+    """
+    Makes an APIView POST handler safe to retry.
+
+    When the client sends an Idempotency-Key header, the first request
+    runs normally and, if it succeeds, its response is stored for
+    IDEMPOTENCY_KEY_TTL_HOURS. Failed requests release the key so the
+    client can retry once the problem (e.g. stock) is fixed. While the
+    first request runs, the key is only held for
+    IDEMPOTENCY_IN_FLIGHT_SECONDS, so a worker that dies mid-request
+    does not lock the key for the whole TTL: a retry after the lease
+    takes it over.
+    Retries with the same key get the stored response back from a single
+    indexed read, without re-running the view or touching inventory locks.
+    Requests without the header are unaffected.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get("Idempotency-Key", "").strip()
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > 255:
+            return Response({"detail": "Idempotency-Key is too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        scope = f"{request.method} {request.path}"
+        request_hash = _request_hash(request)
+        now = timezone.now()
+        lookup = {"user": request.user, "scope": scope, "key": key}
+
+        record = IdempotencyKey.objects.filter(**lookup).first()
+        if record is not None and record.expires_at <= now:
+            record.delete()
+            record = None
+
+        if record is not None:
+            return _replay(record, request_hash)
+
+        lease = timedelta(seconds=getattr(settings, "IDEMPOTENCY_IN_FLIGHT_SECONDS", 120))
+        try:
+            record = IdempotencyKey.objects.create(request_hash=request_hash, expires_at=now + lease, **lookup)
+        except IntegrityError:
+            # A concurrent retry claimed the key first.
+            record = IdempotencyKey.objects.filter(**lookup).first()
+            if record is None:
+                return Response(
+                    {"detail": "A request with this Idempotency-Key is still being processed."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return _replay(record, request_hash)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if not status.is_success(response.status_code):
+            record.delete()
+            return response
+
+        # By pk, not save(): a retry may have taken over an overrun lease.
+        ttl = timedelta(hours=getattr(settings, "IDEMPOTENCY_KEY_TTL_HOURS", 24))
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            status_code=response.status_code,
+            response_body=json.loads(json.dumps(response.data, cls=DjangoJSONEncoder)),
+            expires_at=timezone.now() + ttl,
+        )
+        return response
+
+    return wrapper
+
+
+def purge_expired_idempotency_keys() -> int:
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,485 @@
+"""
+Bulk loader for legacy POS history (the import_history command).
+
+Records are written chunk by chunk with COPY on PostgreSQL (bulk_create
+elsewhere), without going through create_sale or the stock ledger, so no
+per-row stock update or owner notification happens. Stock effects are
+accumulated in the ImportCheckpoint and applied to Inventory once, at the
+end of the run.
+
+Sale record (one NDJSON object, or consecutive CSV rows sharing a ref with
+one item per row):
+    ref, created_at, cashier, status, payment_type, payment_method,
+    amount_paid, due_date, customer_name, customer_phone,
+    receipt_number, invoice_number, invoice_status,
+    items: [{sku, quantity, unit_price, discount, product_name, unit_cost}],
+    payments: [{method, amount, reference, received_at}]   (NDJSON only)
+
+Movement record:
+    sku, movement_type, direction, quantity, created_at, unit_cost, notes, created_by
+"""
+import csv
+import io
+import json
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from catalog.models import Product
+from inventory.models import Inventory, StockMovement
+from inventory.sharding import spread_stock
+from inventory.utils import is_low_stock
+from .customers import rebuild_customer_ledger
+from .models import DocumentSequence, ImportCheckpoint, Invoice, Payment, Receipt, Sale, SaleItem
+from .utils import _legacy_max
+
+CENT = Decimal("0.01")
+
+SALE_CSV_COLUMNS = (
+    "ref", "created_at", "cashier", "status", "payment_type", "payment_method",
+    "amount_paid", "due_date", "customer_name", "customer_phone",
+    "receipt_number", "invoice_number", "invoice_status",
+)
+ITEM_CSV_COLUMNS = ("sku", "quantity", "unit_price", "discount", "product_name", "unit_cost")
+
+MOVEMENT_DIRECTIONS = {
+    StockMovement.MovementType.SALE: StockMovement.Direction.OUT,
+    StockMovement.MovementType.SUPPLY: StockMovement.Direction.IN,
+    StockMovement.MovementType.RETURN: StockMovement.Direction.IN,
+    StockMovement.MovementType.VOID: StockMovement.Direction.IN,
+}
+
+
+class HistoryImportError(Exception):
+    pass
+
+
+def read_records(path: str, *, kind: str, fmt: str):
+    """Yield record dicts from an NDJSON or CSV file, lazily."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "ndjson":
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        elif kind == "movements":
+            yield from csv.DictReader(f)
+        else:
+            yield from _group_sale_rows(csv.DictReader(f))
+
+
+def _group_sale_rows(rows):
+    sale = None
+    for row in rows:
+        if sale is None or row.get("ref") != sale["ref"]:
+            if sale is not None:
+                yield sale
+            sale = {col: row.get(col) for col in SALE_CSV_COLUMNS}
+            sale["items"] = []
+        sale["items"].append({col: row.get(col) for col in ITEM_CSV_COLUMNS})
+    if sale is not None:
+        yield sale
+
+
+@contextmanager
+def _explicit_timestamps(*models):
+    """bulk_create would overwrite historical auto_now_add values; keep them."""
+    fields = [f for m in models for f in m._meta.concrete_fields if getattr(f, "auto_now_add", False)]
+    for f in fields:
+        f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f in fields:
+            f.auto_now_add = True
+
+
+def _copy_text(value) -> str:
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _reserve_ids(model, count: int) -> list[int]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+            [model._meta.db_table, model._meta.pk.column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _copy(model, objs) -> None:
+    fields = [f for f in model._meta.concrete_fields if not (f.primary_key and objs[0].pk is None)]
+    buf = io.StringIO()
+    for obj in objs:
+        buf.write("\t".join(_copy_text(f.get_db_prep_save(getattr(obj, f.attname), connection)) for f in fields))
+        buf.write("\n")
+    buf.seek(0)
+
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(f.column) for f in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {qn(model._meta.db_table)} ({columns}) FROM STDIN", buf)
+
+
+def _insert(model, objs, *, need_ids: bool = False) -> None:
+    """
+    Write objs with COPY on PostgreSQL, bulk_create elsewhere. With
+    need_ids the primary keys are set on objs (reserved from the sequence
+    before COPY) so children can point at them.
+    """
+    if not objs:
+        return
+    if connection.vendor == "postgresql":
+        if need_ids:
+            for obj, pk in zip(objs, _reserve_ids(model, len(objs))):
+                obj.pk = pk
+        _copy(model, objs)
+    else:
+        with _explicit_timestamps(model):
+            model.objects.bulk_create(objs)
+
+
+class HistoryImporter:
+    def __init__(self, *, name: str, kind: str, chunk_size: int = 1000, default_cashier=None):
+        if kind not in ("sales", "movements"):
+            raise HistoryImportError("kind must be sales or movements.")
+        self.name = name
+        self.kind = kind
+        self.chunk_size = chunk_size
+        self.default_cashier = default_cashier
+        self._products = None
+        self._users = None
+
+    # lookups ---------------------------------------------------------------
+
+    def _product(self, sku, ref) -> tuple:
+        """(id, name, cost_price) of the product with this sku."""
+        if self._products is None:
+            rows = Product.objects.values_list("sku", "id", "name", "cost_price")
+            self._products = {code: (pk, name, cost) for code, pk, name, cost in rows}
+        try:
+            return self._products[sku]
+        except KeyError:
+            raise HistoryImportError(f"{ref}: unknown sku {sku!r}.")
+
+    def _user_id(self, username, ref, *, required=True):
+        if self._users is None:
+            self._users = dict(get_user_model().objects.values_list("username", "id"))
+        username = username or self.default_cashier
+        if not username and not required:
+            return None
+        try:
+            return self._users[username]
+        except KeyError:
+            raise HistoryImportError(f"{ref}: unknown user {username!r}.")
+
+    # run -------------------------------------------------------------------
+
+    def run(self, records, *, progress=None) -> dict:
+        """
+        Load records from the checkpoint on, chunk_size per transaction,
+        then apply the accumulated stock change. Returns a summary.
+        """
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(name=self.name)
+        start = checkpoint.position
+        loaded = 0
+
+        records = islice(records, start, None)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                break
+            self._commit_chunk(chunk, start + loaded)
+            loaded += len(chunk)
+            if progress:
+                progress(start + loaded)
+
+        adjusted, clamped = self.finish()
+        return {"resumed_at": start, "loaded": loaded, "inventories_adjusted": adjusted, "clamped_skus": clamped}
+
+    @transaction.atomic
+    def _commit_chunk(self, chunk, position: int) -> None:
+        checkpoint = ImportCheckpoint.objects.select_for_update().get(name=self.name)
+        if checkpoint.position != position:
+            raise HistoryImportError(f"Checkpoint {self.name!r} moved to {checkpoint.position}; another run is active.")
+
+        deltas = self._load_sales(chunk) if self.kind == "sales" else self._load_movements(chunk)
+
+        merged = dict(checkpoint.stock_deltas)
+        for pid, delta in deltas.items():
+            merged[str(pid)] = merged.get(str(pid), 0) + delta
+        checkpoint.stock_deltas = merged
+        checkpoint.position = position + len(chunk)
+        checkpoint.finished_at = None
+        checkpoint.save(update_fields=["stock_deltas", "position", "finished_at", "updated_at"])
+
+    @transaction.atomic
+    def finish(self) -> tuple[int, list[str]]:
+        """
+        Apply the run's net stock change to Inventory in one pass, bring
+        the receipt/invoice counters past any imported numbers and link the
+        imported sales to customers (recomputing their balances).
+
+        A product whose stock would go negative is set to 0 and gets an
+        ADJUSTMENT IN movement for the difference, so its quantity still
+        matches its movements. Returns (inventories adjusted, their SKUs
+        that were clamped).
+        """
+        checkpoint = ImportCheckpoint.objects.select_for_update().get(name=self.name)
+        deltas = {int(pid): delta for pid, delta in checkpoint.stock_deltas.items() if delta}
+
+        inventories = list(
+            Inventory.objects.select_for_update(of=("self",))
+            .select_related("product")
+            .filter(product_id__in=deltas)
+            .order_by("product_id")
+        )
+        now = timezone.now()
+        clamped, balancing = [], []
+        for inv in inventories:
+            if inv.bucket_count:
+                quantity, shortfall = spread_stock(inv.pk, deltas[inv.product_id])
+            else:
+                quantity = inv.quantity + deltas[inv.product_id]
+                shortfall = max(-quantity, 0)
+                quantity += shortfall
+            if shortfall:
+                clamped.append(inv.product.sku)
+                balancing.append(StockMovement(
+                    product_id=inv.product_id, movement_type=StockMovement.MovementType.ADJUSTMENT,
+                    direction=StockMovement.Direction.IN, quantity=shortfall,
+                    notes=f"Import {self.name}: stock would have been -{shortfall}, set to 0",
+                ))
+            inv.quantity = quantity
+            inv.low_stock_flag = is_low_stock(inv)
+            inv.updated_at = now
+        Inventory.objects.bulk_update(inventories, ["quantity", "low_stock_flag", "updated_at"], batch_size=1000)
+        StockMovement.objects.bulk_create(balancing)
+
+        self._sync_document_sequences()
+        rebuild_customer_ledger()
+
+        checkpoint.stock_deltas = {}
+        checkpoint.finished_at = now
+        checkpoint.save(update_fields=["stock_deltas", "finished_at", "updated_at"])
+        return len(inventories), clamped
+
+    def _sync_document_sequences(self) -> None:
+        for seq in DocumentSequence.objects.select_for_update():
+            last = max(
+                seq.last_value,
+                _legacy_max(Receipt, "receipt_number", seq.prefix, seq.year),
+                _legacy_max(Invoice, "invoice_number", seq.prefix, seq.year),
+            )
+            if last != seq.last_value:
+                seq.last_value = last
+                seq.save(update_fields=["last_value"])
+
+    # sales -----------------------------------------------------------------
+
+    def _load_sales(self, chunk) -> dict[int, int]:
+        parsed = [self._parse_sale(rec) for rec in chunk]
+        sales = [sale for sale, *_ in parsed]
+        _insert(Sale, sales, need_ids=True)
+
+        items, movements, payments, receipts, invoices = [], [], [], [], []
+        deltas = {}
+        for sale, lines, sale_payments, receipt_number, invoice in parsed:
+            for product_id, qty, unit_price, line_total, discount, (name, sku, cost) in lines:
+                items.append(SaleItem(
+                    sale_id=sale.pk, product_id=product_id, quantity=qty,
+                    product_name_snapshot=name, sku_snapshot=sku, unit_cost_snapshot=cost,
+                    unit_price_snapshot=unit_price, line_total=line_total, discount=discount,
+                ))
+                movements.append(StockMovement(
+                    product_id=product_id, movement_type=StockMovement.MovementType.SALE,
+                    direction=StockMovement.Direction.OUT, quantity=qty, sale_id=sale.pk,
+                    created_by_id=sale.cashier_id, notes=f"Imported sale #{sale.pk}", created_at=sale.created_at,
+                ))
+                deltas[product_id] = deltas.get(product_id, 0) - qty
+                if sale.status == Sale.Status.VOIDED:
+                    movements.append(StockMovement(
+                        product_id=product_id, movement_type=StockMovement.MovementType.VOID,
+                        direction=StockMovement.Direction.IN, quantity=qty, sale_id=sale.pk,
+                        created_by_id=sale.cashier_id, notes=f"Imported void #{sale.pk}", created_at=sale.created_at,
+                    ))
+                    deltas[product_id] += qty
+
+            for method, amount, reference, received_at in sale_payments:
+                payments.append(Payment(
+                    sale_id=sale.pk, method=method, amount=amount, reference=reference,
+                    received_by_id=sale.cashier_id, received_at=received_at,
+                ))
+            if receipt_number:
+                receipts.append(Receipt(sale_id=sale.pk, receipt_number=receipt_number, generated_at=sale.created_at))
+            if invoice:
+                invoice_number, status = invoice
+                invoices.append(Invoice(
+                    sale_id=sale.pk, invoice_number=invoice_number, status=status,
+                    due_date=sale.due_date, issued_at=sale.created_at,
+                ))
+
+        _insert(SaleItem, items)
+        _insert(Payment, payments)
+        _insert(Receipt, receipts)
+        _insert(Invoice, invoices)
+        _insert(StockMovement, movements)
+        return deltas
+
+    def _parse_sale(self, rec):
+        ref = rec.get("ref") or "?"
+        try:
+            created_at = _datetime(rec.get("created_at"), ref)
+            cashier_id = self._user_id(rec.get("cashier"), ref)
+
+            raw_items = rec.get("items") or []
+            if not raw_items:
+                raise HistoryImportError(f"{ref}: sale has no items.")
+
+            lines = []
+            subtotal = discount = Decimal("0.00")
+            for item in raw_items:
+                qty = int(item["quantity"])
+                if qty < 1:
+                    raise HistoryImportError(f"{ref}: quantity must be >= 1.")
+                unit_price = _money(item["unit_price"])
+                line_discount = _money(item.get("discount") or "0")
+                gross = (unit_price * qty).quantize(CENT)
+                subtotal += gross
+                discount += line_discount
+                product_id, name, cost = self._product(item["sku"], ref)
+                # Legacy exports may carry the name/cost as sold; prefer those.
+                snapshot = (
+                    item.get("product_name") or name,
+                    item["sku"],
+                    _money(item["unit_cost"]) if item.get("unit_cost") else cost,
+                )
+                lines.append((product_id, qty, unit_price, gross - line_discount, line_discount, snapshot))
+            total = subtotal - discount
+
+            payment_type = rec.get("payment_type") or Sale.PaymentType.PAY_NOW
+            status = rec.get("status") or Sale.Status.COMPLETED
+            payment_method = rec.get("payment_method") or None
+            _check_choice(payment_type, Sale.PaymentType, "payment_type", ref)
+            _check_choice(status, Sale.Status, "status", ref)
+            if payment_method:
+                _check_choice(payment_method, Sale.PaymentMethod, "payment_method", ref)
+
+            payments = []
+            for p in rec.get("payments") or []:
+                _check_choice(p["method"], Sale.PaymentMethod, "payments.method", ref)
+                received_at = _datetime(p["received_at"], ref) if p.get("received_at") else created_at
+                payments.append((p["method"], _money(p["amount"]), p.get("reference") or "", received_at))
+
+            if rec.get("amount_paid") not in (None, ""):
+                amount_paid = _money(rec["amount_paid"])
+            elif payments:
+                amount_paid = sum((amount for _, amount, _, _ in payments), Decimal("0.00"))
+            else:
+                amount_paid = total if payment_type == Sale.PaymentType.PAY_NOW else Decimal("0.00")
+
+            due_date = parse_date(rec["due_date"]) if rec.get("due_date") else None
+        except (KeyError, ValueError, TypeError, InvalidOperation) as e:
+            raise HistoryImportError(f"{ref}: invalid record ({e!r}).")
+
+        payment_status = (
+            Sale.PaymentStatus.PAID if amount_paid >= total
+            else Sale.PaymentStatus.PARTIAL if amount_paid > Decimal("0.00")
+            else Sale.PaymentStatus.UNPAID
+        )
+
+        invoice = None
+        if rec.get("invoice_number"):
+            if due_date is None:
+                raise HistoryImportError(f"{ref}: invoice_number needs a due_date.")
+            invoice_status = rec.get("invoice_status") or (
+                Invoice.Status.CANCELLED if status == Sale.Status.VOIDED
+                else Invoice.Status.PAID if payment_status == Sale.PaymentStatus.PAID
+                else Invoice.Status.OVERDUE if due_date < timezone.localdate()
+                else Invoice.Status.OPEN
+            )
+            _check_choice(invoice_status, Invoice.Status, "invoice_status", ref)
+            invoice = (rec["invoice_number"], invoice_status)
+
+        sale = Sale(
+            cashier_id=cashier_id,
+            status=status,
+            payment_type=payment_type,
+            payment_status=payment_status,
+            payment_method=payment_method,
+            subtotal=subtotal,
+            discount=discount,
+            total=total,
+            amount_paid=amount_paid,
+            due_date=due_date,
+            customer_name=rec.get("customer_name") or "",
+            customer_phone=rec.get("customer_phone") or "",
+            created_at=created_at,
+        )
+        return sale, lines, payments, rec.get("receipt_number") or None, invoice
+
+    # movements -------------------------------------------------------------
+
+    def _load_movements(self, chunk) -> dict[int, int]:
+        movements = []
+        deltas = {}
+        for rec in chunk:
+            ref = rec.get("ref") or rec.get("sku") or "?"
+            try:
+                movement_type = rec["movement_type"]
+                _check_choice(movement_type, StockMovement.MovementType, "movement_type", ref)
+                direction = rec.get("direction") or MOVEMENT_DIRECTIONS.get(movement_type)
+                if direction is None:
+                    raise HistoryImportError(f"{ref}: direction is required for {movement_type}.")
+                _check_choice(direction, StockMovement.Direction, "direction", ref)
+                quantity = int(rec["quantity"])
+                if quantity < 1:
+                    raise HistoryImportError(f"{ref}: quantity must be >= 1.")
+                unit_cost = _money(rec["unit_cost"]) if rec.get("unit_cost") else None
+                created_at = _datetime(rec.get("created_at"), ref)
+            except (KeyError, ValueError, TypeError, InvalidOperation) as e:
+                raise HistoryImportError(f"{ref}: invalid record ({e!r}).")
+
+            product_id = self._product(rec["sku"], ref)[0]
+            movements.append(StockMovement(
+                product_id=product_id,
+                movement_type=movement_type,
+                direction=direction,
+                quantity=quantity,
+                unit_cost=unit_cost,
+                created_by_id=self._user_id(rec.get("created_by"), ref, required=False),
+                notes=rec.get("notes") or "Imported",
+                created_at=created_at,
+            ))
+            sign = 1 if direction == StockMovement.Direction.IN else -1
+            deltas[product_id] = deltas.get(product_id, 0) + sign * quantity
+
+        _insert(StockMovement, movements)
+        return deltas
+
+
+def _datetime(value, ref):
+    dt = parse_datetime(value) if value else None
+    if dt is None:
+        raise HistoryImportError(f"{ref}: created_at must be an ISO datetime.")
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+def _money(value) -> Decimal:
+    return Decimal(str(value)).quantize(CENT)
+
+
+def _check_choice(value, choices, field, ref):
+    if value not in choices.values:
+        raise HistoryImportError(f"{ref}: invalid {field} {value!r}.")
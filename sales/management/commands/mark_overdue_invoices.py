@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from sales.services import mark_overdue_invoices
+
+
+class Command(BaseCommand):
+    help = "Mark OPEN invoices past their due date as OVERDUE. Run daily (e.g. from cron)."
+
+    def handle(self, *args, **options):
+        marked = mark_overdue_invoices()
+        self.stdout.write(f"Marked {marked} invoices overdue.")
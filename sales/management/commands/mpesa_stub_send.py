@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.mpesa_stub import CALLBACK_PATH, confirmation, send
+
+
+class Command(BaseCommand):
+    help = (
+        "Act as the M-Pesa provider against a running server: post COUNT C2B "
+        "confirmations to the callback URL, each delivered REPEAT times."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default=f"http://127.0.0.1:8000{CALLBACK_PATH}")
+        parser.add_argument("--amount", type=Decimal, required=True)
+        parser.add_argument("--bill-ref", default="", help="Account number: invoice number or sale id.")
+        parser.add_argument("--msisdn", default="254700000000")
+        parser.add_argument("--count", type=int, default=1)
+        parser.add_argument("--repeat", type=int, default=1, help="Deliveries per confirmation (provider retries).")
+        parser.add_argument("--batch", type=int, default=1, help="Confirmations per POST.")
+
+    def handle(self, *args, **options):
+        payloads = [
+            confirmation(amount=options["amount"], bill_ref=options["bill_ref"], msisdn=options["msisdn"])
+            for _ in range(options["count"])
+        ] * max(1, options["repeat"])
+        batch = max(1, options["batch"])
+        token = getattr(settings, "MPESA_CALLBACK_TOKEN", "")
+
+        posted = 0
+        for start in range(0, len(payloads), batch):
+            chunk = payloads[start:start + batch]
+            try:
+                send(chunk if batch > 1 else chunk[0], url=options["url"], token=token)
+            except OSError as e:
+                raise CommandError(f"POST {options['url']} failed: {e}")
+            posted += len(chunk)
+
+        self.stdout.write(f"Posted {posted} confirmation(s) ({options['count']} unique).")
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sales.mpesa import process_pending_callbacks
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply stored M-Pesa confirmations to their sales. Run with --interval "
+        "when MPESA_CALLBACK_DISPATCH=off, or once to pick up anything left pending."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, help="Repeat every N seconds instead of running once.")
+        parser.add_argument("--batch-size", type=int, help="Confirmations per transaction.")
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            counts = process_pending_callbacks(options["batch_size"])
+            if any(counts.values()) or not interval:
+                self.stdout.write(f"Applied {counts['APPLIED']}, unmatched {counts['UNMATCHED']}.")
+            if not interval:
+                return
+            time.sleep(interval)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from sales.idempotency import purge_expired_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses whose TTL has expired."
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_idempotency_keys()
+        self.stdout.write(f"Purged {deleted} expired idempotency keys.")
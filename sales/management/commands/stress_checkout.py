@@ -0,0 +1,79 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.stress import ISOLATION_LEVELS, parse_mix, run_stress
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer checkout, voids, payments and stock ops from N processes against the configured "
+        "PostgreSQL database, check stock/receipt invariants and report throughput, latency and "
+        "retries per isolation level. Use a local or scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--isolation", action="append", choices=list(ISOLATION_LEVELS),
+            help="Repeatable. Defaults to all three levels.",
+        )
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--products", type=int, default=5, help="Shared products every worker buys.")
+        parser.add_argument("--stock", type=int, default=500, help="Starting stock per product.")
+        parser.add_argument("--buckets", type=int, default=0, help="Split each product into N stock buckets.")
+        parser.add_argument("--mix", default="", help="Operation weights, e.g. sale=70,void=8,payment=12,supply=5,adjust=5")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run.")
+        parser.add_argument("--ops", type=int, default=0, help="Stop each worker after this many operations.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--keep", action="store_true", help="Keep the generated rows.")
+        parser.add_argument("--json", action="store_true", help="Print the reports as JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options["mix"]) if options["mix"] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options["workers"] < 1 or options["products"] < 1:
+            raise CommandError("--workers and --products must be >= 1.")
+
+        reports = []
+        failed = False
+        for isolation in options["isolation"] or list(ISOLATION_LEVELS):
+            report = run_stress(
+                isolation=isolation,
+                workers=options["workers"],
+                products=options["products"],
+                stock=options["stock"],
+                buckets=options["buckets"],
+                mix=mix,
+                duration=options["duration"],
+                ops_per_worker=options["ops"],
+                seed=options["seed"],
+                keep=options["keep"],
+            )
+            reports.append(report)
+            failed = failed or bool(report["invariant_violations"])
+            if not options["json"]:
+                self._print(report)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(reports, indent=2))
+        if failed:
+            raise CommandError("Invariant violations found.")
+
+    def _print(self, r):
+        self.stdout.write(
+            f"{r['isolation']}: {r['operations']} ops in {r['seconds']}s = {r['ops_per_second']} ops/s "
+            f"({r['sales_per_second']} sales/s), p50 {r['p50_ms']}ms, p99 {r['p99_ms']}ms"
+        )
+        for op, stats in r["by_operation"].items():
+            self.stdout.write(f"  {op:<8} {stats['count']:>6}  p50 {stats['p50_ms']}ms  p99 {stats['p99_ms']}ms")
+        self.stdout.write(
+            f"  ok {r['ok']}, rejected {r['rejected']}, retries {r['retries'] or 0}, "
+            f"aborted {r['aborted'] or 0}, errors {r['errors'] or 0}"
+        )
+        if r["invariant_violations"]:
+            for problem in r["invariant_violations"]:
+                self.stdout.write(self.style.ERROR(f"  VIOLATION: {problem}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("  invariants hold"))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_saleitem_returned_quantity_salereturn_salereturnitem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['-created_at', '-id'], name='sale_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['cashier', '-created_at', '-id'], name='sale_cashier_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='sale_status_created_idx'),
+        ),
+    ]
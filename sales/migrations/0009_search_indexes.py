@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:34
+
+from django.db import migrations, models
+
+
+def create_trigram_index(apps, schema_editor):
+    # pg_trgm ships with PostgreSQL contrib but is not installed everywhere;
+    # without it sales.search falls back to a plain icontains scan.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS sale_customer_name_trgm_idx "
+        "ON sales_sale USING gin (customer_name gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS sale_customer_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_saledocument'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='customer_phone',
+            field=models.CharField(blank=True, db_index=True, max_length=30),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
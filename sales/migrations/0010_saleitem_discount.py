@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:35
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0001_initial'),
+        ('sales', '0009_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saleitem',
+            name='discount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='promotion',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sale_items', to='promotions.promotion'),
+        ),
+    ]
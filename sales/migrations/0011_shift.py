@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:37
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0010_saleitem_discount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Shift',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('opened_at', models.DateTimeField(auto_now_add=True)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('opening_float', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('counted_cash', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('sales_count', models.PositiveIntegerField(default=0)),
+                ('sales_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('discount_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('credit_issued', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('voids_count', models.PositiveIntegerField(default=0)),
+                ('voids_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('refunds_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('cash_collected', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('mpesa_collected', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('card_collected', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('bank_collected', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('cashier', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='shifts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-opened_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='shift',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payments', to='sales.shift'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='shift',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales', to='sales.shift'),
+        ),
+        migrations.AddConstraint(
+            model_name='shift',
+            constraint=models.UniqueConstraint(condition=models.Q(('closed_at__isnull', True)), fields=('cashier',), name='uniq_open_shift_per_cashier'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0011_shift'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('status__in', ['OPEN', 'OVERDUE'])), fields=['due_date'], name='invoice_unsettled_due_idx'),
+        ),
+    ]
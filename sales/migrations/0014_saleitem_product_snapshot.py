@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0013_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saleitem',
+            name='product_name_snapshot',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='sku_snapshot',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='unit_cost_snapshot',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_snapshots(apps, schema_editor):
+    # Items sold before the snapshot existed take the product as it is now;
+    # one UPDATE ... FROM subquery per column set, no per-row round trips.
+    SaleItem = apps.get_model("sales", "SaleItem")
+    Product = apps.get_model("catalog", "Product")
+    product = Product.objects.filter(pk=OuterRef("product_id"))
+    SaleItem.objects.filter(sku_snapshot="").update(
+        product_name_snapshot=Subquery(product.values("name")[:1]),
+        sku_snapshot=Subquery(product.values("sku")[:1]),
+        unit_cost_snapshot=Subquery(product.values("cost_price")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_category_product_category'),
+        ('sales', '0014_saleitem_product_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import DecimalField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from sales.customers import normalize_phone
+
+
+def backfill_customers(apps, schema_editor):
+    # One customer per normalized phone seen on existing sales, then the
+    # running figures from their history in a single UPDATE.
+    Sale = apps.get_model("sales", "Sale")
+    Customer = apps.get_model("sales", "Customer")
+
+    names = {}
+    phoned = Sale.objects.exclude(customer_phone="")
+    for raw, name in phoned.values_list("customer_phone").annotate(name=Max("customer_name")):
+        phone = normalize_phone(raw)
+        if phone:
+            names.setdefault(phone, {})[raw] = name
+
+    Customer.objects.bulk_create(
+        [Customer(phone=phone, name=max(by_raw.values())) for phone, by_raw in names.items()],
+        batch_size=1000,
+    )
+    ids = dict(Customer.objects.values_list("phone", "id"))
+    for phone, by_raw in names.items():
+        phoned.filter(customer_phone__in=list(by_raw)).update(customer_id=ids[phone])
+
+    money = DecimalField(max_digits=14, decimal_places=2)
+    completed = Sale.objects.filter(customer=OuterRef("pk"), status="COMPLETED").values("customer")
+    owed = completed.annotate(
+        s=Sum(Greatest(F("total") - F("amount_paid"), Value(Decimal("0.00")), output_field=money))
+    ).values("s")
+    spent = completed.annotate(s=Sum("total")).values("s")
+    Customer.objects.update(
+        balance=Coalesce(Subquery(owed, output_field=money), Value(Decimal("0.00"))),
+        lifetime_spend=Coalesce(Subquery(spent, output_field=money), Value(Decimal("0.00"))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0016_customer'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_customers, migrations.RunPython.noop),
+    ]
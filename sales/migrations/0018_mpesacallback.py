@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0017_backfill_customers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MpesaCallback',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trans_id', models.CharField(max_length=40, unique=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('msisdn', models.CharField(blank=True, max_length=30)),
+                ('bill_ref', models.CharField(blank=True, max_length=60)),
+                ('payer_name', models.CharField(blank=True, max_length=120)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('APPLIED', 'Applied'), ('UNMATCHED', 'Unmatched')], default='PENDING', max_length=20)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('sale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mpesa_callbacks', to='sales.sale')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'PENDING')), fields=['id'], name='mpesa_callback_pending_idx')],
+            },
+        ),
+    ]
@@ -44,13 +44,22 @@ class Sale(models.Model):
     amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     due_date = models.DateField(null=True, blank=True)
 
+    shift = models.ForeignKey("Shift", null=True, blank=True, on_delete=models.SET_NULL, related_name="sales")
+    customer = models.ForeignKey("Customer", null=True, blank=True, on_delete=models.PROTECT, related_name="sales")
+
     customer_name = models.CharField(max_length=120, blank=True)
-    customer_phone = models.CharField(max_length=30, blank=True)
+    # db_index also gives a varchar_pattern_ops index for prefix search.
+    customer_phone = models.CharField(max_length=30, blank=True, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="sale_created_id_idx"),
+            models.Index(fields=["cashier", "-created_at", "-id"], name="sale_cashier_created_idx"),
+            models.Index(fields=["status", "-created_at", "-id"], name="sale_status_created_idx"),
+        ]
 
     def __str__(self):
         return f"Sale #{self.id} - {self.status}"
@@ -60,11 +69,22 @@ class SaleItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name="sale_items")
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
 
+    # The product as sold; later renames or cost changes don't rewrite history.
+    product_name_snapshot = models.CharField(max_length=200, blank=True)
+    sku_snapshot = models.CharField(max_length=64, blank=True)
+    unit_cost_snapshot = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
     unit_price_snapshot = models.DecimalField(max_digits=12, decimal_places=2)
+    # Net of discount: unit_price_snapshot * quantity - discount.
     line_total = models.DecimalField(max_digits=12, decimal_places=2)
+    discount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    promotion = models.ForeignKey(
+        "promotions.Promotion", null=True, blank=True, on_delete=models.SET_NULL, related_name="sale_items"
+    )
+    returned_quantity = models.PositiveIntegerField(default=0)
 
     def __str__(self):
-        return f"{self.product.sku} x{self.quantity}"
+        return f"{self.sku_snapshot} x{self.quantity}"
 
 
 class Receipt(models.Model):
@@ -89,6 +109,16 @@ class Invoice(models.Model):
     due_date = models.DateField()
     issued_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Only unsettled invoices: serves the overdue sweep and the aging report.
+            models.Index(
+                fields=["due_date"],
+                name="invoice_unsettled_due_idx",
+                condition=models.Q(status__in=["OPEN", "OVERDUE"]),
+            ),
+        ]
+
     def __str__(self):
         return self.invoice_number
 
@@ -106,7 +136,246 @@ class Payment(models.Model):
         blank=True,
         related_name="received_payments",
     )
+    shift = models.ForeignKey("Shift", null=True, blank=True, on_delete=models.SET_NULL, related_name="payments")
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-received_at"]
+
+
+class SaleReturn(models.Model):
+    """
+    One customer return against a sale: some quantity of one or more of
+    its lines, and the money (if any) handed back for it.
+    """
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name="returns")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="sale_returns",
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    refund_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    refund_method = models.CharField(max_length=20, choices=Sale.PaymentMethod.choices, null=True, blank=True)
+    notes = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Return #{self.id} on Sale #{self.sale_id}"
+
+
+class SaleReturnItem(models.Model):
+    sale_return = models.ForeignKey(SaleReturn, on_delete=models.CASCADE, related_name="items")
+    sale_item = models.ForeignKey(SaleItem, on_delete=models.PROTECT, related_name="return_items")
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.sale_item_id} x{self.quantity}"
+
+
+class DocumentSequence(models.Model):
+    """
+    Counter row per (prefix, year) backing receipt and invoice numbers.
+    Workers reserve blocks of numbers from it; see sales.utils.
+    """
+    prefix = models.CharField(max_length=20)
+    year = models.PositiveSmallIntegerField()
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["prefix", "year"], name="uniq_document_sequence_prefix_year"),
+        ]
+
+    def __str__(self):
+        return f"{self.prefix}-{self.year} @ {self.last_value}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored outcome of a POST sent with an Idempotency-Key header, so a
+    retried request can be answered without running the view again.
+    A null status_code means the first request is still in flight; its
+    expires_at is then a short lease rather than the replay TTL.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    scope = models.CharField(max_length=200)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "scope", "key"], name="uniq_idempotency_key_per_user_scope"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} [{self.key}]"
+
+
+class SaleDocument(models.Model):
+    """
+    Pre-rendered detail view of a sale (SaleDetailSerializer output), rewritten
+    whenever the sale changes and served as-is by the detail endpoint.
+    version increases on every rewrite and backs the ETag.
+    """
+    sale = models.OneToOneField(Sale, on_delete=models.CASCADE, primary_key=True, related_name="document")
+    version = models.PositiveIntegerField(default=1)
+    body = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Sale #{self.sale_id} v{self.version}"
+
+
+class Shift(models.Model):
+    """
+    A cashier's drawer session. Checkout, payments, voids and returns add
+    to the running totals of the acting user's open shift as they happen
+    (see sales.shifts), so closing it and printing the Z-report reads
+    this one row.
+
+    The *_collected columns are money taken per payment method, net of
+    refunds handed back from this drawer.
+    """
+    cashier = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="shifts")
+    opened_at = models.DateTimeField(auto_now_add=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    opening_float = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    counted_cash = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
+    sales_count = models.PositiveIntegerField(default=0)
+    sales_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    discount_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    credit_issued = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    voids_count = models.PositiveIntegerField(default=0)
+    voids_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    refunds_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+
+    cash_collected = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    mpesa_collected = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    card_collected = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    bank_collected = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        ordering = ["-opened_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cashier"],
+                condition=models.Q(closed_at__isnull=True),
+                name="uniq_open_shift_per_cashier",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Shift #{self.id} ({self.cashier_id})"
+
+    @property
+    def is_open(self) -> bool:
+        return self.closed_at is None
+
+    @property
+    def expected_cash(self) -> Decimal:
+        return self.opening_float + self.cash_collected
+
+
+class Customer(models.Model):
+    """
+    A credit/returning customer, keyed by normalized phone (see
+    sales.customers). Checkout, payments, voids and returns on the
+    customer's sales adjust the running figures as they happen, so credit
+    checks and statements read this one row.
+
+    balance: credit still owed across the customer's completed sales.
+    lifetime_spend: total of the customer's completed (non-voided) sales.
+    credit_limit: ceiling on balance for new credit; null means no limit.
+    """
+    phone = models.CharField(max_length=30, unique=True)
+    name = models.CharField(max_length=120, blank=True)
+
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    credit_limit = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["phone"]
+
+    def __str__(self):
+        return f"{self.name or 'Customer'} ({self.phone})"
+
+    @property
+    def available_credit(self) -> Decimal | None:
+        if self.credit_limit is None:
+            return None
+        return max(Decimal("0.00"), self.credit_limit - self.balance)
+
+
+class MpesaCallback(models.Model):
+    """
+    An M-Pesa payment confirmation as received from the provider. Stored
+    on arrival (once per TransID) and applied to a sale later, in batches,
+    by sales.mpesa.
+    """
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        APPLIED = "APPLIED", "Applied"
+        UNMATCHED = "UNMATCHED", "Unmatched"
+
+    trans_id = models.CharField(max_length=40, unique=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    msisdn = models.CharField(max_length=30, blank=True)
+    bill_ref = models.CharField(max_length=60, blank=True)
+    payer_name = models.CharField(max_length=120, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    sale = models.ForeignKey(Sale, null=True, blank=True, on_delete=models.SET_NULL, related_name="mpesa_callbacks")
+    error = models.CharField(max_length=255, blank=True)
+
     received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
-        ordering = ["-received_at"]
\ No newline at end of file
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(status="PENDING"),
+                name="mpesa_callback_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.trans_id} {self.amount} ({self.status})"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of a historical import (see sales.importer). Updated in the
+    same transaction as each loaded chunk, so a re-run resumes exactly
+    after the last committed record.
+
+    stock_deltas holds the net quantity change per product of the chunks
+    loaded so far; it is applied to Inventory once when the import finishes.
+    """
+    name = models.CharField(max_length=200, unique=True)
+    position = models.PositiveBigIntegerField(default=0)
+    stock_deltas = models.JSONField(default=dict, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
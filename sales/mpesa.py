@@ -0,0 +1,191 @@
+"""
+M-Pesa payment confirmations (C2B callbacks).
+
+The callback view only stores each confirmation: one INSERT ... ON CONFLICT
+DO NOTHING on TransID, so provider retries and duplicate deliveries are
+dropped by the database. Applying them is separate: a batch of pending
+rows is claimed with SKIP LOCKED (several workers can drain the table side
+by side), matched to a sale and run through add_payment, or
+allocate_customer_payment for a payment matched to a customer by phone, in one
+transaction per batch.
+
+A confirmation is matched by its BillRefNumber (the account number the
+customer typed) against invoice and receipt numbers, then against an
+explicit sale id ("SALE-123" or "#123"). A bare number is never taken as a
+sale id: if it looks like a phone number it is paid to that customer's open
+credit sales, as is a confirmation with no BillRefNumber by the paying
+phone. Anything that cannot be applied is kept as UNMATCHED with the reason.
+"""
+import logging
+import re
+import threading
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from inventory.contention import retry_on_contention
+from .customers import normalize_phone
+from .models import Invoice, MpesaCallback, Receipt, Sale
+from .services import add_payment, allocate_customer_payment
+
+logger = logging.getLogger(__name__)
+
+_SALE_REF_RE = re.compile(r"(?:SALE-?|#)(\d+)")
+_PHONE_REF_RE = re.compile(r"\+?\d{9,15}")
+
+_wake = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+class MpesaCallbackError(Exception):
+    pass
+
+
+def parse_confirmation(payload: dict) -> MpesaCallback:
+    """Build an unsaved MpesaCallback from a Daraja C2B confirmation body."""
+    if not isinstance(payload, dict):
+        raise MpesaCallbackError("Confirmation must be a JSON object.")
+
+    trans_id = str(payload.get("TransID") or "").strip()
+    if not trans_id or len(trans_id) > 40:
+        raise MpesaCallbackError("TransID is required.")
+
+    try:
+        amount = Decimal(str(payload.get("TransAmount"))).quantize(Decimal("0.01"))
+    except (InvalidOperation, ValueError):
+        raise MpesaCallbackError(f"{trans_id}: invalid TransAmount.")
+    if amount <= Decimal("0.00"):
+        raise MpesaCallbackError(f"{trans_id}: TransAmount must be greater than 0.")
+
+    return MpesaCallback(
+        trans_id=trans_id,
+        amount=amount,
+        msisdn=normalize_phone(str(payload.get("MSISDN") or ""))[:30],
+        bill_ref=str(payload.get("BillRefNumber") or "").strip()[:60],
+        payer_name=" ".join(
+            str(payload.get(k) or "").strip() for k in ("FirstName", "MiddleName", "LastName")
+        ).strip()[:120],
+        payload=payload,
+    )
+
+
+def enqueue_confirmations(payloads: list[dict]) -> None:
+    """
+    Store confirmations for matching. Already-seen TransIDs are ignored.
+    Raises MpesaCallbackError, storing nothing, if any payload is invalid.
+    """
+    callbacks = [parse_confirmation(p) for p in payloads]
+    MpesaCallback.objects.bulk_create(callbacks, ignore_conflicts=True)
+    transaction.on_commit(_dispatch)
+
+
+def _dispatch() -> None:
+    mode = getattr(settings, "MPESA_CALLBACK_DISPATCH", "thread")
+    if mode == "sync":
+        process_pending_callbacks()
+    elif mode == "thread":
+        _ensure_worker()
+        _wake.set()
+
+
+def _ensure_worker() -> None:
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name="mpesa-callbacks", daemon=True)
+            _worker.start()
+
+
+def _run_worker() -> None:
+    """
+    Sleep until a callback arrives, then drain the table. A burst of
+    callbacks coalesces into a few wake-ups and full batches.
+    """
+    while True:
+        _wake.wait()
+        _wake.clear()
+        try:
+            process_pending_callbacks()
+        except Exception:
+            logger.exception("Failed to apply M-Pesa callbacks")
+        finally:
+            close_old_connections()
+
+
+def process_pending_callbacks(batch_size: int | None = None) -> dict:
+    """Apply batches until nothing is pending. Returns counts by outcome."""
+    batch_size = batch_size or getattr(settings, "MPESA_CALLBACK_BATCH_SIZE", 200)
+    totals = {MpesaCallback.Status.APPLIED: 0, MpesaCallback.Status.UNMATCHED: 0}
+    while True:
+        counts = apply_callback_batch(batch_size)
+        for outcome, n in counts.items():
+            totals[outcome] += n
+        if sum(counts.values()) < batch_size:
+            return totals
+
+
+@retry_on_contention
+@transaction.atomic
+def apply_callback_batch(batch_size: int) -> dict:
+    """
+    Claim up to batch_size pending confirmations (oldest first, skipping
+    rows another worker holds) and apply each in its own savepoint, so one
+    that cannot be applied does not hold back the rest of the batch.
+    """
+    batch = list(
+        MpesaCallback.objects.select_for_update(skip_locked=True)
+        .filter(status=MpesaCallback.Status.PENDING)
+        .order_by("id")[:batch_size]
+    )
+    if not batch:
+        return {}
+
+    refs = {cb.bill_ref.upper() for cb in batch if cb.bill_ref}
+    documents = dict(
+        Receipt.objects.filter(receipt_number__in=refs).values_list("receipt_number", "sale_id")
+    )
+    documents.update(
+        Invoice.objects.filter(invoice_number__in=refs).values_list("invoice_number", "sale_id")
+    )
+
+    counts = {MpesaCallback.Status.APPLIED: 0, MpesaCallback.Status.UNMATCHED: 0}
+    now = timezone.now()
+    for cb in batch:
+        ref = cb.bill_ref.upper()
+        sale_id = documents.get(ref)
+        if sale_id is None and (m := _SALE_REF_RE.fullmatch(ref)):
+            sale_id = int(m.group(1))
+        phone = normalize_phone(ref) if ref else cb.msisdn
+        if ref and not _PHONE_REF_RE.fullmatch(phone):
+            phone = ""
+        try:
+            with transaction.atomic():
+                if sale_id is not None:
+                    add_payment(
+                        sale_id=sale_id, received_by=None, method=Sale.PaymentMethod.MPESA,
+                        amount=cb.amount, reference=cb.trans_id,
+                    )
+                elif phone:
+                    applied = allocate_customer_payment(
+                        customer_phone=phone, received_by=None, method=Sale.PaymentMethod.MPESA,
+                        amount=cb.amount, reference=cb.trans_id,
+                    )
+                    sale_id = applied[0][0].id
+                else:
+                    raise ValueError(f"No invoice, receipt or sale matches account '{cb.bill_ref}'.")
+        except Sale.DoesNotExist:
+            cb.status, cb.error = MpesaCallback.Status.UNMATCHED, f"Sale #{sale_id} not found."
+        except ValueError as e:
+            cb.status, cb.error = MpesaCallback.Status.UNMATCHED, str(e)[:255]
+        else:
+            cb.status, cb.sale_id = MpesaCallback.Status.APPLIED, sale_id
+        cb.processed_at = now
+        counts[cb.status] += 1
+
+    MpesaCallback.objects.bulk_update(batch, ["status", "sale", "error", "processed_at"])
+    return counts
@@ -0,0 +1,60 @@
+"""
+Stand-in for the M-Pesa provider in local development and tests: builds
+C2B confirmation bodies the way Daraja sends them and posts them to the
+callback URL.
+"""
+import json
+import secrets
+import urllib.request
+from decimal import Decimal
+
+from django.utils import timezone
+
+CALLBACK_PATH = "/api/sales/mpesa/callback/"
+
+
+def confirmation(
+    *,
+    amount: Decimal,
+    bill_ref: str = "",
+    msisdn: str = "254700000000",
+    trans_id: str | None = None,
+    first_name: str = "John",
+) -> dict:
+    return {
+        "TransactionType": "Pay Bill",
+        "TransID": trans_id or "S" + secrets.token_hex(5).upper(),
+        "TransTime": timezone.localtime().strftime("%Y%m%d%H%M%S"),
+        "TransAmount": str(amount),
+        "BusinessShortCode": "600000",
+        "BillRefNumber": bill_ref,
+        "InvoiceNumber": "",
+        "OrgAccountBalance": "",
+        "ThirdPartyTransID": "",
+        "MSISDN": msisdn,
+        "FirstName": first_name,
+        "MiddleName": "",
+        "LastName": "",
+    }
+
+
+def send(payloads, *, url: str | None = None, client=None, token: str = "") -> int:
+    """
+    Post one confirmation (dict) or a batch (list) and return the HTTP
+    status. client: a DRF APIClient to post in-process instead of over HTTP.
+    """
+    url = url or CALLBACK_PATH
+    if token:
+        url = f"{url}?token={token}"
+
+    if client is not None:
+        return client.post(url, payloads, format="json").status_code
+
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payloads).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request) as response:
+        return response.status
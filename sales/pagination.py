@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class SaleCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    Each page is an index range scan from the cursor position, so deep
+    pages cost the same as the first and no COUNT(*) is issued.
+    """
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
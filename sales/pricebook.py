@@ -0,0 +1,84 @@
+import threading
+import time
+
+from django.conf import settings
+
+from catalog.models import Product
+
+_lock = threading.Lock()
+_book: dict[int, dict] | None = None
+_loaded_at = 0.0
+
+
+def _entry(product_id, sku, name, selling_price, is_active, category_id) -> dict:
+    return {
+        "product_id": product_id,
+        "sku": sku,
+        "name": name,
+        "selling_price": selling_price,
+        "is_active": is_active,
+        "category_id": category_id,
+    }
+
+
+def get_price_book() -> dict[int, dict]:
+    """
+    Process-local {product_id: entry} of every product's price and active
+    flag, loaded with one query and kept current by Product signals.
+
+    Signals only reach this process, so the book is also reloaded every
+    PRICE_BOOK_TTL_SECONDS to pick up edits made by other workers.
+    """
+    global _book, _loaded_at
+
+    ttl = getattr(settings, "PRICE_BOOK_TTL_SECONDS", 60)
+    book = _book
+    if book is not None and time.monotonic() - _loaded_at < ttl:
+        return book
+
+    with _lock:
+        if _book is None or time.monotonic() - _loaded_at >= ttl:
+            rows = Product.objects.values_list("id", "sku", "name", "selling_price", "is_active", "category_id")
+            _book = {row[0]: _entry(*row) for row in rows}
+            _loaded_at = time.monotonic()
+        return _book
+
+
+def price_entries(product_ids) -> dict[int, dict]:
+    """
+    Price book entries for product_ids. Ids the book has not seen yet
+    (e.g. products created by another worker) are fetched and added.
+    """
+    book = get_price_book()
+    product_ids = set(product_ids)
+    missing = product_ids - book.keys()
+
+    if missing:
+        rows = Product.objects.filter(id__in=missing).values_list(
+            "id", "sku", "name", "selling_price", "is_active", "category_id"
+        )
+        with _lock:
+            for row in rows:
+                book[row[0]] = _entry(*row)
+
+    return {pid: book[pid] for pid in product_ids if pid in book}
+
+
+def update_price_book(product: Product) -> None:
+    with _lock:
+        if _book is not None:
+            _book[product.id] = _entry(
+                product.id, product.sku, product.name, product.selling_price, product.is_active, product.category_id
+            )
+
+
+def remove_from_price_book(product_id: int) -> None:
+    with _lock:
+        if _book is not None:
+            _book.pop(product_id, None)
+
+
+def invalidate_price_book() -> None:
+    global _book
+    with _lock:
+        _book = None
@@ -0,0 +1,83 @@
+import re
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+
+from .customers import normalize_phone
+from .models import Sale, Receipt, Invoice
+
+_PHONE_RE = re.compile(r"\+?\d{3,}")
+
+_trigram_enabled = None
+
+
+def trigram_enabled() -> bool:
+    """Whether pg_trgm is installed (see migration 0009); checked once per process."""
+    global _trigram_enabled
+    if _trigram_enabled is None:
+        _trigram_enabled = False
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                _trigram_enabled = cursor.fetchone() is not None
+    return _trigram_enabled
+
+
+def search_sales(query: str, *, limit: int = 20, columns=()) -> list[dict]:
+    """
+    Find sales by receipt number, invoice number, customer phone or name.
+
+    Each kind of match is its own indexed query:
+      - receipt/invoice numbers: exact, then prefix (varchar_pattern_ops)
+      - phone: prefix of the normalized query on Customer.phone, then
+        prefix of the query as typed on Sale.customer_phone (both
+        varchar_pattern_ops), so "+2547..." finds a sale entered as "07..."
+      - customer_name: trigram similarity (GIN gin_trgm_ops) when pg_trgm
+        is installed, otherwise icontains
+
+    Returns up to limit .values() rows (columns plus "match"), best matches
+    first: exact numbers, number prefixes, phone, then name.
+    """
+    q = query.strip()
+    matches = {}
+
+    def add(kind, sale_ids):
+        for sale_id in sale_ids:
+            if len(matches) >= limit:
+                return
+            matches.setdefault(sale_id, kind)
+
+    code = q.upper()
+    add("receipt", Receipt.objects.filter(receipt_number=code).values_list("sale_id", flat=True))
+    add("invoice", Invoice.objects.filter(invoice_number=code).values_list("sale_id", flat=True))
+    add("receipt", Receipt.objects.filter(receipt_number__startswith=code).values_list("sale_id", flat=True)[:limit])
+    add("invoice", Invoice.objects.filter(invoice_number__startswith=code).values_list("sale_id", flat=True)[:limit])
+
+    phone = re.sub(r"[\s\-()]", "", q)
+    if _PHONE_RE.fullmatch(phone):
+        normalized = normalize_phone(phone)
+        add("phone", Sale.objects.filter(customer__phone__startswith=normalized).values_list("id", flat=True)[:limit])
+        add("phone", Sale.objects.filter(customer_phone__startswith=phone).values_list("id", flat=True)[:limit])
+
+    if len(q) >= 3 and any(ch.isalpha() for ch in q):
+        if trigram_enabled():
+            names = (
+                Sale.objects.filter(customer_name__trigram_similar=q)
+                .annotate(similarity=TrigramSimilarity("customer_name", q))
+                .order_by("-similarity", "-id")
+            )
+        else:
+            names = Sale.objects.filter(customer_name__icontains=q).order_by("-created_at", "-id")
+        add("name", names.values_list("id", flat=True)[:limit])
+
+    if not matches:
+        return []
+
+    by_id = {row["id"]: row for row in Sale.objects.filter(pk__in=list(matches)).values(*columns)}
+    rows = []
+    for sale_id, kind in matches.items():
+        row = by_id.get(sale_id)
+        if row is not None:
+            row["match"] = kind
+            rows.append(row)
+    return rows
@@ -1,12 +1,15 @@
 from decimal import Decimal
 from rest_framework import serializers
 
-from .models import Sale, SaleItem, Receipt, Invoice, Payment
+from .models import Customer, Sale, SaleItem, SaleReturn, SaleReturnItem, Receipt, Invoice, Payment, Shift
 
 class SaleItemCreateSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
     quantity = serializers.IntegerField(min_value=1)
 
+class CartQuoteSerializer(serializers.Serializer):
+    items = SaleItemCreateSerializer(many=True, allow_empty=False)
+
 class SaleCreateSerializer(serializers.Serializer):
     payment_type = serializers.ChoiceField(
         choices=Sale.PaymentType.choices,
@@ -57,12 +60,12 @@ class SaleCreateSerializer(serializers.Serializer):
         return attrs
 
 class SaleItemSerializer(serializers.ModelSerializer):
-    product_name = serializers.CharField(source="product.name", read_only=True)
-    sku = serializers.CharField(source="product.sku", read_only=True)
+    product_name = serializers.CharField(source="product_name_snapshot", read_only=True)
+    sku = serializers.CharField(source="sku_snapshot", read_only=True)
 
     class Meta:
         model = SaleItem
-        fields = ["id", "product_name", "sku", "quantity", "unit_price_snapshot", "line_total"]
+        fields = ["id", "product_name", "sku", "quantity", "returned_quantity", "unit_price_snapshot", "discount", "promotion", "line_total"]
 
 class ReceiptSerializer(serializers.ModelSerializer):
     class Meta:
@@ -122,7 +125,205 @@ class SaleDetailSerializer(serializers.ModelSerializer):
             return "INVOICE"
         return "RECEIPT"
     
+class SaleSummarySerializer(serializers.BaseSerializer):
+    """
+    Flat, read-only sale row for list endpoints.
+
+    Serializes the dicts produced by Sale.objects.values(*value_columns(...))
+    instead of model instances, so a page of sales is one query with no
+    per-row nested serializers. Nested relations are only present when
+    requested through include (see attach_sale_relations).
+    """
+    COLUMNS = {
+        "id": "id",
+        "status": "status",
+        "cashier_username": "cashier__username",
+        "payment_type": "payment_type",
+        "payment_status": "payment_status",
+        "payment_method": "payment_method",
+        "subtotal": "subtotal",
+        "discount": "discount",
+        "total": "total",
+        "amount_paid": "amount_paid",
+        "due_date": "due_date",
+        "customer_name": "customer_name",
+        "customer_phone": "customer_phone",
+        "created_at": "created_at",
+        "receipt_number": "receipt__receipt_number",
+        "invoice_number": "invoice__invoice_number",
+    }
+    # Computed fields and the columns they are computed from.
+    DERIVED = {
+        "balance_due": ("total", "amount_paid"),
+        "document_type": ("payment_status",),
+    }
+    FIELDS = [*COLUMNS, *DERIVED]
+    RELATIONS = ("items", "payments", "receipt", "invoice")
+
+    _datetime = serializers.DateTimeField()
+    _date = serializers.DateField()
+
+    def __init__(self, *args, fields=None, include=(), **kwargs):
+        self.field_names = list(fields or self.FIELDS)
+        self.include = list(include)
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def value_columns(cls, fields=None) -> list[str]:
+        """
+        ORM paths to pass to .values() for the given output fields. id and
+        created_at are always fetched since pagination and includes key on them.
+        """
+        needed = {"id", "created_at"}
+        for name in fields or cls.FIELDS:
+            needed.update(cls.DERIVED.get(name, (name,)))
+        return [cls.COLUMNS[name] for name in cls.COLUMNS if name in needed]
+
+    def to_representation(self, row):
+        out = {}
+        for name in self.field_names:
+            if name == "balance_due":
+                out[name] = str(max(Decimal("0.00"), row["total"] - row["amount_paid"]))
+            elif name == "document_type":
+                unpaid = row["payment_status"] in (Sale.PaymentStatus.UNPAID, Sale.PaymentStatus.PARTIAL)
+                out[name] = "INVOICE" if unpaid else "RECEIPT"
+            else:
+                value = row[self.COLUMNS[name]]
+                if isinstance(value, Decimal):
+                    value = str(value)
+                elif name == "created_at":
+                    value = self._datetime.to_representation(value)
+                elif name == "due_date" and value is not None:
+                    value = self._date.to_representation(value)
+                out[name] = value
+        for rel in self.include:
+            out[rel] = row[rel]
+        return out
+
+
+def parse_sale_list_params(query_params) -> tuple[list[str], list[str]]:
+    """
+    Read ?fields=a,b and ?include=items,payments for the sale list endpoints.
+    """
+    def split(name):
+        raw = query_params.get(name, "")
+        return [part.strip() for part in raw.split(",") if part.strip()]
+
+    fields = split("fields")
+    include = split("include")
+
+    unknown = [f for f in fields if f not in SaleSummarySerializer.FIELDS]
+    if unknown:
+        raise serializers.ValidationError({"fields": f"Unknown field(s): {', '.join(unknown)}."})
+    unknown = [r for r in include if r not in SaleSummarySerializer.RELATIONS]
+    if unknown:
+        raise serializers.ValidationError({"include": f"Unknown relation(s): {', '.join(unknown)}."})
+
+    return fields, list(dict.fromkeys(include))
+
+
+def attach_sale_relations(rows: list[dict], include) -> list[dict]:
+    """
+    Load the requested relations for a page of sale rows, one query per
+    relation, and store their serialized form on each row.
+    """
+    if not rows or not include:
+        return rows
+
+    ids = [row["id"] for row in rows]
+
+    if "items" in include:
+        grouped = {}
+        for item in SaleItem.objects.filter(sale_id__in=ids).order_by("id"):
+            grouped.setdefault(item.sale_id, []).append(SaleItemSerializer(item).data)
+        for row in rows:
+            row["items"] = grouped.get(row["id"], [])
+
+    if "payments" in include:
+        grouped = {}
+        for payment in Payment.objects.filter(sale_id__in=ids).select_related("received_by"):
+            grouped.setdefault(payment.sale_id, []).append(PaymentSerializer(payment).data)
+        for row in rows:
+            row["payments"] = grouped.get(row["id"], [])
+
+    if "receipt" in include:
+        by_sale = {r.sale_id: ReceiptSerializer(r).data for r in Receipt.objects.filter(sale_id__in=ids)}
+        for row in rows:
+            row["receipt"] = by_sale.get(row["id"])
+
+    if "invoice" in include:
+        by_sale = {i.sale_id: InvoiceSerializer(i).data for i in Invoice.objects.filter(sale_id__in=ids)}
+        for row in rows:
+            row["invoice"] = by_sale.get(row["id"])
+
+    return rows
+
+
 class AddPaymentSerializer(serializers.Serializer):
     method = serializers.ChoiceField(choices=Sale.PaymentMethod.choices)
     amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal("0.01"))
-    reference = serializers.CharField(required=False, allow_blank=True)
\ No newline at end of file
+    reference = serializers.CharField(required=False, allow_blank=True)
+
+class AllocatePaymentSerializer(AddPaymentSerializer):
+    customer_phone = serializers.CharField(max_length=30)
+
+class SaleReturnItemCreateSerializer(serializers.Serializer):
+    sale_item_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class SaleReturnCreateSerializer(serializers.Serializer):
+    items = SaleReturnItemCreateSerializer(many=True, allow_empty=False)
+    refund_method = serializers.ChoiceField(choices=Sale.PaymentMethod.choices, required=False, allow_null=True)
+    notes = serializers.CharField(required=False, allow_blank=True, max_length=255)
+
+class SaleReturnItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SaleReturnItem
+        fields = ["sale_item", "quantity", "amount"]
+
+class SaleReturnSerializer(serializers.ModelSerializer):
+    items = SaleReturnItemSerializer(many=True, read_only=True)
+    created_by_username = serializers.CharField(source="created_by.username", read_only=True)
+
+    class Meta:
+        model = SaleReturn
+        fields = ["id", "sale", "amount", "refund_amount", "refund_method", "notes", "created_by_username", "created_at", "items"]
+
+
+class ShiftOpenSerializer(serializers.Serializer):
+    opening_float = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal("0.00"), default=Decimal("0.00"))
+
+class ShiftCloseSerializer(serializers.Serializer):
+    counted_cash = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal("0.00"), required=False, allow_null=True)
+
+class ShiftSerializer(serializers.ModelSerializer):
+    """Z-report: every figure is a stored running total on the shift row."""
+    cashier_username = serializers.CharField(source="cashier.username", read_only=True)
+    expected_cash = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    cash_variance = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Shift
+        fields = [
+            "id", "cashier_username", "opened_at", "closed_at",
+            "opening_float", "counted_cash", "expected_cash", "cash_variance",
+            "sales_count", "sales_total", "discount_total", "credit_issued",
+            "voids_count", "voids_total", "refunds_total",
+            "cash_collected", "mpesa_collected", "card_collected", "bank_collected",
+        ]
+
+    def get_cash_variance(self, obj):
+        if obj.counted_cash is None:
+            return None
+        return str(obj.counted_cash - obj.expected_cash)
+
+
+class CustomerSerializer(serializers.ModelSerializer):
+    """Balance and spend are the running figures stored on the customer row."""
+    available_credit = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True, allow_null=True)
+
+    class Meta:
+        model = Customer
+        fields = ["id", "phone", "name", "balance", "lifetime_spend", "credit_limit", "available_credit", "created_at"]
+        read_only_fields = ["id", "phone", "balance", "lifetime_spend", "created_at"]
+        extra_kwargs = {"credit_limit": {"min_value": Decimal("0.00")}}
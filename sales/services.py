@@ -1,22 +1,118 @@
 from decimal import Decimal
 from django.db import transaction
-from django.db.models import F
+from django.db.models import F, Sum
 from django.utils import timezone
 
 from catalog.models import Product
 from inventory.models import Inventory, StockMovement
+from inventory.contention import retry_on_contention
+from inventory.ledger import StockConflict, notify_low_stock, record_movements
+from inventory.services import apply_stock_deltas, lock_inventories
+from inventory.sharding import take_from_buckets
 from notifications.models import Notification
-from .models import Sale, SaleItem, Receipt, Invoice, Payment
+from notifications.services import notify_owners
+from promotions.engine import apply_promotions
+from .customers import add_to_customer, check_credit, customer_figures, lock_customer, normalize_phone, track_sale_change
+from .documents import write_sale_documents
+from .models import Sale, SaleItem, SaleReturn, SaleReturnItem, Receipt, Invoice, Payment
+from .pricebook import price_entries
+from .shifts import add_to_shift, book_refund, book_sale, lock_open_shift
 from .utils import generate_receipt_number, generate_invoice_number
 
 class InsufficientStock(Exception):
     pass
 
+BATCH_CHUNK_SIZE = 100
+
+
+def quote_cart(items: list[dict]) -> dict:
+    """
+    Price a cart for the POS without locking anything.
+
+    Prices come from the in-process price book and discounts from the same
+    promotion index create_sale uses; stock is a plain read of the current
+    quantities, so it is advisory: create_sale re-checks it under lock at
+    checkout.
+    """
+    product_ids = {i["product_id"] for i in items}
+    book = price_entries(product_ids)
+    stock = dict(
+        Inventory.objects.filter(product_id__in=product_ids).values_list("product_id", "quantity")
+    )
+
+    known = [n for n, i in enumerate(items) if i["product_id"] in book]
+    discounts = dict(zip(known, apply_promotions(
+        (
+            items[n]["product_id"],
+            book[items[n]["product_id"]]["category_id"],
+            book[items[n]["product_id"]]["selling_price"],
+            int(items[n]["quantity"]),
+        )
+        for n in known
+    )))
+
+    lines = []
+    needed = {}
+    subtotal = Decimal("0.00")
+    discount = Decimal("0.00")
+    can_checkout = bool(items)
+
+    for n, i in enumerate(items):
+        pid = i["product_id"]
+        qty = int(i["quantity"])
+        entry = book.get(pid)
+
+        if entry is None:
+            lines.append({"product_id": pid, "quantity": qty, "error": "Product not found."})
+            can_checkout = False
+            continue
+
+        line_discount, promotion_id = discounts[n]
+        needed[pid] = needed.get(pid, 0) + qty
+        available = stock.get(pid, 0)
+        gross = (entry["selling_price"] * Decimal(qty)).quantize(Decimal("0.01"))
+
+        error = None
+        if not entry["is_active"]:
+            error = "Product inactive."
+        elif available < needed[pid]:
+            error = f"Insufficient stock. Have {available}, need {needed[pid]}."
+
+        if error:
+            can_checkout = False
+        else:
+            subtotal += gross
+            discount += line_discount
+
+        lines.append({
+            "product_id": pid,
+            "sku": entry["sku"],
+            "name": entry["name"],
+            "quantity": qty,
+            "unit_price": str(entry["selling_price"]),
+            "discount": str(line_discount),
+            "promotion_id": promotion_id,
+            "line_total": str(gross - line_discount),
+            "available": available,
+            "in_stock": available >= needed[pid],
+            "error": error,
+        })
+
+    return {
+        "lines": lines,
+        "subtotal": str(subtotal),
+        "discount": str(discount),
+        "total": str(subtotal - discount),
+        "can_checkout": can_checkout,
+    }
+
+
+@retry_on_contention
 @transaction.atomic
 def create_sale(
     *,
     cashier,
-    payment_type: str,
+    payment_type: str = Sale.PaymentType.PAY_NOW,
     payment_method: str | None = None,
     amount_paid: Decimal | None = None,
     due_date=None,
@@ -25,17 +121,53 @@ def create_sale(
     items: list[dict],
     receipt_prefix="RCPT",
 ) -> Sale:
-    product_ids = [i["product_id"] for i in items]
+    """
+    Batched sale commit: items and movements are bulk-inserted, stock is
+    applied with one conditional UPDATE and low-stock transitions are
+    evaluated once for the basket, so the query count does not grow with
+    the number of lines.
+    """
+    inv_map = lock_inventories((i["product_id"] for i in items), skip_sharded=True)
 
-    inventories = (
-        Inventory.objects.select_for_update()
-        .select_related("product")
-        .filter(product_id__in=product_ids)
+    sale = _create_sale_locked(
+        inv_map=inv_map,
+        cashier=cashier,
+        payment_type=payment_type,
+        payment_method=payment_method,
+        amount_paid=amount_paid,
+        due_date=due_date,
+        customer_name=customer_name,
+        customer_phone=customer_phone,
+        items=items,
+        receipt_prefix=receipt_prefix,
     )
-    inv_map = {inv.product_id: inv for inv in inventories}
+    write_sale_documents([sale.id])
+    return sale
 
+
+def _create_sale_locked(
+    *,
+    inv_map: dict,
+    cashier,
+    payment_type: str = Sale.PaymentType.PAY_NOW,
+    payment_method: str | None = None,
+    amount_paid: Decimal | None = None,
+    due_date=None,
+    customer_name: str = "",
+    customer_phone: str = "",
+    items: list[dict],
+    receipt_prefix="RCPT",
+) -> Sale:
+    """
+    Body of create_sale. Expects the caller to hold the transaction and the
+    locks on every inventory in inv_map, except bucketed (hot) products,
+    whose stock is taken from a bucket instead. The in-memory rows are
+    updated as stock is applied so several sales can share one lock set.
+    """
     subtotal = Decimal("0.00")
-    sale_items_to_create = []
+    discount = Decimal("0.00")
+    priced = []
+    needed = {}
 
     for i in items:
         pid = i["product_id"]
@@ -48,22 +180,31 @@ def create_sale(
         if inv.product.is_active is False:
             raise ValueError(f"Product inactive: {inv.product.sku}")
 
-        if inv.quantity < qty:
+        needed[pid] = needed.get(pid, 0) + qty
+        # A bucketed row's quantity lags its buckets; they are checked below.
+        if not inv.bucket_count and inv.quantity < needed[pid]:
             raise InsufficientStock(
-                f"Insufficient stock for {inv.product.sku}. Have {inv.quantity}, need {qty}"
+                f"Insufficient stock for {inv.product.sku}. Have {inv.quantity}, need {needed[pid]}"
             )
 
-        unit_price = inv.product.selling_price
-        line_total = (unit_price * Decimal(qty)).quantize(Decimal("0.01"))
-        subtotal += line_total
-        sale_items_to_create.append((inv.product, qty, unit_price, line_total))
+        priced.append((inv.product, qty, inv.product.selling_price))
 
+    promotions = apply_promotions(
+        (product.id, product.category_id, unit_price, qty) for product, qty, unit_price in priced
+    )
+    sale_items_to_create = []
+    for (product, qty, unit_price), (line_discount, promotion_id) in zip(priced, promotions):
+        gross = (unit_price * Decimal(qty)).quantize(Decimal("0.01"))
+        subtotal += gross
+        discount += line_discount
+        sale_items_to_create.append((product, qty, unit_price, gross - line_discount, line_discount, promotion_id))
+    total = subtotal - discount
 
     if payment_type == Sale.PaymentType.PAY_NOW:
         if not payment_method:
             raise ValueError("payment_method is required for PAY_NOW.")
         if amount_paid is None:
-            amount_paid = subtotal
+            amount_paid = total
 
     elif payment_type == Sale.PaymentType.CREDIT:
         if due_date is None:
@@ -77,13 +218,21 @@ def create_sale(
         raise ValueError("Invalid payment_type.")
 
     payment_status = (
-        Sale.PaymentStatus.PAID if amount_paid >= subtotal
+        Sale.PaymentStatus.PAID if amount_paid >= total
         else Sale.PaymentStatus.PARTIAL if amount_paid > Decimal("0.00")
         else Sale.PaymentStatus.UNPAID
     )
 
+    shift_id = lock_open_shift(cashier)
+    owed = max(Decimal("0.00"), total - amount_paid)
+    customer = lock_customer(customer_phone, customer_name)
+    if customer is not None:
+        check_credit(customer, owed)
+
     sale = Sale.objects.create(
         cashier=cashier,
+        shift_id=shift_id,
+        customer=customer,
         payment_type=payment_type,
         payment_method=payment_method,     
         amount_paid=amount_paid,
@@ -91,22 +240,32 @@ def create_sale(
         customer_name=customer_name,
         customer_phone=customer_phone,
         subtotal=subtotal,
-        discount=Decimal("0.00"),
-        total=subtotal,
+        discount=discount,
+        total=total,
         payment_status=payment_status,
         status=Sale.Status.COMPLETED,
     )
 
-    for product, qty, unit_price, line_total in sale_items_to_create:
-        SaleItem.objects.create(
+    SaleItem.objects.bulk_create([
+        SaleItem(
             sale=sale,
             product=product,
             quantity=qty,
+            product_name_snapshot=product.name,
+            sku_snapshot=product.sku,
+            unit_cost_snapshot=product.cost_price,
             unit_price_snapshot=unit_price,
             line_total=line_total,
+            discount=line_discount,
+            promotion_id=promotion_id,
         )
+        for product, qty, unit_price, line_total, line_discount, promotion_id in sale_items_to_create
+    ])
 
-        StockMovement.objects.create(
+    # Stock is applied below against the rows already locked for pricing
+    # (apply_stock_deltas), not through record_movements.
+    StockMovement.objects.bulk_create([
+        StockMovement(
             product=product,
             movement_type=StockMovement.MovementType.SALE,
             direction=StockMovement.Direction.OUT,
@@ -115,19 +274,42 @@ def create_sale(
             sale=sale,
             notes=f"Sale #{sale.id}",
         )
+        for product, qty, *_ in sale_items_to_create
+    ])
+
+    hot = sorted(pid for pid in needed if inv_map[pid].bucket_count)
+    for pid in hot:
+        inv = inv_map[pid]
+        if not take_from_buckets(inv.pk, needed[pid]):
+            raise InsufficientStock(f"Insufficient stock for {inv.product.sku}. Need {needed[pid]}")
+    # Their Inventory rows are left alone: rebalance_stock_buckets re-syncs
+    # quantity/low-stock from the buckets, off the checkout path.
+
+    try:
+        went_low = apply_stock_deltas({
+            pid: (inv_map[pid], -qty) for pid, qty in needed.items() if not inv_map[pid].bucket_count
+        })
+    except StockConflict as e:
+        raise InsufficientStock(str(e))
+
+    taken = min(amount_paid, total)
+    if taken > Decimal("0.00"):
+        Payment.objects.create(sale=sale, method=payment_method, amount=taken, received_by=cashier, shift_id=shift_id)
 
     if payment_status == Sale.PaymentStatus.PAID:
         receipt_no = generate_receipt_number(prefix=receipt_prefix)
         Receipt.objects.create(sale=sale, receipt_number=receipt_no)
 
-    owner_users = cashier.__class__.objects.filter(profile__role="OWNER", is_active=True)
-    for owner in owner_users:
-        Notification.objects.create(
-            recipient=owner,
-            type=Notification.Type.SALE_MADE,
-            message=f"Sale #{sale.id} completed. Total: {sale.total}",
-            sale_id=sale.id,
-        )
+    book_sale(shift_id, sale)
+    if customer is not None:
+        add_to_customer(customer.id, balance=owed, lifetime_spend=total)
+
+    notify_owners(
+        Notification.Type.SALE_MADE,
+        f"Sale #{sale.id} completed. Total: {sale.total}",
+        sale_id=sale.id,
+    )
+    notify_low_stock(went_low)
 
     if payment_type == Sale.PaymentType.CREDIT:
         Invoice.objects.create(
@@ -139,42 +321,280 @@ def create_sale(
 
     return sale
 
+def create_sales_batch(*, cashier, sales: list[dict], chunk_size: int = BATCH_CHUNK_SIZE) -> list:
+    """
+    Commit many sales (e.g. an offline till replaying its queue).
+
+    Sales are committed chunk_size at a time (see commit_sales_group).
+
+    sales: validated SaleCreateSerializer payloads.
+    Returns one entry per sale, in order: the Sale, or the error message.
+    """
+    results = []
+    for start in range(0, len(sales), chunk_size):
+        outcomes = commit_sales_group([(cashier, data) for data in sales[start:start + chunk_size]])
+        results.extend(r if isinstance(r, Sale) else str(r) for r in outcomes)
+
+    return results
+
+
+@retry_on_contention
+@transaction.atomic
+def commit_sales_group(entries: list[tuple]) -> list:
+    """
+    Commit several sales in one transaction.
+
+    The union of their products is locked once, in product id order, and
+    every sale runs in its own savepoint so a stock or validation failure
+    only rejects that sale.
+
+    entries: [(cashier, validated SaleCreateSerializer payload)]
+    Returns one entry per sale, in order: the Sale, or the
+    InsufficientStock/ValueError that rejected it.
+    """
+    results = []
+    inv_map = lock_inventories((i["product_id"] for _, data in entries for i in data["items"]), skip_sharded=True)
+
+    for cashier, data in entries:
+        touched = [inv_map[i["product_id"]] for i in data["items"] if i["product_id"] in inv_map]
+        snapshot = [(inv, inv.quantity, inv.low_stock_flag) for inv in touched]
+        try:
+            with transaction.atomic():
+                sale = _create_sale_locked(
+                    inv_map=inv_map,
+                    cashier=cashier,
+                    payment_type=data.get("payment_type", Sale.PaymentType.PAY_NOW),
+                    payment_method=data.get("payment_method"),
+                    amount_paid=data.get("amount_paid"),
+                    due_date=data.get("due_date"),
+                    customer_name=data.get("customer_name", ""),
+                    customer_phone=data.get("customer_phone", ""),
+                    items=data["items"],
+                )
+        except (InsufficientStock, ValueError) as e:
+            for inv, quantity, low_stock_flag in snapshot:
+                inv.quantity = quantity
+                inv.low_stock_flag = low_stock_flag
+            results.append(e)
+        else:
+            results.append(sale)
+
+    write_sale_documents(r.id for r in results if isinstance(r, Sale))
+    return results
+
 class AlreadyVoided(Exception):
     pass
 
 
+@retry_on_contention
 @transaction.atomic
 def void_sale(*, sale_id: int, voided_by, notes: str = "") -> Sale:
-    sale = Sale.objects.select_for_update().prefetch_related("items__product").get(id=sale_id)
+    sale = (
+        Sale.objects.select_for_update(of=("self",))
+        .select_related("invoice")
+        .prefetch_related("items")
+        .get(id=sale_id)
+    )
 
     if sale.status == Sale.Status.VOIDED:
         raise AlreadyVoided("Sale already voided.")
 
-    for item in sale.items.all():
-        StockMovement.objects.create(
-            product=item.product,
+    # Lines already handed back through a return were restocked then.
+    items = [item for item in sale.items.all() if item.quantity > item.returned_quantity]
+    record_movements([
+        StockMovement(
+            product_id=item.product_id,
             movement_type=StockMovement.MovementType.VOID,
             direction=StockMovement.Direction.IN,
-            quantity=item.quantity,
+            quantity=item.quantity - item.returned_quantity,
             created_by=voided_by,
             sale=sale,
             notes=notes or f"Void Sale #{sale.id}",
         )
+        for item in items
+    ])
 
+    # Shift before customer, the order every sale/payment writer locks them in.
+    shift_id = lock_open_shift(voided_by)
+    before = customer_figures(sale)
     sale.status = Sale.Status.VOIDED
     sale.save(update_fields=["status"])
+    track_sale_change(sale, before)
+
+    inv = getattr(sale, "invoice", None)
+    if inv and inv.status in (Invoice.Status.OPEN, Invoice.Status.OVERDUE):
+        inv.status = Invoice.Status.CANCELLED
+        inv.save(update_fields=["status"])
+
+    # Whatever was taken for the sale goes back out of the voiding user's
+    # drawer, under the method it was paid with.
+    book_refund(
+        shift_id,
+        _refunds_by_method(sale, min(sale.amount_paid, sale.total)),
+        voids_count=1,
+        voids_total=sale.total,
+    )
 
-    owner_users = voided_by.__class__.objects.filter(profile__role="OWNER", is_active=True)
-    for owner in owner_users:
-        Notification.objects.create(
-            recipient=owner,
-            type=Notification.Type.SALE_VOIDED if hasattr(Notification.Type, "SALE_VOIDED") else Notification.Type.SALE_MADE,
-            message=f"Sale #{sale.id} voided.",
-            sale_id=sale.id,
-        )
+    notify_owners(Notification.Type.SALE_VOIDED, f"Sale #{sale.id} voided.", sale_id=sale.id)
+    write_sale_documents([sale.id])
 
     return sale
 
+
+def _refunds_by_method(sale: Sale, amount: Decimal) -> dict:
+    """
+    Split a refund of `amount` over the methods the sale was paid with: its
+    Payment rows grouped by method, less what returns already refunded
+    under each. Money with no Payment row (sales from before checkout
+    recorded one) is refunded under sale.payment_method.
+    """
+    held = dict(sale.payments.values("method").annotate(s=Sum("amount")).values_list("method", "s"))
+    refunded = (
+        sale.returns.filter(refund_amount__gt=Decimal("0.00"))
+        .values("refund_method").annotate(s=Sum("refund_amount")).values_list("refund_method", "s")
+    )
+    for method, total in refunded:
+        held[method] = held.get(method, Decimal("0.00")) - total
+
+    refunds = {}
+    for method, available in sorted(held.items()):
+        share = min(amount, max(available, Decimal("0.00")))
+        if share > Decimal("0.00"):
+            refunds[method] = share
+            amount -= share
+    if amount > Decimal("0.00"):
+        refunds[sale.payment_method] = refunds.get(sale.payment_method, Decimal("0.00")) + amount
+    return refunds
+
+
+@retry_on_contention
+@transaction.atomic
+def return_sale_items(
+    *,
+    sale_id: int,
+    items: list[dict],
+    returned_by,
+    refund_method: str | None = None,
+    notes: str = "",
+) -> SaleReturn:
+    """
+    Return part of a sale, line by line.
+
+    items: [{"sale_item_id": ..., "quantity": ...}]
+
+    - Reduces Sale.subtotal/total by the returned lines' value
+    - Refunds whatever was paid beyond the new total
+    - Restocks through the stock ledger: one bulk insert of RETURN
+      movements (linked to the sale) and one inventory UPDATE
+    - Re-evaluates payment status, invoice and receipt; a sale with every
+      unit returned ends up VOIDED
+    """
+    sale = Sale.objects.select_for_update(of=("self",)).select_related("receipt", "invoice").get(id=sale_id)
+
+    if sale.status == Sale.Status.VOIDED:
+        raise ValueError("Cannot return items from a voided sale.")
+
+    sale_items = {item.id: item for item in sale.items.all()}
+
+    requested = {}
+    for i in items:
+        item_id = i["sale_item_id"]
+        if item_id not in sale_items:
+            raise ValueError(f"Sale item {item_id} does not belong to sale #{sale.id}.")
+        requested[item_id] = requested.get(item_id, 0) + int(i["quantity"])
+
+    if not requested:
+        raise ValueError("Nothing to return.")
+
+    lines = []
+    for item_id, qty in requested.items():
+        item = sale_items[item_id]
+        returnable = item.quantity - item.returned_quantity
+        if qty > returnable:
+            raise ValueError(f"Cannot return {qty} of {item.sku_snapshot}; only {returnable} returnable.")
+
+        gross = (item.unit_price_snapshot * Decimal(qty)).quantize(Decimal("0.01"))
+        amount = (item.line_total * Decimal(qty) / Decimal(item.quantity)).quantize(Decimal("0.01"))
+        lines.append((item, qty, gross, amount))
+
+    before = customer_figures(sale)
+
+    return_amount = sum((amount for *_, amount in lines), Decimal("0.00"))
+    gross_amount = sum((gross for _, _, gross, _ in lines), Decimal("0.00"))
+
+    sale.subtotal -= gross_amount
+    sale.discount = max(Decimal("0.00"), sale.discount - (gross_amount - return_amount))
+    sale.total = max(Decimal("0.00"), sale.total - return_amount)
+
+    refund_amount = max(Decimal("0.00"), sale.amount_paid - sale.total)
+    sale.amount_paid -= refund_amount
+
+    for item, qty, _, _ in lines:
+        item.returned_quantity += qty
+    SaleItem.objects.bulk_update([item for item, *_ in lines], ["returned_quantity"])
+
+    fully_returned = all(item.returned_quantity >= item.quantity for item in sale_items.values())
+
+    if sale.amount_paid >= sale.total:
+        sale.payment_status = Sale.PaymentStatus.PAID
+    elif sale.amount_paid > Decimal("0.00"):
+        sale.payment_status = Sale.PaymentStatus.PARTIAL
+    else:
+        sale.payment_status = Sale.PaymentStatus.UNPAID
+
+    update_fields = ["subtotal", "discount", "total", "amount_paid", "payment_status"]
+    if fully_returned:
+        sale.status = Sale.Status.VOIDED
+        update_fields.append("status")
+    sale.save(update_fields=update_fields)
+
+    sale_return = SaleReturn.objects.create(
+        sale=sale,
+        created_by=returned_by,
+        amount=return_amount,
+        refund_amount=refund_amount,
+        refund_method=(refund_method or sale.payment_method) if refund_amount > Decimal("0.00") else None,
+        notes=notes,
+    )
+    SaleReturnItem.objects.bulk_create([
+        SaleReturnItem(sale_return=sale_return, sale_item=item, quantity=qty, amount=amount)
+        for item, qty, _, amount in lines
+    ])
+
+    record_movements([
+        StockMovement(
+            product_id=item.product_id,
+            movement_type=StockMovement.MovementType.RETURN,
+            direction=StockMovement.Direction.IN,
+            quantity=qty,
+            created_by=returned_by,
+            sale=sale,
+            notes=notes or f"Return #{sale_return.id} on Sale #{sale.id}",
+        )
+        for item, qty, _, _ in lines
+    ])
+
+    # Shift before customer, the order every sale/payment writer locks them in.
+    shift_id = lock_open_shift(returned_by)
+    track_sale_change(sale, before)
+
+    inv = getattr(sale, "invoice", None)
+    if inv and inv.status in (Invoice.Status.OPEN, Invoice.Status.OVERDUE):
+        if fully_returned:
+            inv.status = Invoice.Status.CANCELLED
+        elif sale.payment_status == Sale.PaymentStatus.PAID:
+            inv.status = Invoice.Status.PAID
+        inv.save(update_fields=["status"])
+
+    if sale.payment_status == Sale.PaymentStatus.PAID and not fully_returned and not getattr(sale, "receipt", None):
+        Receipt.objects.create(sale=sale, receipt_number=generate_receipt_number())
+
+    book_refund(shift_id, {sale_return.refund_method: refund_amount})
+    write_sale_documents([sale.id])
+    return sale_return
+
+@retry_on_contention
+@transaction.atomic
 def add_payment(*, sale_id: int, received_by, method: str, amount: Decimal, reference: str = "") -> Sale:
     """
     Record a payment for a sale (typically CREDIT or PARTIAL).
@@ -187,64 +607,191 @@ def add_payment(*, sale_id: int, received_by, method: str, amount: Decimal, refe
     if amount <= Decimal("0.00"):
         raise ValueError("Amount must be greater than 0.")
 
-    with transaction.atomic():
-        sale = (
-            Sale.objects
-            .select_for_update()
-            .select_related("receipt", "invoice")
-            .get(id=sale_id)
-        )
+    sale = (
+        Sale.objects
+        .select_for_update(of=("self",))
+        .select_related("receipt", "invoice")
+        .get(id=sale_id)
+    )
 
-        if sale.status == Sale.Status.VOIDED:
-            raise ValueError("Cannot pay a voided sale.")
+    if sale.status == Sale.Status.VOIDED:
+        raise ValueError("Cannot pay a voided sale.")
+
+    if sale.payment_status == Sale.PaymentStatus.PAID:
+        raise ValueError("This sale is already fully paid.")
+
+    balance = sale.total - sale.amount_paid
+    if balance <= Decimal("0.00"):
+        sale.payment_status = Sale.PaymentStatus.PAID
+        sale.save(update_fields=["payment_status"])
+        raise ValueError("This sale is already fully paid.")
+
+    if amount > balance:
+        raise ValueError(f"Amount exceeds balance due ({balance}).")
+
+    shift_id = lock_open_shift(received_by)
+    Payment.objects.create(
+        sale=sale,
+        method=method,
+        amount=amount,
+        reference=reference or "",
+        received_by=received_by,
+        shift_id=shift_id,
+    )
+    add_to_shift(shift_id, collected={method: amount})
 
-        if sale.payment_status == Sale.PaymentStatus.PAID:
-            raise ValueError("This sale is already fully paid.")
+    sale.amount_paid = sale.amount_paid + amount
 
-        balance = sale.total - sale.amount_paid
-        if balance <= Decimal("0.00"):
-            sale.payment_status = Sale.PaymentStatus.PAID
-            sale.save(update_fields=["payment_status"])
-            raise ValueError("This sale is already fully paid.")
+    sale.payment_method = method
 
-        if amount > balance:
-            raise ValueError(f"Amount exceeds balance due ({balance}).")
+    new_balance = sale.total - sale.amount_paid
+    if new_balance <= Decimal("0.00"):
+        sale.payment_status = Sale.PaymentStatus.PAID
+    elif sale.amount_paid > Decimal("0.00"):
+        sale.payment_status = Sale.PaymentStatus.PARTIAL
+    else:
+        sale.payment_status = Sale.PaymentStatus.UNPAID
+
+    sale.save(update_fields=["amount_paid", "payment_method", "payment_status"])
+    add_to_customer(sale.customer_id, balance=-amount)
+
+    if sale.payment_status == Sale.PaymentStatus.PAID:
+        inv = getattr(sale, "invoice", None)
+        if inv:
+            inv.status = Invoice.Status.PAID
+            inv.save(update_fields=["status"])
+
+        if not getattr(sale, "receipt", None):
+            Receipt.objects.create(
+                sale=sale,
+                receipt_number=generate_receipt_number(),
+            )
+
+    write_sale_documents([sale.id])
+    return sale
 
-        Payment.objects.create(
-            sale=sale,
-            method=method,
-            amount=amount,
-            reference=reference or "",
-            received_by=received_by,
-        )
 
-        sale.amount_paid = sale.amount_paid + amount
+@retry_on_contention
+@transaction.atomic
+def allocate_customer_payment(
+    *,
+    customer_phone: str,
+    received_by,
+    method: str,
+    amount: Decimal,
+    reference: str = "",
+) -> list[tuple[Sale, Decimal]]:
+    """
+    Spread one lump-sum payment over a customer's open sales, oldest first.
 
+    - Locks every UNPAID/PARTIAL sale of the customer (phone matched in
+      normalized form) in one query
+    - Creates the Payment rows in one insert and updates the sales in one
+    - Closes the invoices of fully paid sales in one UPDATE and issues
+      their missing receipts in one insert
+
+    Returns [(sale, amount_applied)] for the sales the payment touched.
+    """
+    if amount is None:
+        raise ValueError("Amount is required.")
+    if amount <= Decimal("0.00"):
+        raise ValueError("Amount must be greater than 0.")
+
+    customer_phone = normalize_phone(customer_phone)
+    if not customer_phone:
+        raise ValueError("customer_phone is required.")
+
+    open_sales = list(
+        Sale.objects.select_for_update(of=("self",))
+        .select_related("receipt")
+        .filter(
+            customer__phone=customer_phone,
+            status=Sale.Status.COMPLETED,
+            payment_status__in=[Sale.PaymentStatus.UNPAID, Sale.PaymentStatus.PARTIAL],
+        )
+        .order_by("created_at", "id")
+    )
+    if not open_sales:
+        raise ValueError("No open credit sales for this customer.")
+
+    outstanding = sum((sale.total - sale.amount_paid for sale in open_sales), Decimal("0.00"))
+    if amount > outstanding:
+        raise ValueError(f"Amount exceeds balance due ({outstanding}).")
+
+    remaining = amount
+    applied = []
+    for sale in open_sales:
+        if remaining <= Decimal("0.00"):
+            break
+        share = min(remaining, sale.total - sale.amount_paid)
+        if share <= Decimal("0.00"):
+            continue
+        remaining -= share
+
+        sale.amount_paid += share
         sale.payment_method = method
+        sale.payment_status = (
+            Sale.PaymentStatus.PAID if sale.amount_paid >= sale.total else Sale.PaymentStatus.PARTIAL
+        )
+        applied.append((sale, share))
 
-        new_balance = sale.total - sale.amount_paid
-        if new_balance <= Decimal("0.00"):
-            sale.payment_status = Sale.PaymentStatus.PAID
-        elif sale.amount_paid > Decimal("0.00"):
-            sale.payment_status = Sale.PaymentStatus.PARTIAL
-        else:
-            sale.payment_status = Sale.PaymentStatus.UNPAID
+    shift_id = lock_open_shift(received_by)
+    Payment.objects.bulk_create([
+        Payment(
+            sale=sale, method=method, amount=share, reference=reference or "", received_by=received_by, shift_id=shift_id,
+        )
+        for sale, share in applied
+    ])
+    add_to_shift(shift_id, collected={method: amount})
+    Sale.objects.bulk_update([sale for sale, _ in applied], ["amount_paid", "payment_method", "payment_status"])
+    add_to_customer(open_sales[0].customer_id, balance=-amount)
 
-        sale.save(update_fields=["amount_paid", "payment_method", "payment_status"])
+    paid = [sale for sale, _ in applied if sale.payment_status == Sale.PaymentStatus.PAID]
+    if paid:
+        Invoice.objects.filter(
+            sale_id__in=[sale.id for sale in paid],
+            status__in=[Invoice.Status.OPEN, Invoice.Status.OVERDUE],
+        ).update(status=Invoice.Status.PAID)
 
-        if sale.payment_status == Sale.PaymentStatus.PAID:
-            inv = getattr(sale, "invoice", None)
-            if inv:
-                inv.status = Invoice.Status.PAID
-                inv.save(update_fields=["status"])
+        Receipt.objects.bulk_create([
+            Receipt(sale=sale, receipt_number=generate_receipt_number())
+            for sale in paid
+            if not getattr(sale, "receipt", None)
+        ])
 
-            if not getattr(sale, "receipt", None):
-                Receipt.objects.create(
-                    sale=sale,
-                    receipt_number=generate_receipt_number(sale.id),
-                )
+    write_sale_documents(sale.id for sale, _ in applied)
+    return applied
+
+
+OVERDUE_SWEEP_CHUNK_SIZE = 1000
+
+
+def mark_overdue_invoices(*, today=None, chunk_size: int = OVERDUE_SWEEP_CHUNK_SIZE) -> int:
+    """
+    Flip OPEN invoices whose due date has passed to OVERDUE.
+
+    Runs one set-based UPDATE per chunk of invoices (found through the
+    partial index on unsettled invoices). Each chunk locks its sales first,
+    in id order like the payment path, so the rewritten sale documents
+    cannot race a concurrent payment.
+
+    Returns the number of invoices marked overdue.
+    """
+    today = today or timezone.localdate()
+    expired = Invoice.objects.filter(
+        status=Invoice.Status.OPEN, due_date__lt=today, sale__status=Sale.Status.COMPLETED,
+    )
+
+    marked = 0
+    while True:
+        sale_ids = list(expired.order_by("sale_id").values_list("sale_id", flat=True)[:chunk_size])
+        if not sale_ids:
+            return marked
 
-        return sale
+        with transaction.atomic():
+            list(Sale.objects.select_for_update().filter(pk__in=sale_ids).order_by("pk").values_list("pk", flat=True))
+            marked += expired.filter(sale_id__in=sale_ids).update(status=Invoice.Status.OVERDUE)
+            write_sale_documents(sale_ids)
 
 
 def _generate_receipt_number(sale_id: int) -> str:
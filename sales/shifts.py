@@ -0,0 +1,104 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Sale, Shift
+
+COLLECTED_FIELDS = {
+    Sale.PaymentMethod.CASH: "cash_collected",
+    Sale.PaymentMethod.MPESA: "mpesa_collected",
+    Sale.PaymentMethod.CARD: "card_collected",
+    Sale.PaymentMethod.BANK: "bank_collected",
+}
+
+
+class ShiftError(Exception):
+    pass
+
+
+def lock_open_shift(user) -> int | None:
+    """
+    Id of user's open shift, row-locked so it cannot be closed until the
+    caller's transaction ends; None when the user has no open shift.
+    """
+    if user is None:
+        return None
+    return (
+        Shift.objects.select_for_update()
+        .filter(cashier=user, closed_at__isnull=True)
+        .values_list("id", flat=True)
+        .first()
+    )
+
+
+def add_to_shift(shift_id: int | None, *, collected: dict | None = None, **counters) -> None:
+    """
+    Add to a shift's running totals in one UPDATE.
+
+    counters: Shift counter field -> amount (e.g. sales_count=1, sales_total=...)
+    collected: payment method -> amount taken (negative for refunds)
+    """
+    if shift_id is None:
+        return
+
+    changes = {}
+    for field, amount in counters.items():
+        changes[field] = changes.get(field, 0) + amount
+    for method, amount in (collected or {}).items():
+        if method:
+            field = COLLECTED_FIELDS[method]
+            changes[field] = changes.get(field, 0) + amount
+
+    changes = {field: F(field) + amount for field, amount in changes.items() if amount}
+    if changes:
+        Shift.objects.filter(pk=shift_id).update(**changes)
+
+
+def book_sale(shift_id, sale: Sale) -> None:
+    taken = min(sale.amount_paid, sale.total)
+    add_to_shift(
+        shift_id,
+        sales_count=1,
+        sales_total=sale.total,
+        discount_total=sale.discount,
+        credit_issued=sale.total - taken if sale.payment_type == Sale.PaymentType.CREDIT else Decimal("0.00"),
+        collected={sale.payment_method: taken},
+    )
+
+
+def book_refund(shift_id, refunds: dict, **counters) -> None:
+    """refunds: payment method -> amount handed back."""
+    add_to_shift(
+        shift_id,
+        refunds_total=sum(refunds.values(), Decimal("0.00")),
+        collected={method: -amount for method, amount in refunds.items()},
+        **counters,
+    )
+
+
+def open_shift(*, cashier, opening_float: Decimal = Decimal("0.00")) -> Shift:
+    try:
+        with transaction.atomic():
+            return Shift.objects.create(cashier=cashier, opening_float=opening_float)
+    except IntegrityError:
+        # uniq_open_shift_per_cashier
+        raise ShiftError("You already have an open shift.")
+
+
+@transaction.atomic
+def close_shift(*, cashier, counted_cash: Decimal | None = None) -> Shift:
+    shift = (
+        Shift.objects.select_for_update(of=("self",))
+        .select_related("cashier")
+        .filter(cashier=cashier, closed_at__isnull=True)
+        .first()
+    )
+    if shift is None:
+        raise ShiftError("No open shift.")
+
+    shift.closed_at = timezone.now()
+    shift.counted_cash = counted_cash
+    shift.save(update_fields=["closed_at", "counted_cash"])
+    return shift
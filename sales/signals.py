@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from catalog.models import Product
+from .pricebook import remove_from_price_book, update_price_book
+
+
+@receiver(post_save, sender=Product)
+def refresh_price_book(sender, instance: Product, **kwargs):
+    transaction.on_commit(lambda: update_price_book(instance))
+
+
+@receiver(post_delete, sender=Product)
+def drop_from_price_book(sender, instance: Product, **kwargs):
+    product_id = instance.id
+    transaction.on_commit(lambda: remove_from_price_book(product_id))
@@ -0,0 +1,376 @@
+"""
+Concurrency stress harness for checkout (the stress_checkout command).
+
+Forks N worker processes that drive a weighted mix of create_sale,
+void_sale, add_payment and the inventory supply/adjust endpoints against a
+shared set of freshly created products, under a given isolation level.
+Afterwards it checks the invariants the locking scheme is meant to keep
+and reports throughput, latency and deadlock/serialization retries.
+
+Meant for a local/scratch PostgreSQL database: it writes real rows (under
+a STRESS-<run>- prefix) and deletes them afterwards unless asked to keep them.
+"""
+import logging
+import multiprocessing
+import random
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection, connections, transaction
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from django.db.models import Count, IntegerField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from catalog.models import Product
+from inventory.contention import reset_contention_stats, retry_counts
+from inventory.ledger import record_movement
+from inventory.models import Inventory, InventoryBucket, StockMovement
+from inventory.services import rebalance_stock_buckets, set_bucket_count
+from users.models import UserProfile
+from .models import Invoice, Receipt, Sale
+from .services import AlreadyVoided, InsufficientStock, add_payment, create_sale, void_sale
+
+ISOLATION_LEVELS = {
+    "read_committed": IsolationLevel.READ_COMMITTED,
+    "repeatable_read": IsolationLevel.REPEATABLE_READ,
+    "serializable": IsolationLevel.SERIALIZABLE,
+}
+
+DEFAULT_MIX = {"sale": 70, "void": 8, "payment": 12, "supply": 5, "adjust": 5}
+
+# Refusals the services are expected to give under contention; not errors.
+BUSINESS_ERRORS = (InsufficientStock, AlreadyVoided, ValueError, Sale.DoesNotExist)
+
+
+def parse_mix(text: str) -> dict[str, int]:
+    """"sale=70,void=10" -> {"sale": 70, "void": 10}"""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        op, _, weight = part.partition("=")
+        if op not in DEFAULT_MIX:
+            raise ValueError(f"Unknown operation {op!r}; use {', '.join(DEFAULT_MIX)}.")
+        mix[op] = int(weight)
+    if not any(mix.values()):
+        raise ValueError("The mix needs at least one operation with a positive weight.")
+    return mix
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+# fixtures ----------------------------------------------------------------------
+
+def create_fixtures(run: str, *, workers: int, products: int, stock: int, buckets: int) -> dict:
+    User = get_user_model()
+    prefix = f"STRESS-{run}"
+
+    owner = User.objects.create_user(username=f"{prefix}-owner".lower())
+    owner.profile.role = UserProfile.Role.OWNER
+    owner.profile.save()
+
+    cashier_ids = []
+    for i in range(workers):
+        cashier = User.objects.create_user(username=f"{prefix}-cashier-{i}".lower())
+        cashier.profile.role = UserProfile.Role.CASHIER
+        cashier.profile.save()
+        cashier_ids.append(cashier.id)
+
+    product_ids = []
+    for i in range(products):
+        product = Product.objects.create(
+            name=f"Stress item {i}",
+            sku=f"{prefix}-{i}",
+            selling_price=Decimal("10.00") + i,
+            cost_price=Decimal("5.00"),
+            is_active=True,
+        )
+        record_movement(
+            product=product,
+            movement_type=StockMovement.MovementType.SUPPLY,
+            direction=StockMovement.Direction.IN,
+            quantity=stock,
+            created_by=owner,
+            notes="stress seed",
+        )
+        if buckets:
+            set_bucket_count(Inventory.objects.get(product=product), buckets)
+        product_ids.append(product.id)
+
+    return {"owner_id": owner.id, "cashier_ids": cashier_ids, "product_ids": product_ids}
+
+
+def delete_fixtures(fixtures: dict) -> None:
+    User = get_user_model()
+    user_ids = [fixtures["owner_id"], *fixtures["cashier_ids"]]
+    with transaction.atomic():
+        Sale.objects.filter(cashier_id__in=user_ids).delete()
+        StockMovement.objects.filter(product_id__in=fixtures["product_ids"]).delete()
+        Product.objects.filter(id__in=fixtures["product_ids"]).delete()
+        User.objects.filter(id__in=user_ids).delete()
+
+
+# workers -----------------------------------------------------------------------
+
+def _pick(rng, model_ids):
+    return rng.choice(model_ids) if model_ids else None
+
+
+def _op_sale(rng, ctx):
+    basket = rng.sample(ctx["product_ids"], k=min(len(ctx["product_ids"]), rng.randint(1, 3)))
+    items = [{"product_id": pid, "quantity": rng.randint(1, 3)} for pid in basket]
+    if rng.random() < 0.3:
+        create_sale(
+            cashier=ctx["cashier"],
+            payment_type=Sale.PaymentType.CREDIT,
+            due_date=timezone.localdate() + timedelta(days=30),
+            items=items,
+        )
+    else:
+        create_sale(cashier=ctx["cashier"], payment_method=Sale.PaymentMethod.CASH, items=items)
+
+
+def _op_void(rng, ctx):
+    ids = list(
+        Sale.objects.filter(cashier_id__in=ctx["cashier_ids"], status=Sale.Status.COMPLETED)
+        .order_by("-id").values_list("id", flat=True)[:50]
+    )
+    sale_id = _pick(rng, ids)
+    if sale_id is not None:
+        void_sale(sale_id=sale_id, voided_by=ctx["owner"], notes="stress")
+
+
+def _op_payment(rng, ctx):
+    ids = list(
+        Sale.objects.filter(
+            cashier_id__in=ctx["cashier_ids"],
+            status=Sale.Status.COMPLETED,
+            payment_status__in=[Sale.PaymentStatus.UNPAID, Sale.PaymentStatus.PARTIAL],
+        ).order_by("-id").values_list("id", flat=True)[:50]
+    )
+    sale_id = _pick(rng, ids)
+    if sale_id is not None:
+        add_payment(
+            sale_id=sale_id,
+            received_by=ctx["cashier"],
+            method=Sale.PaymentMethod.MPESA,
+            amount=Decimal(rng.choice(["5.00", "10.00", "50.00"])),
+        )
+
+
+def _stock_op(path, payload):
+    def op(rng, ctx):
+        res = ctx["client"].post(
+            path, {"product_id": rng.choice(ctx["product_ids"]), "quantity": rng.randint(1, 5), **payload},
+            format="json",
+        )
+        if res.status_code >= 400:
+            raise ValueError(res.data)
+    return op
+
+
+OPERATIONS = {
+    "sale": _op_sale,
+    "void": _op_void,
+    "payment": _op_payment,
+    "supply": _stock_op("/api/inventory/ops/supply/", {}),
+    "adjust": _stock_op("/api/inventory/ops/adjust/", {"direction": "OUT"}),
+}
+
+
+def _run_worker(results, index, fixtures, isolation, mix, duration, ops_per_worker, seed) -> None:
+    # Retries and failed requests are counted in the report, not logged one by one.
+    for name in ("django.request", "inventory.contention"):
+        logging.getLogger(name).setLevel(logging.CRITICAL)
+
+    # Fresh connection for this process, at the run's isolation level.
+    connections.close_all()
+    connection.settings_dict.setdefault("OPTIONS", {})["isolation_level"] = ISOLATION_LEVELS[isolation]
+    reset_contention_stats()
+
+    User = get_user_model()
+    owner = User.objects.get(pk=fixtures["owner_id"])
+    client = APIClient()
+    client.force_authenticate(user=owner)
+    ctx = {
+        "owner": owner,
+        "cashier": User.objects.get(pk=fixtures["cashier_ids"][index]),
+        "cashier_ids": fixtures["cashier_ids"],
+        "product_ids": fixtures["product_ids"],
+        "client": client,
+    }
+
+    rng = random.Random(seed + index)
+    names, weights = zip(*((op, w) for op, w in mix.items() if w > 0))
+    result = {"latencies": {op: [] for op in names}, "ok": 0, "rejected": 0, "aborted": {}, "errors": {}}
+
+    deadline = time.monotonic() + duration if duration else None
+    done = 0
+    while (deadline is None or time.monotonic() < deadline) and (not ops_per_worker or done < ops_per_worker):
+        op = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            OPERATIONS[op](rng, ctx)
+        except OperationalError as e:
+            code = getattr(e.__cause__, "pgcode", None) or "other"
+            result["aborted"][code] = result["aborted"].get(code, 0) + 1
+        except BUSINESS_ERRORS:
+            result["rejected"] += 1
+        except Exception as e:  # reported, never swallowed silently
+            name = type(e).__name__
+            result["errors"][name] = result["errors"].get(name, 0) + 1
+        else:
+            result["ok"] += 1
+        result["latencies"][op].append(time.perf_counter() - started)
+        done += 1
+
+    result["retries"] = retry_counts()
+    connections.close_all()
+    results.put(result)
+
+
+# invariants --------------------------------------------------------------------
+
+def check_invariants(fixtures: dict) -> list[str]:
+    """Violations found in the run's data; empty when everything holds."""
+    problems = []
+    product_ids = fixtures["product_ids"]
+    inventories = Inventory.objects.filter(product_id__in=product_ids)
+
+    negative = list(inventories.filter(quantity__lt=0).values_list("product__sku", flat=True))
+    negative += list(
+        InventoryBucket.objects.filter(inventory__product_id__in=product_ids, quantity__lt=0)
+        .values_list("inventory__product__sku", flat=True)
+    )
+    if negative:
+        problems.append(f"negative stock: {sorted(set(negative))}")
+
+    zero = Value(0, output_field=IntegerField())
+    ledger = dict(
+        StockMovement.objects.filter(product_id__in=product_ids)
+        .values("product_id")
+        .annotate(
+            net=Coalesce(Sum("quantity", filter=Q(direction=StockMovement.Direction.IN)), zero)
+            - Coalesce(Sum("quantity", filter=Q(direction=StockMovement.Direction.OUT)), zero)
+        )
+        .values_list("product_id", "net")
+    )
+    buckets = dict(
+        InventoryBucket.objects.filter(inventory__product_id__in=product_ids)
+        .values("inventory__product_id")
+        .annotate(total=Sum("quantity"))
+        .values_list("inventory__product_id", "total")
+    )
+    for pid, sku, quantity, bucket_count in inventories.values_list("product_id", "product__sku", "quantity", "bucket_count"):
+        if quantity != ledger.get(pid, 0):
+            problems.append(f"{sku}: quantity {quantity} != movement ledger {ledger.get(pid, 0)}")
+        if bucket_count and buckets.get(pid, 0) != quantity:
+            problems.append(f"{sku}: quantity {quantity} != bucket sum {buckets.get(pid, 0)}")
+
+    user_ids = [fixtures["owner_id"], *fixtures["cashier_ids"]]
+    for model, field in ((Receipt, "receipt_number"), (Invoice, "invoice_number")):
+        dupes = (
+            model.objects.filter(sale__cashier_id__in=user_ids)
+            .values(field).annotate(n=Count("id")).filter(n__gt=1)
+        )
+        if dupes.exists():
+            problems.append(f"duplicate {field}s: {[row[field] for row in dupes[:10]]}")
+
+    return problems
+
+
+# driver ------------------------------------------------------------------------
+
+def run_stress(
+    *,
+    isolation: str,
+    workers: int = 8,
+    products: int = 5,
+    stock: int = 500,
+    buckets: int = 0,
+    mix: dict | None = None,
+    duration: float = 10.0,
+    ops_per_worker: int = 0,
+    seed: int = 0,
+    keep: bool = False,
+) -> dict:
+    """
+    One run at one isolation level. Returns a report dict: throughput,
+    p50/p99 latency overall and per operation, outcome counts, retries and
+    final aborts by SQLSTATE, and invariant violations.
+    """
+    if connection.vendor != "postgresql":
+        raise RuntimeError("The stress harness needs PostgreSQL.")
+
+    mix = mix or DEFAULT_MIX
+    run = f"{isolation[:2]}{uuid.uuid4().hex[:6]}".upper()
+    fixtures = create_fixtures(run, workers=workers, products=products, stock=stock, buckets=buckets)
+
+    connections.close_all()  # never share a socket with the forked workers
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.SimpleQueue()
+    processes = [
+        ctx.Process(target=_run_worker, args=(queue, i, fixtures, isolation, mix, duration, ops_per_worker, seed))
+        for i in range(workers)
+    ]
+    started = time.perf_counter()
+    for p in processes:
+        p.start()
+    results = [queue.get() for _ in processes]
+    elapsed = time.perf_counter() - started
+    for p in processes:
+        p.join()
+
+    try:
+        if buckets:
+            # What the periodic rebalance job does: resync any aggregate
+            # whose post-sale refresh gave up under contention.
+            rebalance_stock_buckets()
+        problems = check_invariants(fixtures)
+        sales = Sale.objects.filter(cashier_id__in=fixtures["cashier_ids"]).count()
+    finally:
+        if not keep:
+            delete_fixtures(fixtures)
+
+    latencies = {op: [v for r in results for v in r["latencies"].get(op, [])] for op in mix}
+    all_latencies = [v for values in latencies.values() for v in values]
+
+    def merged(key):
+        out = {}
+        for r in results:
+            for k, n in r[key].items():
+                out[k] = out.get(k, 0) + n
+        return out
+
+    return {
+        "isolation": isolation,
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "operations": len(all_latencies),
+        "ops_per_second": round(len(all_latencies) / elapsed, 1) if elapsed else 0.0,
+        "sales_per_second": round(sales / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(all_latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(all_latencies, 99) * 1000, 2),
+        "by_operation": {
+            op: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+            }
+            for op, values in latencies.items() if values
+        },
+        "ok": sum(r["ok"] for r in results),
+        "rejected": sum(r["rejected"] for r in results),
+        "retries": merged("retries"),
+        "aborted": merged("aborted"),
+        "errors": merged("errors"),
+        "invariant_violations": problems,
+    }
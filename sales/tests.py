@@ -1,16 +1,39 @@
+import io
+import json
+import os
+import tempfile
+import threading
 from decimal import Decimal
+from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APIClient
 
 from users.models import UserProfile
 from catalog.models import Product
+from inventory.ledger import record_movement
 from inventory.models import Inventory, StockMovement
 from notifications.models import Notification
 
-from sales.models import Sale
-from sales.services import create_sale, void_sale, InsufficientStock, AlreadyVoided
+from sales.models import (
+    Customer, Sale, SaleItem, Receipt, DocumentSequence, Invoice, Payment, SaleDocument, ImportCheckpoint,
+    MpesaCallback, IdempotencyKey,
+)
+from sales.customers import CreditLimitExceeded, rebuild_customer_ledger
+from sales.services import (
+    create_sale, void_sale, return_sale_items, add_payment, mark_overdue_invoices, InsufficientStock, AlreadyVoided,
+)
+from sales.shifts import open_shift
+from sales.utils import generate_receipt_number
+from sales.group_commit import GroupCommitTimeout, _Ticket, _commit_next_group, _queue, commit_group, submit_sale
+from sales.stress import run_stress
+from sales import mpesa_stub
 
 
 User = get_user_model()
@@ -42,7 +65,7 @@ class SalesMinimalTests(TestCase):
         )
         self.inv = Inventory.objects.get(product=self.product)
 
-        StockMovement.objects.create(
+        record_movement(
             product=self.product,
             movement_type=StockMovement.MovementType.SUPPLY,
             direction=StockMovement.Direction.IN,
@@ -57,11 +80,12 @@ class SalesMinimalTests(TestCase):
     def test_create_sale_deducts_stock_creates_items_receipt_and_owner_notification(self):
         Notification.objects.all().delete()
 
-        sale = create_sale(
-            cashier=self.cashier1,
-            payment_method=Sale.PaymentMethod.CASH,
-            items=[{"product_id": self.product.id, "quantity": 2}],
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = create_sale(
+                cashier=self.cashier1,
+                payment_method=Sale.PaymentMethod.CASH,
+                items=[{"product_id": self.product.id, "quantity": 2}],
+            )
 
         sale.refresh_from_db()
         self.inv.refresh_from_db()
@@ -187,4 +211,959 @@ class SalesMinimalTests(TestCase):
         self.assertEqual(res.status_code, 200)
         ids = [row["id"] for row in res.data["results"]]
         self.assertIn(s1.id, ids)
-        self.assertIn(s2.id, ids)
\ No newline at end of file
+        self.assertIn(s2.id, ids)
+
+    def _stocked_products(self, n):
+        products = []
+        for idx in range(n):
+            p = Product.objects.create(
+                name=f"Item {idx}",
+                sku=f"ITEM-{idx}",
+                selling_price=Decimal("10.00"),
+                is_active=True,
+            )
+            record_movement(
+                product=p,
+                movement_type=StockMovement.MovementType.SUPPLY,
+                direction=StockMovement.Direction.IN,
+                quantity=100,
+                created_by=self.owner,
+            )
+            products.append(p)
+        return products
+
+    def test_create_sale_query_count_does_not_grow_with_basket_size(self):
+        products = self._stocked_products(6)
+
+        def run(basket):
+            with CaptureQueriesContext(connection) as ctx:
+                create_sale(
+                    cashier=self.cashier1,
+                    payment_method=Sale.PaymentMethod.CASH,
+                    items=[{"product_id": p.id, "quantity": 1} for p in basket],
+                )
+            return len(ctx.captured_queries)
+
+        run(products[:1])  # reserves the receipt number block
+        self.assertEqual(run(products[:1]), run(products[1:]))
+        self.assertEqual(Inventory.objects.get(product=products[0]).quantity, 98)
+        self.assertEqual(Inventory.objects.get(product=products[-1]).quantity, 99)
+
+    def test_create_sale_sums_repeated_lines_for_stock_check_and_flags_low_stock(self):
+        Notification.objects.all().delete()
+
+        with self.assertRaises(InsufficientStock):
+            create_sale(
+                cashier=self.cashier1,
+                payment_method=Sale.PaymentMethod.CASH,
+                items=[
+                    {"product_id": self.product.id, "quantity": 30},
+                    {"product_id": self.product.id, "quantity": 30},
+                ],
+            )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = create_sale(
+                cashier=self.cashier1,
+                payment_method=Sale.PaymentMethod.CASH,
+                items=[
+                    {"product_id": self.product.id, "quantity": 20},
+                    {"product_id": self.product.id, "quantity": 25},
+                ],
+            )
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 5)
+        self.assertTrue(self.inv.low_stock_flag)
+        self.assertEqual(sale.items.count(), 2)
+        self.assertEqual(StockMovement.objects.filter(sale=sale).count(), 2)
+        self.assertEqual(
+            Notification.objects.filter(type=Notification.Type.LOW_STOCK, product_id=self.product.id).count(),
+            1,
+        )
+
+    def test_receipt_numbers_continue_from_legacy_receipts_and_are_unique(self):
+        year = timezone.localdate().year
+        sale = create_sale(
+            cashier=self.cashier1,
+            payment_method=Sale.PaymentMethod.CASH,
+            items=[{"product_id": self.product.id, "quantity": 1}],
+        )
+        legacy = Receipt.objects.create(sale=create_sale(
+            cashier=self.cashier1,
+            payment_type=Sale.PaymentType.CREDIT,
+            due_date=timezone.localdate(),
+            items=[{"product_id": self.product.id, "quantity": 1}],
+        ), receipt_number=f"LEG-{year}-000041")
+
+        numbers = [generate_receipt_number(prefix="LEG") for _ in range(3)]
+        self.assertEqual(numbers, [f"LEG-{year}-0000{n}" for n in (42, 43, 44)])
+        self.assertNotIn(sale.receipt.receipt_number, numbers + [legacy.receipt_number])
+
+    def test_document_number_block_is_dropped_when_its_transaction_rolls_back(self):
+        year = timezone.localdate().year
+        with self.settings(DOCUMENT_NUMBER_BLOCK_SIZE=5):
+            try:
+                with transaction.atomic():
+                    first = generate_receipt_number(prefix="TST")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+            self.assertFalse(DocumentSequence.objects.filter(prefix="TST").exists())
+            second = generate_receipt_number(prefix="TST")
+            third = generate_receipt_number(prefix="TST")
+
+        self.assertEqual(first, second)
+        self.assertEqual(third, f"TST-{year}-000002")
+        self.assertEqual(DocumentSequence.objects.get(prefix="TST", year=year).last_value, 5)
+
+    def test_document_number_block_is_dropped_when_its_savepoint_rolls_back(self):
+        year = timezone.localdate().year
+        with self.settings(DOCUMENT_NUMBER_BLOCK_SIZE=2):
+            numbers = [generate_receipt_number(prefix="SVP") for _ in range(2)]
+            try:
+                with transaction.atomic():
+                    numbers.append(generate_receipt_number(prefix="SVP"))
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            numbers += [generate_receipt_number(prefix="SVP") for _ in range(2)]
+
+        self.assertEqual(numbers, [f"SVP-{year}-00000{n}" for n in (1, 2, 3, 3, 4)])
+        self.assertEqual(DocumentSequence.objects.get(prefix="SVP", year=year).last_value, 4)
+
+    def test_sale_create_api_replays_response_for_repeated_idempotency_key(self):
+        self.client.force_authenticate(user=self.cashier1)
+        payload = {"payment_method": "CASH", "items": [{"product_id": self.product.id, "quantity": 3}]}
+
+        first = self.client.post(f"{self.BASE}/create/", payload, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+        self.assertEqual(first.status_code, 201)
+
+        with CaptureQueriesContext(connection) as ctx:
+            retry = self.client.post(f"{self.BASE}/create/", payload, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.json()["id"], first.data["id"])
+        self.assertFalse(any("inventory_inventory" in q["sql"] for q in ctx.captured_queries))
+
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 47)
+        self.assertEqual(Sale.objects.count(), 1)
+
+        other = dict(payload, items=[{"product_id": self.product.id, "quantity": 1}])
+        res = self.client.post(f"{self.BASE}/create/", other, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+        self.assertEqual(res.status_code, 422)
+
+        self.client.force_authenticate(user=self.cashier2)
+        res = self.client.post(f"{self.BASE}/create/", payload, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+        self.assertEqual(res.status_code, 201)
+        self.assertNotEqual(res.data["id"], first.data["id"])
+
+    def test_idempotency_key_left_in_flight_by_a_dead_worker_is_taken_over_after_its_lease(self):
+        self.client.force_authenticate(user=self.cashier1)
+        payload = {"payment_method": "CASH", "items": [{"product_id": self.product.id, "quantity": 3}]}
+
+        # The worker is killed after claiming the key and before answering.
+        with mock.patch("sales.views.submit_sale", side_effect=SystemExit), self.assertRaises(SystemExit):
+            self.client.post(f"{self.BASE}/create/", payload, format="json", HTTP_IDEMPOTENCY_KEY="k-2")
+        record = IdempotencyKey.objects.get(key="k-2")
+        self.assertIsNone(record.status_code)
+        self.assertLess(record.expires_at, timezone.now() + timezone.timedelta(minutes=5))
+
+        res = self.client.post(f"{self.BASE}/create/", payload, format="json", HTTP_IDEMPOTENCY_KEY="k-2")
+        self.assertEqual(res.status_code, 409)
+
+        IdempotencyKey.objects.filter(key="k-2").update(expires_at=timezone.now())
+        res = self.client.post(f"{self.BASE}/create/", payload, format="json", HTTP_IDEMPOTENCY_KEY="k-2")
+        self.assertEqual(res.status_code, 201)
+        record = IdempotencyKey.objects.get(key="k-2")
+        self.assertEqual(record.status_code, 201)
+        self.assertGreater(record.expires_at, timezone.now() + timezone.timedelta(hours=23))
+        self.assertEqual(Sale.objects.count(), 1)
+
+    def test_sale_batch_api_commits_valid_sales_and_reports_failures_per_sale(self):
+        self.client.force_authenticate(user=self.cashier1)
+        line = lambda qty: [{"product_id": self.product.id, "quantity": qty}]
+        payload = [
+            {"payment_method": "CASH", "items": line(10)},
+            {"payment_method": "CASH", "items": line(45)},
+            {"items": line(1)},
+            {"payment_method": "MPESA", "items": line(30)},
+        ]
+
+        res = self.client.post(f"{self.BASE}/batch/", payload, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["created"], 2)
+        self.assertEqual(res.data["failed"], 2)
+
+        statuses = [r["status"] for r in res.data["results"]]
+        self.assertEqual(statuses, ["created", "failed", "failed", "created"])
+        self.assertIn("Insufficient stock", res.data["results"][1]["detail"])
+        self.assertIn("payment_method", res.data["results"][2]["errors"])
+
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 10)
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_sale_batch_api_accepts_ndjson(self):
+        self.client.force_authenticate(user=self.cashier1)
+        body = "\n".join([
+            '{"payment_method": "CASH", "items": [{"product_id": %d, "quantity": 2}]}' % self.product.id,
+            "",
+            '{"payment_method": "CARD", "items": [{"product_id": %d, "quantity": 3}]}' % self.product.id,
+        ])
+
+        res = self.client.post(f"{self.BASE}/batch/", body, content_type="application/x-ndjson")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["created"], 2)
+
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 45)
+
+    def test_owner_notifications_wait_for_commit_and_use_cached_owner_list(self):
+        Notification.objects.all().delete()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            sale = create_sale(
+                cashier=self.cashier1,
+                payment_method=Sale.PaymentMethod.CASH,
+                items=[{"product_id": self.product.id, "quantity": 1}],
+            )
+            void_sale(sale_id=sale.id, voided_by=self.owner)
+        self.assertEqual(Notification.objects.count(), 0)
+
+        owner2 = User.objects.create_user(username="own2", password="pass1234")
+        owner2.profile.role = UserProfile.Role.OWNER
+        owner2.profile.save()
+
+        with CaptureQueriesContext(connection) as ctx:
+            for callback in callbacks:
+                callback()
+        self.assertEqual(Notification.objects.filter(sale_id=sale.id).count(), 4)
+        self.assertEqual(
+            Notification.objects.filter(type=Notification.Type.SALE_VOIDED, recipient=owner2).count(),
+            1,
+        )
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 2)
+
+    def test_quote_api_prices_cart_from_price_book_without_locking(self):
+        self.client.force_authenticate(user=self.cashier1)
+        payload = {"items": [
+            {"product_id": self.product.id, "quantity": 2},
+            {"product_id": 999999, "quantity": 1},
+        ]}
+        self.client.post(f"{self.BASE}/quote/", {"items": [{"product_id": self.product.id, "quantity": 1}]}, format="json")
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(f"{self.BASE}/quote/", {"items": payload["items"][:1]}, format="json")
+        self.assertFalse(any("FOR UPDATE" in q["sql"] for q in ctx.captured_queries))
+        self.assertFalse(any("catalog_product" in q["sql"] for q in ctx.captured_queries))
+
+        res = self.client.post(f"{self.BASE}/quote/", payload, format="json")
+        self.assertEqual(res.status_code, 200)
+
+        self.assertEqual(res.data["subtotal"], "120.00")
+        self.assertEqual(res.data["lines"][0]["available"], 50)
+        self.assertIsNone(res.data["lines"][0]["error"])
+        self.assertEqual(res.data["lines"][1]["error"], "Product not found.")
+        self.assertFalse(res.data["can_checkout"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.selling_price = Decimal("75.00")
+            self.product.save(update_fields=["selling_price"])
+
+        res = self.client.post(f"{self.BASE}/quote/", {"items": [{"product_id": self.product.id, "quantity": 60}]}, format="json")
+        self.assertEqual(res.data["lines"][0]["unit_price"], "75.00")
+        self.assertFalse(res.data["lines"][0]["in_stock"])
+        self.assertFalse(res.data["can_checkout"])
+
+    def test_line_return_refunds_restocks_and_later_void_only_restores_the_rest(self):
+        sale = create_sale(
+            cashier=self.cashier1,
+            payment_method=Sale.PaymentMethod.CASH,
+            items=[{"product_id": self.product.id, "quantity": 5}],
+        )
+        item = sale.items.get()
+
+        self.client.force_authenticate(user=self.cashier1)
+        res = self.client.post(
+            f"{self.BASE}/{sale.id}/returns/",
+            {"items": [{"sale_item_id": item.id, "quantity": 2}], "notes": "damaged"},
+            format="json",
+        )
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.data["return"]["refund_amount"], "120.00")
+        self.assertEqual(res.data["return"]["refund_method"], "CASH")
+        self.assertEqual(res.data["sale"]["total"], "180.00")
+        self.assertEqual(res.data["sale"]["items"][0]["returned_quantity"], 2)
+
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 47)
+        self.assertEqual(
+            StockMovement.objects.filter(sale=sale, movement_type=StockMovement.MovementType.RETURN).count(),
+            1,
+        )
+
+        res = self.client.post(
+            f"{self.BASE}/{sale.id}/returns/",
+            {"items": [{"sale_item_id": item.id, "quantity": 4}]},
+            format="json",
+        )
+        self.assertEqual(res.status_code, 400)
+
+        void_sale(sale_id=sale.id, voided_by=self.owner)
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 50)
+
+    def test_line_return_on_credit_sale_settles_invoice_when_paid_amount_covers_new_total(self):
+        sale = create_sale(
+            cashier=self.cashier1,
+            payment_type=Sale.PaymentType.CREDIT,
+            payment_method=Sale.PaymentMethod.MPESA,
+            amount_paid=Decimal("60.00"),
+            due_date=timezone.localdate(),
+            items=[{"product_id": self.product.id, "quantity": 3}],
+        )
+        self.assertEqual(sale.payment_status, Sale.PaymentStatus.PARTIAL)
+        item = sale.items.get()
+
+        sale_return = return_sale_items(
+            sale_id=sale.id,
+            items=[{"sale_item_id": item.id, "quantity": 2}],
+            returned_by=self.cashier1,
+        )
+        sale.refresh_from_db()
+
+        self.assertEqual(sale_return.refund_amount, Decimal("0.00"))
+        self.assertEqual(sale.total, Decimal("60.00"))
+        self.assertEqual(sale.payment_status, Sale.PaymentStatus.PAID)
+        self.assertEqual(sale.invoice.status, "PAID")
+        self.assertTrue(sale.receipt.receipt_number)
+
+        return_sale_items(sale_id=sale.id, items=[{"sale_item_id": item.id, "quantity": 1}], returned_by=self.cashier1)
+        sale.refresh_from_db()
+        self.assertEqual(sale.status, Sale.Status.VOIDED)
+        self.assertEqual(sale.total, Decimal("0.00"))
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 50)
+
+    def _credit_sale(self, qty, phone="0700000001"):
+        return create_sale(
+            cashier=self.cashier1,
+            payment_type=Sale.PaymentType.CREDIT,
+            due_date=timezone.localdate(),
+            customer_phone=phone,
+            items=[{"product_id": self.product.id, "quantity": qty}],
+        )
+
+    def test_add_payment_settles_credit_sale_and_closes_invoice(self):
+        sale = self._credit_sale(2)
+        add_payment(sale_id=sale.id, received_by=self.cashier1, method="CASH", amount=Decimal("50.00"))
+        sale = add_payment(sale_id=sale.id, received_by=self.cashier1, method="CASH", amount=Decimal("70.00"))
+
+        self.assertEqual(sale.payment_status, Sale.PaymentStatus.PAID)
+        self.assertEqual(Invoice.objects.get(sale=sale).status, Invoice.Status.PAID)
+        self.assertTrue(Receipt.objects.filter(sale=sale).exists())
+
+    def test_allocate_payment_api_pays_open_sales_oldest_first(self):
+        first = self._credit_sale(1)
+        second = self._credit_sale(2)
+        third = self._credit_sale(1)
+        other = self._credit_sale(1, phone="0799999999")
+
+        self.client.force_authenticate(user=self.cashier1)
+        payload = {"customer_phone": "0700000001", "amount": "150.00", "method": "MPESA", "reference": "QX1"}
+        res = self.client.post(f"{self.BASE}/payments/allocate/", payload, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.data["allocated"], "150.00")
+        self.assertEqual([row["sale_id"] for row in res.data["sales"]], [first.id, second.id])
+
+        statuses = dict(Sale.objects.values_list("id", "payment_status"))
+        self.assertEqual(statuses[first.id], Sale.PaymentStatus.PAID)
+        self.assertEqual(statuses[second.id], Sale.PaymentStatus.PARTIAL)
+        self.assertEqual(statuses[third.id], Sale.PaymentStatus.UNPAID)
+        self.assertEqual(statuses[other.id], Sale.PaymentStatus.UNPAID)
+
+        self.assertEqual(Invoice.objects.get(sale=first).status, Invoice.Status.PAID)
+        self.assertEqual(Invoice.objects.get(sale=second).status, Invoice.Status.OPEN)
+        self.assertTrue(Receipt.objects.filter(sale=first).exists())
+        self.assertEqual(Payment.objects.filter(reference="QX1").count(), 2)
+
+        payload["amount"] = "500.00"
+        res = self.client.post(f"{self.BASE}/payments/allocate/", payload, format="json")
+        self.assertEqual(res.status_code, 400)
+
+    def test_customer_balance_follows_sales_payments_voids_and_returns(self):
+        first = self._credit_sale(2, phone="0700 000-001")
+        second = self._credit_sale(1, phone="+254700000001")
+        create_sale(
+            cashier=self.cashier1,
+            payment_method=Sale.PaymentMethod.CASH,
+            customer_phone="254700000001",
+            items=[{"product_id": self.product.id, "quantity": 1}],
+        )
+
+        customer = Customer.objects.get()
+        self.assertEqual(customer.phone, "+254700000001")
+        self.assertEqual((customer.balance, customer.lifetime_spend), (Decimal("180.00"), Decimal("240.00")))
+
+        add_payment(sale_id=first.id, received_by=self.cashier1, method="CASH", amount=Decimal("50.00"))
+        void_sale(sale_id=second.id, voided_by=self.cashier1)
+        item = first.items.get()
+        return_sale_items(sale_id=first.id, items=[{"sale_item_id": item.id, "quantity": 1}], returned_by=self.cashier1)
+
+        customer.refresh_from_db()
+        self.assertEqual((customer.balance, customer.lifetime_spend), (Decimal("10.00"), Decimal("120.00")))
+
+        # The running figures agree with a full recompute from history.
+        rebuild_customer_ledger()
+        customer.refresh_from_db()
+        self.assertEqual((customer.balance, customer.lifetime_spend), (Decimal("10.00"), Decimal("120.00")))
+
+    def test_credit_limit_blocks_checkout_and_statement_reads_stored_balance(self):
+        sale = self._credit_sale(1)
+        url = f"{self.BASE}/customers/0700000001/"
+
+        self.client.force_authenticate(user=self.cashier1)
+        self.assertEqual(self.client.patch(url, {"credit_limit": "100.00"}, format="json").status_code, 403)
+
+        self.client.force_authenticate(user=self.owner)
+        res = self.client.patch(url, {"credit_limit": "100.00", "name": "Wanjiku"}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["available_credit"], "40.00")
+
+        with self.assertRaises(CreditLimitExceeded):
+            self._credit_sale(1)
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 49)
+
+        self.client.force_authenticate(user=self.cashier1)
+        with self.assertNumQueries(2):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["balance"], "60.00")
+        self.assertEqual([row["sale_id"] for row in res.data["open_sales"]], [sale.id])
+
+        res = self.client.get(f"{self.BASE}/customers/?owing=1")
+        self.assertEqual([row["name"] for row in res.data["results"]], ["Wanjiku"])
+
+    @override_settings(MPESA_CALLBACK_TOKEN="s3cret")
+    def test_mpesa_callbacks_are_deduplicated_and_applied_in_batches(self):
+        first = self._credit_sale(2)
+        second = self._credit_sale(1)
+        by_invoice = mpesa_stub.confirmation(amount=Decimal("50.00"), bill_ref=first.invoice.invoice_number)
+        by_phone = mpesa_stub.confirmation(amount=Decimal("100.00"), msisdn="254700000001")
+        unknown = mpesa_stub.confirmation(amount=Decimal("10.00"), bill_ref="NO-SUCH-REF")
+        by_sale_id = mpesa_stub.confirmation(amount=Decimal("10.00"), bill_ref=f"sale-{second.id}")
+        # A bare number is not a sale id; one that looks like a phone pays that customer.
+        bare_number = mpesa_stub.confirmation(amount=Decimal("10.00"), bill_ref=str(second.id))
+        by_phone_ref = mpesa_stub.confirmation(amount=Decimal("5.00"), bill_ref="0700 000001", msisdn="254799999999")
+        batch = [by_invoice, by_phone, unknown, by_sale_id, bare_number, by_phone_ref]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mpesa_stub.send(batch, client=self.client, token="s3cret"), 200)
+            # Provider retry of an already stored confirmation.
+            self.assertEqual(mpesa_stub.send(by_invoice, client=self.client, token="s3cret"), 200)
+
+        statuses = dict(MpesaCallback.objects.values_list("trans_id", "status"))
+        self.assertEqual(statuses, {
+            by_invoice["TransID"]: MpesaCallback.Status.APPLIED,
+            by_phone["TransID"]: MpesaCallback.Status.APPLIED,
+            unknown["TransID"]: MpesaCallback.Status.UNMATCHED,
+            by_sale_id["TransID"]: MpesaCallback.Status.APPLIED,
+            bare_number["TransID"]: MpesaCallback.Status.UNMATCHED,
+            by_phone_ref["TransID"]: MpesaCallback.Status.APPLIED,
+        })
+        self.assertEqual(Payment.objects.filter(method=Sale.PaymentMethod.MPESA).count(), 5)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.payment_status, Sale.PaymentStatus.PAID)
+        self.assertEqual(second.amount_paid, Decimal("45.00"))
+        self.assertEqual(Customer.objects.get().balance, Decimal("15.00"))
+
+        self.assertEqual(mpesa_stub.send({"TransAmount": "5"}, client=self.client, token="s3cret"), 400)
+        self.assertEqual(mpesa_stub.send(unknown, client=self.client), 403)
+        self.assertEqual(mpesa_stub.send(unknown, client=self.client, token="wrong"), 403)
+
+    def test_mpesa_callback_without_configured_token_is_refused_unless_debug(self):
+        payload = mpesa_stub.confirmation(amount=Decimal("60.00"), bill_ref=f"SALE-{self._credit_sale(1).id}")
+
+        with override_settings(MPESA_CALLBACK_TOKEN="", DEBUG=False):
+            self.assertEqual(mpesa_stub.send(payload, client=self.client), 403)
+        self.assertFalse(MpesaCallback.objects.exists())
+
+        with override_settings(MPESA_CALLBACK_TOKEN="", DEBUG=True):
+            self.assertEqual(mpesa_stub.send(payload, client=self.client), 200)
+
+    def test_sale_list_api_pages_by_cursor_and_filters_by_local_day_range(self):
+        sales = [
+            create_sale(
+                cashier=self.cashier1,
+                payment_method=Sale.PaymentMethod.CASH,
+                items=[{"product_id": self.product.id, "quantity": 1}],
+            )
+            for _ in range(5)
+        ]
+        old = sales[0]
+        Sale.objects.filter(id=old.id).update(created_at=timezone.now() - timezone.timedelta(days=3))
+
+        self.client.force_authenticate(user=self.owner)
+        res = self.client.get(f"{self.BASE}/", {"page_size": 2})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn("count", res.data)
+
+        seen = []
+        while True:
+            seen.extend(row["id"] for row in res.data["results"])
+            if not res.data["next"]:
+                break
+            res = self.client.get(res.data["next"])
+        self.assertEqual(seen, [s.id for s in reversed(sales[1:])] + [old.id])
+
+        today = timezone.localdate().isoformat()
+        res = self.client.get(f"{self.BASE}/", {"date_from": today, "date_to": today})
+        ids = [row["id"] for row in res.data["results"]]
+        self.assertEqual(len(ids), 4)
+        self.assertNotIn(old.id, ids)
+
+        res = self.client.get(f"{self.BASE}/", {"date_from": "2026-02-30"})
+        self.assertEqual(res.status_code, 400)
+
+
+    def test_sale_list_api_returns_flat_rows_and_loads_only_included_relations(self):
+        for _ in range(3):
+            create_sale(
+                cashier=self.cashier1,
+                payment_method=Sale.PaymentMethod.CASH,
+                items=[{"product_id": self.product.id, "quantity": 1}],
+            )
+
+        self.client.force_authenticate(user=self.owner)
+        with self.assertNumQueries(1):
+            res = self.client.get(f"{self.BASE}/")
+        self.assertEqual(res.status_code, 200)
+        row = res.data["results"][0]
+        self.assertNotIn("items", row)
+        self.assertEqual(row["cashier_username"], self.cashier1.username)
+        self.assertTrue(row["receipt_number"].startswith("RCPT-"))
+        self.assertEqual(row["document_type"], "RECEIPT")
+
+        res = self.client.get(f"{self.BASE}/", {"fields": "id,total"})
+        self.assertEqual(set(res.data["results"][0]), {"id", "total"})
+
+        with self.assertNumQueries(2):  # + one query for the items of the whole page
+            res = self.client.get(f"{self.BASE}/", {"fields": "id", "include": "items"})
+        self.assertEqual(len(res.data["results"]), 3)
+        for row in res.data["results"]:
+            self.assertEqual(set(row), {"id", "items"})
+            self.assertEqual(row["items"][0]["quantity"], 1)
+
+        res = self.client.get(f"{self.BASE}/", {"include": "lines"})
+        self.assertEqual(res.status_code, 400)
+
+    def test_sale_detail_is_served_from_versioned_document_with_etag(self):
+        sale = self._credit_sale(1)
+        self.client.force_authenticate(user=self.cashier1)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(f"{self.BASE}/{sale.id}/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["payment_status"], "UNPAID")
+        self.assertEqual(res.data["items"][0]["sku"], "MILK-1")
+        etag = res["ETag"]
+
+        res = self.client.get(f"{self.BASE}/{sale.id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+
+        add_payment(sale_id=sale.id, received_by=self.cashier1, method=Sale.PaymentMethod.CASH, amount=Decimal("60.00"))
+        res = self.client.get(f"{self.BASE}/{sale.id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res["ETag"], etag)
+        self.assertEqual(res.data["payment_status"], "PAID")
+        self.assertEqual(len(res.data["payments"]), 1)
+        self.assertIsNotNone(res.data["receipt"])
+
+        self.assertEqual(self.client.get(f"{self.BASE}/999999/").status_code, 404)
+
+    def test_sale_detail_renders_missing_document_for_older_sales(self):
+        sale = create_sale(
+            cashier=self.cashier1,
+            payment_method=Sale.PaymentMethod.CASH,
+            items=[{"product_id": self.product.id, "quantity": 2}],
+        )
+        SaleDocument.objects.filter(sale=sale).delete()
+
+        self.client.force_authenticate(user=self.owner)
+        res = self.client.get(f"{self.BASE}/{sale.id}/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["total"], "120.00")
+        self.assertEqual(SaleDocument.objects.get(sale=sale).version, 1)
+
+        void_sale(sale_id=sale.id, voided_by=self.owner)
+        doc = SaleDocument.objects.get(sale=sale)
+        self.assertEqual((doc.version, doc.body["status"]), (2, "VOIDED"))
+
+    def test_search_api_matches_receipt_prefix_phone_and_name(self):
+        paid = create_sale(
+            cashier=self.cashier1,
+            payment_method=Sale.PaymentMethod.CASH,
+            customer_name="Jane Wanjiku",
+            customer_phone="0712345678",
+            items=[{"product_id": self.product.id, "quantity": 1}],
+        )
+        credit = self._credit_sale(1, phone="0722000111")
+        receipt_number = Receipt.objects.get(sale=paid).receipt_number
+        invoice_number = Invoice.objects.get(sale=credit).invoice_number
+
+        self.client.force_authenticate(user=self.cashier2)
+
+        res = self.client.get(f"{self.BASE}/search/", {"q": receipt_number.lower()})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([(r["id"], r["match"]) for r in res.data["results"]], [(paid.id, "receipt")])
+        self.assertEqual(res.data["results"][0]["receipt_number"], receipt_number)
+
+        res = self.client.get(f"{self.BASE}/search/", {"q": invoice_number[:-3]})
+        self.assertIn((credit.id, "invoice"), [(r["id"], r["match"]) for r in res.data["results"]])
+
+        res = self.client.get(f"{self.BASE}/search/", {"q": "0712 345"})
+        self.assertEqual([r["id"] for r in res.data["results"]], [paid.id])
+
+        # Same customer typed in international form finds the sale entered locally.
+        for q in ("+254712345678", "254 712 345", "00254712"):
+            res = self.client.get(f"{self.BASE}/search/", {"q": q})
+            self.assertEqual([(r["id"], r["match"]) for r in res.data["results"]], [(paid.id, "phone")])
+
+        res = self.client.get(f"{self.BASE}/search/", {"q": "wanjiku"})
+        self.assertEqual([(r["id"], r["match"]) for r in res.data["results"]], [(paid.id, "name")])
+
+        self.assertEqual(self.client.get(f"{self.BASE}/search/", {"q": " "}).status_code, 400)
+
+    def test_shift_keeps_running_totals_and_closes_with_z_report(self):
+        self.client.force_authenticate(user=self.cashier1)
+        res = self.client.post(f"{self.BASE}/shifts/open/", {"opening_float": "500.00"}, format="json")
+        self.assertEqual(res.status_code, 201)
+        shift_id = res.data["id"]
+        self.assertEqual(self.client.post(f"{self.BASE}/shifts/open/", {}, format="json").status_code, 400)
+
+        cash_sale = create_sale(
+            cashier=self.cashier1,
+            payment_method=Sale.PaymentMethod.CASH,
+            items=[{"product_id": self.product.id, "quantity": 2}],
+        )
+        credit_sale = self._credit_sale(1)
+        add_payment(sale_id=credit_sale.id, received_by=self.cashier1, method=Sale.PaymentMethod.MPESA, amount=Decimal("60.00"))
+        void_sale(sale_id=cash_sale.id, voided_by=self.cashier1)
+        create_sale(  # another cashier's sale stays off this shift
+            cashier=self.cashier2,
+            payment_method=Sale.PaymentMethod.CASH,
+            items=[{"product_id": self.product.id, "quantity": 1}],
+        )
+
+        self.assertEqual(cash_sale.shift_id, shift_id)
+        self.assertEqual(Payment.objects.get(sale=credit_sale).shift_id, shift_id)
+
+        with self.assertNumQueries(4):  # lock + close, inside the test's savepoint pair
+            res = self.client.post(f"{self.BASE}/shifts/close/", {"counted_cash": "490.00"}, format="json")
+        self.assertEqual(res.status_code, 200)
+        report = res.data
+        self.assertEqual((report["sales_count"], report["sales_total"]), (2, "180.00"))
+        self.assertEqual(report["credit_issued"], "60.00")
+        self.assertEqual((report["voids_count"], report["voids_total"], report["refunds_total"]), (1, "120.00", "120.00"))
+        self.assertEqual((report["cash_collected"], report["mpesa_collected"]), ("0.00", "60.00"))
+        self.assertEqual((report["expected_cash"], report["cash_variance"]), ("500.00", "-10.00"))
+        self.assertIsNotNone(report["closed_at"])
+
+        self.assertEqual(self.client.get(f"{self.BASE}/shifts/current/").status_code, 404)
+        self.assertEqual(self.client.get(f"{self.BASE}/shifts/{shift_id}/").data["sales_total"], "180.00")
+        self.client.force_authenticate(user=self.cashier2)
+        self.assertEqual(self.client.get(f"{self.BASE}/shifts/{shift_id}/").status_code, 404)
+
+    def test_void_refunds_each_payment_method_it_was_paid_with(self):
+        shift = open_shift(cashier=self.cashier1)
+        sale = create_sale(
+            cashier=self.cashier1,
+            payment_type=Sale.PaymentType.CREDIT,
+            payment_method=Sale.PaymentMethod.CASH,
+            amount_paid=Decimal("50.00"),
+            due_date=timezone.localdate(),
+            items=[{"product_id": self.product.id, "quantity": 2}],
+        )
+        add_payment(sale_id=sale.id, received_by=self.cashier1, method=Sale.PaymentMethod.MPESA, amount=Decimal("40.00"))
+        return_sale_items(
+            sale_id=sale.id, items=[{"sale_item_id": sale.items.get().id, "quantity": 1}],
+            returned_by=self.cashier1, refund_method=Sale.PaymentMethod.MPESA,
+        )
+        void_sale(sale_id=sale.id, voided_by=self.cashier1)
+
+        shift.refresh_from_db()
+        self.assertEqual((shift.cash_collected, shift.mpesa_collected), (Decimal("0.00"), Decimal("0.00")))
+        self.assertEqual(shift.refunds_total, Decimal("90.00"))
+
+    def test_overdue_sweep_flags_only_expired_open_invoices_and_refreshes_documents(self):
+        today = timezone.localdate()
+        expired = self._credit_sale(1)
+        paid = self._credit_sale(1)
+        current = self._credit_sale(1)
+        Invoice.objects.filter(sale__in=[expired, paid]).update(due_date=today - timezone.timedelta(days=3))
+        add_payment(sale_id=paid.id, received_by=self.cashier1, method="CASH", amount=Decimal("60.00"))
+
+        self.assertEqual(mark_overdue_invoices(chunk_size=1), 1)
+        self.assertEqual(
+            dict(Invoice.objects.values_list("sale_id", "status")),
+            {expired.id: Invoice.Status.OVERDUE, paid.id: Invoice.Status.PAID, current.id: Invoice.Status.OPEN},
+        )
+        self.assertEqual(SaleDocument.objects.get(sale=expired).body["invoice"]["status"], "OVERDUE")
+        self.assertEqual(mark_overdue_invoices(), 0)
+
+    def _history_file(self, suffix, text):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_history_loads_sales_without_signals_and_applies_stock_once(self):
+        Notification.objects.all().delete()
+        year = timezone.now().year
+        records = [
+            {
+                "ref": "A1", "created_at": "2023-05-01T10:00:00", "cashier": "cash1",
+                "receipt_number": f"IMP-{year}-000900",
+                "items": [{"sku": "MILK-1", "quantity": 3, "unit_price": "60.00"}],
+            },
+            {
+                "ref": "A2", "created_at": "2023-05-02T11:00:00", "payment_type": "CREDIT",
+                "invoice_number": "INV-2023-000010", "due_date": "2023-06-01",
+                "customer_name": "Jane", "customer_phone": "0712345678",
+                "items": [{"sku": "MILK-1", "quantity": 2, "unit_price": "60.00", "discount": "10.00"}],
+                "payments": [{"method": "MPESA", "amount": "50.00", "reference": "QX1"}],
+            },
+            {
+                "ref": "A3", "created_at": "2023-05-03T12:00:00", "status": "VOIDED",
+                "items": [{"sku": "MILK-1", "quantity": 4, "unit_price": "60.00"}],
+            },
+        ]
+        path = self._history_file(".ndjson", "\n".join(json.dumps(r) for r in records))
+        DocumentSequence.objects.create(prefix="IMP", year=year, last_value=5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("import_history", "sales", path, "--cashier", "cash2", "--chunk-size", "2", stdout=io.StringIO())
+
+        self.assertEqual(Sale.objects.count(), 3)
+        credit = Sale.objects.get(customer_phone="0712345678")
+        self.assertEqual(credit.cashier, self.cashier2)
+        self.assertEqual((credit.subtotal, credit.discount, credit.total), (Decimal("120.00"), Decimal("10.00"), Decimal("110.00")))
+        self.assertEqual((credit.amount_paid, credit.payment_status), (Decimal("50.00"), Sale.PaymentStatus.PARTIAL))
+        self.assertEqual(credit.invoice.status, Invoice.Status.OVERDUE)
+        self.assertEqual(credit.created_at.date().isoformat(), "2023-05-02")
+        self.assertEqual(Payment.objects.get(sale=credit).reference, "QX1")
+        self.assertEqual(SaleItem.objects.get(sale=credit).line_total, Decimal("110.00"))
+
+        # 50 seeded - 3 - 2 (the voided sale nets to zero), applied in one pass
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 45)
+        self.assertEqual(StockMovement.objects.filter(notes__startswith="Imported").count(), 4)
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(DocumentSequence.objects.get(prefix="IMP", year=year).last_value, 900)
+        self.assertEqual(generate_receipt_number(prefix="IMP"), f"IMP-{year}-000901")
+        self.assertEqual(ImportCheckpoint.objects.get().position, 3)
+
+        # a re-run resumes past the last committed record instead of duplicating
+        call_command("import_history", "sales", path, "--cashier", "cash2", stdout=io.StringIO())
+        self.assertEqual(Sale.objects.count(), 3)
+
+    def test_import_history_balances_stock_clamped_at_zero_with_an_adjustment(self):
+        record = {
+            "ref": "B1", "created_at": "2023-05-01T10:00:00", "cashier": "cash1",
+            "items": [{"sku": "MILK-1", "quantity": 58, "unit_price": "60.00"}],
+        }
+        path = self._history_file(".ndjson", json.dumps(record))
+        out = io.StringIO()
+        call_command("import_history", "sales", path, stdout=out)
+
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 0)
+        self.assertIn("MILK-1", out.getvalue())
+        adjustment = StockMovement.objects.get(movement_type=StockMovement.MovementType.ADJUSTMENT)
+        self.assertEqual((adjustment.direction, adjustment.quantity), (StockMovement.Direction.IN, 8))
+
+        signed = sum(
+            m.quantity if m.direction == StockMovement.Direction.IN else -m.quantity
+            for m in StockMovement.objects.filter(product=self.product)
+        )
+        self.assertEqual(signed, self.inv.quantity)
+
+    def test_import_history_resumes_csv_from_checkpoint_after_bad_record(self):
+        rows = [
+            "ref,created_at,cashier,sku,quantity,unit_price",
+            "B1,2023-01-01T09:00:00,cash1,MILK-1,1,60.00",
+            "B1,2023-01-01T09:00:00,cash1,MILK-1,1,60.00",
+            "B2,2023-01-02T09:00:00,cash1,NOPE,1,60.00",
+        ]
+        path = self._history_file(".csv", "\n".join(rows) + "\n")
+
+        with self.assertRaises(CommandError):
+            call_command("import_history", "sales", path, "--name", "legacy", "--chunk-size", "1", stdout=io.StringIO())
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(Sale.objects.get().items.count(), 2)
+        self.assertEqual(ImportCheckpoint.objects.get(name="legacy").stock_deltas, {str(self.product.id): -2})
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 50)
+
+        with open(path, "w") as f:
+            f.write("\n".join(rows).replace("NOPE", "MILK-1") + "\n")
+        call_command("import_history", "sales", path, "--name", "legacy", "--chunk-size", "1", stdout=io.StringIO())
+
+        self.assertEqual(Sale.objects.count(), 2)
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 47)
+        checkpoint = ImportCheckpoint.objects.get(name="legacy")
+        self.assertEqual((checkpoint.position, checkpoint.stock_deltas), (2, {}))
+        self.assertIsNotNone(checkpoint.finished_at)
+
+    def test_group_commit_isolates_failed_sale_and_resolves_each_ticket(self):
+        other = Product.objects.create(name="Bread", sku="BREAD-1", selling_price=Decimal("55.00"), is_active=True)
+        pay_now = {"payment_type": "PAY_NOW", "payment_method": "CASH"}
+        tickets = [
+            _Ticket(self.cashier1, {**pay_now, "items": [{"product_id": self.product.id, "quantity": 2}]}),
+            _Ticket(self.cashier2, {**pay_now, "items": [{"product_id": other.id, "quantity": 1}]}),
+            _Ticket(self.cashier2, {**pay_now, "items": [{"product_id": self.product.id, "quantity": 30}]}),
+            _Ticket(self.cashier1, {**pay_now, "items": [{"product_id": self.product.id, "quantity": 30}]}),
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            commit_group(tickets)
+
+        self.assertTrue(all(t.done.is_set() for t in tickets))
+        milk, bread, bulk_milk, too_much_milk = (t.result for t in tickets)
+        self.assertIsInstance(milk, Sale)
+        self.assertEqual(milk.cashier, self.cashier1)
+        self.assertIsInstance(bread, InsufficientStock)
+        self.assertEqual(bulk_milk.cashier, self.cashier2)
+        self.assertIn("Insufficient stock for MILK-1", str(too_much_milk))
+
+        self.assertEqual(Sale.objects.count(), 2)
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 18)
+        self.assertTrue(SaleDocument.objects.filter(sale=bulk_milk).exists())
+
+    def test_group_commit_crash_resolves_the_group_and_waits_are_bounded(self):
+        tickets = [_Ticket(self.cashier1, {}), _Ticket(self.cashier2, {})]
+        for ticket in tickets:
+            _queue.put(ticket)
+        with mock.patch("sales.group_commit.commit_group", side_effect=RuntimeError("boom")):
+            _commit_next_group()
+        self.assertEqual([str(t.result) for t in tickets if t.done.is_set()], ["boom", "boom"])
+
+        data = {"payment_type": "PAY_NOW", "payment_method": "CASH", "items": [{"product_id": self.product.id, "quantity": 1}]}
+        with override_settings(SALES_GROUP_COMMIT=True, SALES_GROUP_COMMIT_TIMEOUT_SECONDS=0.01), \
+                mock.patch("sales.group_commit._ensure_committer"):
+            with self.assertRaises(GroupCommitTimeout):
+                submit_sale(cashier=self.cashier1, data=data)
+        abandoned = _queue.get_nowait()
+        self.assertEqual(abandoned.state, _Ticket.ABANDONED)
+        commit_group([abandoned])
+        self.assertFalse(abandoned.done.is_set())
+        self.assertFalse(Sale.objects.exists())
+
+        claimed = _Ticket(self.cashier1, data)
+        self.assertTrue(claimed.claim())
+        self.assertFalse(claimed.abandon())
+
+    def test_group_commit_timeout_then_idempotent_retry_records_the_sale_once(self):
+        self.client.force_authenticate(user=self.cashier1)
+        payload = {"payment_method": "CASH", "items": [{"product_id": self.product.id, "quantity": 3}]}
+
+        with override_settings(SALES_GROUP_COMMIT=True, SALES_GROUP_COMMIT_TIMEOUT_SECONDS=0.01), \
+                mock.patch("sales.group_commit._ensure_committer"):
+            res = self.client.post(f"{self.BASE}/create/", payload, format="json", HTTP_IDEMPOTENCY_KEY="slow-1")
+        self.assertEqual(res.status_code, 503)
+
+        retry = self.client.post(f"{self.BASE}/create/", payload, format="json", HTTP_IDEMPOTENCY_KEY="slow-1")
+        self.assertEqual(retry.status_code, 201)
+
+        # The committer reaching the timed-out ticket afterwards must not record it again.
+        commit_group([_queue.get_nowait()])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.quantity, 47)
+
+    def test_sale_items_keep_product_snapshot_after_rename(self):
+        sale = create_sale(
+            cashier=self.cashier1,
+            payment_method=Sale.PaymentMethod.CASH,
+            items=[{"product_id": self.product.id, "quantity": 2}],
+        )
+        Product.objects.filter(pk=self.product.pk).update(name="Whole Milk 1L", sku="MILK-1L", cost_price=Decimal("50.00"))
+
+        item = SaleItem.objects.get(sale=sale)
+        self.assertEqual((item.product_name_snapshot, item.sku_snapshot), ("Milk", "MILK-1"))
+        self.assertEqual(item.unit_cost_snapshot, Decimal("45.00"))
+
+        self.client.force_authenticate(user=self.owner)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(f"{self.BASE}/", {"fields": "id", "include": "items"})
+        self.assertFalse(any("catalog_product" in q["sql"] for q in ctx.captured_queries))
+        self.assertEqual(res.data["results"][0]["items"][0]["product_name"], "Milk")
+
+        void_sale(sale_id=sale.id, voided_by=self.owner)
+        self.assertEqual(SaleDocument.objects.get(sale=sale).body["items"][0]["sku"], "MILK-1")
+
+
+@override_settings(SALES_GROUP_COMMIT=True, SALES_GROUP_COMMIT_WINDOW_MS=50)
+class GroupCommitQueueTests(TransactionTestCase):
+    def setUp(self):
+        self.cashier = User.objects.create_user(username="cash1", password="pass1234")
+        self.product = Product.objects.create(
+            name="Milk", sku="MILK-1", selling_price=Decimal("60.00"), cost_price=Decimal("45.00"), is_active=True,
+        )
+        record_movement(
+            product=self.product,
+            movement_type=StockMovement.MovementType.SUPPLY,
+            direction=StockMovement.Direction.IN,
+            quantity=5,
+        )
+
+    def test_concurrent_submissions_each_get_their_own_committed_result(self):
+        results = [None] * 8
+
+        def checkout(index):
+            try:
+                results[index] = submit_sale(cashier=self.cashier, data={
+                    "payment_type": "PAY_NOW",
+                    "payment_method": "CASH",
+                    "items": [{"product_id": self.product.id, "quantity": 1}],
+                })
+            except InsufficientStock as e:
+                results[index] = e
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(i,)) for i in range(len(results))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        sales = [r for r in results if isinstance(r, Sale)]
+        self.assertEqual(len(sales), 5)
+        self.assertEqual(sum(isinstance(r, InsufficientStock) for r in results), 3)
+        self.assertEqual(set(Sale.objects.values_list("id", flat=True)), {s.id for s in sales})
+        self.assertEqual(Inventory.objects.get(product=self.product).quantity, 0)
+
+
+class StressHarnessTests(TransactionTestCase):
+    def test_short_multi_process_run_reports_and_keeps_invariants(self):
+        report = run_stress(
+            isolation="read_committed", workers=2, products=2, stock=50, ops_per_worker=15, duration=0, seed=1,
+        )
+
+        self.assertEqual(report["operations"], 30)
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(report["invariant_violations"], [])
+        self.assertGreater(report["by_operation"]["sale"]["count"], 0)
+        self.assertGreaterEqual(report["p99_ms"], report["p50_ms"])
+        self.assertFalse(Sale.objects.exists())  # fixtures removed
@@ -1,11 +1,41 @@
 from django.urls import path
 
-from .views import SaleCreateAPIView, SaleDetailAPIView, SaleListAPIView, SaleVoidAPIView, SaleAddPaymentAPIView
+from .views import (
+    CustomerListAPIView,
+    CustomerPaymentAllocateAPIView,
+    CustomerStatementAPIView,
+    MpesaCallbackAPIView,
+    SaleAddPaymentAPIView,
+    SaleBatchCreateAPIView,
+    SaleCreateAPIView,
+    SaleDetailAPIView,
+    SaleListAPIView,
+    SaleQuoteAPIView,
+    SaleReturnAPIView,
+    SaleSearchAPIView,
+    SaleVoidAPIView,
+    ShiftCloseAPIView,
+    ShiftCurrentAPIView,
+    ShiftDetailAPIView,
+    ShiftOpenAPIView,
+)
 
 urlpatterns = [
     path("", SaleListAPIView.as_view(), name="sale-list"),               
     path("create/", SaleCreateAPIView.as_view(), name="sale-create"),    
+    path("batch/", SaleBatchCreateAPIView.as_view(), name="sale-batch-create"),
+    path("quote/", SaleQuoteAPIView.as_view(), name="sale-quote"),
+    path("search/", SaleSearchAPIView.as_view(), name="sale-search"),
+    path("shifts/open/", ShiftOpenAPIView.as_view(), name="shift-open"),
+    path("shifts/close/", ShiftCloseAPIView.as_view(), name="shift-close"),
+    path("shifts/current/", ShiftCurrentAPIView.as_view(), name="shift-current"),
+    path("shifts/<int:pk>/", ShiftDetailAPIView.as_view(), name="shift-detail"),
+    path("customers/", CustomerListAPIView.as_view(), name="customer-list"),
+    path("customers/<str:phone>/", CustomerStatementAPIView.as_view(), name="customer-statement"),
+    path("mpesa/callback/", MpesaCallbackAPIView.as_view(), name="mpesa-callback"),
+    path("payments/allocate/", CustomerPaymentAllocateAPIView.as_view(), name="sale-payment-allocate"),
     path("<int:pk>/", SaleDetailAPIView.as_view(), name="sale-detail"),  
     path("<int:sale_id>/void/", SaleVoidAPIView.as_view(), name="sale-void"), 
     path("<int:sale_id>/payments/", SaleAddPaymentAPIView.as_view(), name="sale-add-payment"),
+    path("<int:sale_id>/returns/", SaleReturnAPIView.as_view(), name="sale-return"),
 ]
\ No newline at end of file
@@ -1,22 +1,121 @@
-from datetime import datetime
-from django.utils import timezone
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
 from django.db.models import Max
+from django.utils import timezone
 
-from .models import Receipt
+from .models import DocumentSequence, Invoice, Receipt
 
 
-def generate_receipt_number(prefix="RCPT"):
-    year = datetime.now().year
-    last = Receipt.objects.filter(receipt_number__startswith=f"{prefix}-{year}-").aggregate(
-        max_num=Max("receipt_number")
-    )["max_num"]
+_local = threading.local()
+
+
+class _Block:
+    """
+    A range of numbers reserved from DocumentSequence by this thread.
 
+    A block reserved inside a transaction is only trusted once that
+    transaction commits (confirm runs on commit). Until then it is usable
+    only while the counter row is still the version the reservation wrote
+    (same xmin); if the transaction, or a savepoint around the
+    reservation, rolled back, the row reverted, so the block is dropped
+    instead of being handed out twice.
+    """
+
+    def __init__(self, sequence_id: int, start: int, end: int, version: str):
+        self.sequence_id = sequence_id
+        self.next = start
+        self.end = end
+        self.version = version
+        self.confirmed = False
+
+    def confirm(self):
+        self.confirmed = True
+
+    def usable(self) -> bool:
+        if self.next > self.end:
+            return False
+        if self.confirmed:
+            return True
+        if transaction.get_autocommit():
+            # The reserving transaction ended without committing.
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT 1 FROM {DocumentSequence._meta.db_table} WHERE id = %s AND xmin::text = %s",
+                [self.sequence_id, self.version],
+            )
+            return cursor.fetchone() is not None
+
+
+def _legacy_max(model, field: str, prefix: str, year: int) -> int:
+    """
+    Highest sequence already issued under the old Max()-scan scheme, used
+    once to seed a new counter row.
+    """
+    last = model.objects.filter(**{f"{field}__startswith": f"{prefix}-{year}-"}).aggregate(
+        max_num=Max(field)
+    )["max_num"]
     if not last:
-        next_seq = 1
-    else:
-        next_seq = int(last.split("-")[-1]) + 1
+        return 0
+    try:
+        return int(last.split("-")[-1])
+    except ValueError:
+        return 0
+
+
+def _reserve_block(prefix: str, year: int, size: int, seed) -> _Block:
+    with transaction.atomic():
+        seq = DocumentSequence.objects.select_for_update().filter(prefix=prefix, year=year).first()
+        if seq is None:
+            try:
+                with transaction.atomic():
+                    seq = DocumentSequence.objects.create(prefix=prefix, year=year, last_value=seed())
+            except IntegrityError:
+                seq = DocumentSequence.objects.select_for_update().get(prefix=prefix, year=year)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {DocumentSequence._meta.db_table} SET last_value = last_value + %s "
+                "WHERE id = %s RETURNING last_value, xmin::text",
+                [size, seq.pk],
+            )
+            end, version = cursor.fetchone()
+
+    return _Block(seq.pk, end - size + 1, end, version)
+
+
+def next_document_number(prefix: str, seed=lambda: 0) -> str:
+    """
+    Allocate the next number in the prefix's series for the current year.
+
+    Numbers come from a per-thread block, so the counter row is only
+    locked once every DOCUMENT_NUMBER_BLOCK_SIZE allocations. Numbers are
+    unique but may have gaps (unused blocks, rolled-back sales).
+    """
+    year = timezone.localdate().year
+    blocks = getattr(_local, "blocks", None)
+    if blocks is None:
+        blocks = _local.blocks = {}
+
+    block = blocks.get((prefix, year))
+    if block is None or not block.usable():
+        size = max(1, int(getattr(settings, "DOCUMENT_NUMBER_BLOCK_SIZE", 20)))
+        block = _reserve_block(prefix, year, size, seed)
+        transaction.on_commit(block.confirm)
+        blocks[(prefix, year)] = block
+
+    n = block.next
+    block.next += 1
+    return f"{prefix}-{year}-{n:06d}"
+
+
+def generate_receipt_number(prefix="RCPT"):
+    year = timezone.localdate().year
+    return next_document_number(prefix, seed=lambda: _legacy_max(Receipt, "receipt_number", prefix, year))
 
-    return f"{prefix}-{year}-{next_seq:06d}"
 
 def generate_invoice_number(prefix="INV"):
-    return f"{prefix}-{timezone.now().strftime('%Y%m%d-%H%M%S-%f')}"
\ No newline at end of file
+    year = timezone.localdate().year
+    return next_document_number(prefix, seed=lambda: _legacy_max(Invoice, "invoice_number", prefix, year))
@@ -1,51 +1,195 @@
+import hmac
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import AllowAny, IsAuthenticated
 
-from .models import Sale
-from .serializers import SaleCreateSerializer, SaleDetailSerializer, AddPaymentSerializer
-from .services import create_sale, InsufficientStock, void_sale, AlreadyVoided, add_payment
+from .models import Customer, Sale, Shift
+from .serializers import (
+    AddPaymentSerializer,
+    AllocatePaymentSerializer,
+    CartQuoteSerializer,
+    CustomerSerializer,
+    SaleCreateSerializer,
+    SaleDetailSerializer,
+    SaleReturnCreateSerializer,
+    SaleReturnSerializer,
+    SaleSummarySerializer,
+    ShiftCloseSerializer,
+    ShiftOpenSerializer,
+    ShiftSerializer,
+    attach_sale_relations,
+    parse_sale_list_params,
+)
+from .services import (
+    AlreadyVoided,
+    InsufficientStock,
+    add_payment,
+    allocate_customer_payment,
+    create_sales_batch,
+    quote_cart,
+    return_sale_items,
+    void_sale,
+)
+from .customers import normalize_phone
+from .documents import get_sale_document
+from .group_commit import GroupCommitTimeout, submit_sale
+from .mpesa import MpesaCallbackError, enqueue_confirmations
+from .pagination import SaleCursorPagination
+from .search import search_sales
+from .shifts import ShiftError, close_shift, open_shift
+from .parsers import NDJSONParser
+from .idempotency import idempotent
 from users.permissions import IsCashier,  IsOwner
 
+def _day_start(value: str, param: str):
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({param: "Use YYYY-MM-DD."})
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
 class SaleCreateAPIView(APIView):
     permission_classes = [IsAuthenticated, IsCashier]
 
+    @idempotent
     def post(self, request):
         serializer = SaleCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        v = serializer.validated_data
-
         try:
-            sale = create_sale(
-                cashier=request.user,
-                payment_type=v["payment_type"],
-                payment_method=v.get("payment_method"),
-                amount_paid=v.get("amount_paid"),
-                due_date=v.get("due_date"),
-                customer_name=v.get("customer_name", ""),
-                customer_phone=v.get("customer_phone", ""),
-                items=v["items"],
-            )
+            sale = submit_sale(cashier=request.user, data=serializer.validated_data)
         except InsufficientStock as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except ValueError as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except GroupCommitTimeout as e:
+            return Response({"detail": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response(get_sale_document(sale.id).body, status=status.HTTP_201_CREATED)
+
+
+class SaleQuoteAPIView(APIView):
+    """
+    Price the cart while the cashier is scanning. Read-only: no sale is
+    created and no inventory rows are locked.
+    """
+    permission_classes = [IsAuthenticated, IsCashier]
+
+    def post(self, request):
+        serializer = CartQuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(quote_cart(serializer.validated_data["items"]), status=status.HTTP_200_OK)
+
+
+class SaleBatchCreateAPIView(APIView):
+    """
+    Offline POS sync: a JSON array (or NDJSON, one sale per line) of sale
+    payloads in the same shape as POST /create/.
+
+    Every sale gets its own result entry; invalid or out-of-stock sales are
+    reported without rejecting the rest of the batch.
+    """
+    permission_classes = [IsAuthenticated, IsCashier]
+    parser_classes = [JSONParser, NDJSONParser]
+    max_sales = 1000
+
+    @idempotent
+    def post(self, request):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({"detail": "Expected a list of sales."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.max_sales:
+            return Response(
+                {"detail": f"At most {self.max_sales} sales per batch."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = [None] * len(rows)
+        valid = []
+        for index, row in enumerate(rows):
+            serializer = SaleCreateSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {"index": index, "status": "failed", "errors": serializer.errors}
 
-        return Response(SaleDetailSerializer(sale).data, status=status.HTTP_201_CREATED)
-class SaleDetailAPIView(generics.RetrieveAPIView):
+        outcomes = create_sales_batch(cashier=request.user, sales=[v for _, v in valid])
+
+        for (index, _), outcome in zip(valid, outcomes):
+            if isinstance(outcome, Sale):
+                results[index] = {
+                    "index": index,
+                    "status": "created",
+                    "sale_id": outcome.id,
+                    "total": str(outcome.total),
+                    "payment_status": outcome.payment_status,
+                }
+            else:
+                results[index] = {"index": index, "status": "failed", "detail": outcome}
+
+        created = sum(1 for r in results if r["status"] == "created")
+        return Response(
+            {"created": created, "failed": len(results) - created, "results": results},
+            status=status.HTTP_200_OK,
+        )
+
+
+class SaleDetailAPIView(APIView):
+    """
+    Served from the sale's stored document (one primary-key read).
+    The ETag carries the document version; a matching If-None-Match gets 304.
+    """
     permission_classes = [IsAuthenticated, IsCashier]
-    queryset = Sale.objects.prefetch_related("items__product", "payments").select_related("receipt", "invoice", "cashier")
-    serializer_class = SaleDetailSerializer
+
+    def get(self, request, pk: int):
+        try:
+            doc = get_sale_document(pk)
+        except Sale.DoesNotExist:
+            return Response({"detail": "Sale not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = f'"{doc.sale_id}-{doc.version}"'
+        if etag in (t.strip() for t in request.headers.get("If-None-Match", "").split(",")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        return Response(doc.body, headers={"ETag": etag})
 
 class SaleListAPIView(generics.ListAPIView):
+    """
+    Filters:
+      ?status=COMPLETED
+      ?cashier_id=3
+      ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD  (inclusive, store-local days)
+    Shape:
+      ?fields=id,total,status                   (flat summary columns)
+      ?include=items,payments,receipt,invoice   (nested, loaded per page)
+    Paged with a cursor: follow "next"/"previous".
+    """
     permission_classes = [IsAuthenticated, IsCashier]
-    serializer_class = SaleDetailSerializer
+    serializer_class = SaleSummarySerializer
+    pagination_class = SaleCursorPagination
+    filter_backends = []
+
+    def list(self, request, *args, **kwargs):
+        fields, include = parse_sale_list_params(request.query_params)
+        qs = self.get_queryset().values(*SaleSummarySerializer.value_columns(fields))
+
+        rows = attach_sale_relations(self.paginate_queryset(qs), include)
+        data = SaleSummarySerializer(rows, many=True, fields=fields, include=include).data
+        return self.get_paginated_response(data)
 
     def get_queryset(self):
-        qs = Sale.objects.prefetch_related("items__product", "payments").select_related("receipt", "invoice", "cashier")
+        qs = Sale.objects.all()
 
         status_q = self.request.query_params.get("status")
         cashier_id = self.request.query_params.get("cashier_id")
@@ -56,10 +200,13 @@ class SaleListAPIView(generics.ListAPIView):
             qs = qs.filter(status=status_q)
         if cashier_id:
             qs = qs.filter(cashier_id=cashier_id)
+
+        # Compare the raw column against day boundaries so the
+        # (…, created_at) indexes can be used.
         if date_from:
-            qs = qs.filter(created_at__date__gte=date_from)
+            qs = qs.filter(created_at__gte=_day_start(date_from, "date_from"))
         if date_to:
-            qs = qs.filter(created_at__date__lte=date_to)
+            qs = qs.filter(created_at__lt=_day_start(date_to, "date_to") + timedelta(days=1))
 
         user = self.request.user
         is_owner = user.is_superuser or getattr(getattr(user, "profile", None), "role", None) == "OWNER"
@@ -69,6 +216,29 @@ class SaleListAPIView(generics.ListAPIView):
         return qs
 
 
+class SaleSearchAPIView(APIView):
+    """
+    Look up sales by receipt/invoice number (exact or prefix), customer
+    phone (prefix) or customer name (fuzzy).
+      ?q=RCPT-2026-000123 | INV-2026 | 0712 | wanjiku
+      ?limit=20  (max 50)
+    """
+    permission_classes = [IsAuthenticated, IsCashier]
+
+    def get(self, request):
+        q = request.query_params.get("q", "").strip()
+        if not q:
+            return Response({"detail": "q is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = min(max(int(request.query_params.get("limit", 20)), 1), 50)
+        except ValueError:
+            limit = 20
+
+        rows = search_sales(q, limit=limit, columns=SaleSummarySerializer.value_columns())
+        return Response({"results": SaleSummarySerializer(rows, many=True, include=["match"]).data})
+
+
 class SaleVoidAPIView(APIView):
     """
     OWNER-only by default (safe).
@@ -86,9 +256,45 @@ class SaleVoidAPIView(APIView):
 
         return Response(SaleDetailSerializer(sale).data, status=status.HTTP_200_OK)
     
+class SaleReturnAPIView(APIView):
+    """
+    Return some quantity of individual sale lines (partial void).
+    """
+    permission_classes = [IsAuthenticated, IsCashier]
+
+    @idempotent
+    def post(self, request, sale_id: int):
+        s = SaleReturnCreateSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+
+        try:
+            sale_return = return_sale_items(
+                sale_id=sale_id,
+                items=s.validated_data["items"],
+                returned_by=request.user,
+                refund_method=s.validated_data.get("refund_method"),
+                notes=s.validated_data.get("notes", ""),
+            )
+        except Sale.DoesNotExist:
+            return Response({"detail": "Sale not found."}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        sale = (
+            Sale.objects.prefetch_related("items", "payments")
+            .select_related("receipt", "invoice", "cashier")
+            .get(id=sale_id)
+        )
+        return Response(
+            {"return": SaleReturnSerializer(sale_return).data, "sale": SaleDetailSerializer(sale).data},
+            status=status.HTTP_201_CREATED,
+        )
+
+
 class SaleAddPaymentAPIView(APIView):
     permission_classes = [IsAuthenticated, IsCashier]
 
+    @idempotent
     def post(self, request, sale_id: int):
         s = AddPaymentSerializer(data=request.data)
         s.is_valid(raise_exception=True)
@@ -106,4 +312,192 @@ class SaleAddPaymentAPIView(APIView):
         except ValueError as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(SaleDetailSerializer(sale).data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(SaleDetailSerializer(sale).data, status=status.HTTP_200_OK)
+
+
+class CustomerPaymentAllocateAPIView(APIView):
+    """
+    Settle a customer's open credit sales with one payment, oldest first.
+    """
+    permission_classes = [IsAuthenticated, IsCashier]
+
+    @idempotent
+    def post(self, request):
+        s = AllocatePaymentSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+
+        try:
+            applied = allocate_customer_payment(
+                customer_phone=s.validated_data["customer_phone"],
+                received_by=request.user,
+                method=s.validated_data["method"],
+                amount=s.validated_data["amount"],
+                reference=s.validated_data.get("reference", ""),
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "allocated": str(sum((share for _, share in applied), 0)),
+            "sales": [{
+                "sale_id": sale.id,
+                "applied": str(share),
+                "balance_due": str(max(0, sale.total - sale.amount_paid)),
+                "payment_status": sale.payment_status,
+            } for sale, share in applied],
+        }, status=status.HTTP_201_CREATED)
+
+
+
+class ShiftOpenAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsCashier]
+
+    def post(self, request):
+        serializer = ShiftOpenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            shift = open_shift(cashier=request.user, opening_float=serializer.validated_data["opening_float"])
+        except ShiftError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(ShiftSerializer(shift).data, status=status.HTTP_201_CREATED)
+
+
+class ShiftCloseAPIView(APIView):
+    """
+    Close the caller's open shift and return its Z-report.
+    """
+    permission_classes = [IsAuthenticated, IsCashier]
+
+    def post(self, request):
+        serializer = ShiftCloseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            shift = close_shift(cashier=request.user, counted_cash=serializer.validated_data.get("counted_cash"))
+        except ShiftError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(ShiftSerializer(shift).data, status=status.HTTP_200_OK)
+
+
+class ShiftCurrentAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsCashier]
+
+    def get(self, request):
+        shift = Shift.objects.select_related("cashier").filter(cashier=request.user, closed_at__isnull=True).first()
+        if shift is None:
+            return Response({"detail": "No open shift."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ShiftSerializer(shift).data)
+
+
+class ShiftDetailAPIView(generics.RetrieveAPIView):
+    """
+    Z-report of any shift (OWNER) or of the caller's own shifts (CASHIER).
+    """
+    permission_classes = [IsAuthenticated, IsCashier]
+    serializer_class = ShiftSerializer
+
+    def get_queryset(self):
+        qs = Shift.objects.select_related("cashier")
+        user = self.request.user
+        is_owner = user.is_superuser or getattr(getattr(user, "profile", None), "role", None) == "OWNER"
+        if not is_owner:
+            qs = qs.filter(cashier=user)
+        return qs
+
+
+class CustomerListAPIView(generics.ListAPIView):
+    """
+    Customers, biggest balance first.
+      ?owing=1   only customers with an outstanding balance
+    """
+    permission_classes = [IsAuthenticated, IsCashier]
+    serializer_class = CustomerSerializer
+
+    def get_queryset(self):
+        qs = Customer.objects.order_by("-balance", "phone")
+        if self.request.query_params.get("owing") in ("1", "true"):
+            qs = qs.filter(balance__gt=0)
+        return qs
+
+
+class CustomerStatementAPIView(APIView):
+    """
+    GET: a customer's statement -- the stored balance/spend plus the open
+    (UNPAID/PARTIAL) sales making up the balance. Any phone format works.
+    PATCH (OWNER): name, credit_limit (null removes the limit).
+    """
+    def get_permissions(self):
+        if self.request.method == "PATCH":
+            return [IsOwner()]
+        return [IsAuthenticated(), IsCashier()]
+
+    def _customer(self, phone):
+        return Customer.objects.filter(phone=normalize_phone(phone)).first()
+
+    def get(self, request, phone: str):
+        customer = self._customer(phone)
+        if customer is None:
+            return Response({"detail": "Customer not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        open_sales = (
+            Sale.objects.filter(
+                customer=customer,
+                status=Sale.Status.COMPLETED,
+                payment_status__in=[Sale.PaymentStatus.UNPAID, Sale.PaymentStatus.PARTIAL],
+            )
+            .order_by("created_at", "id")
+            .values("id", "created_at", "due_date", "total", "amount_paid", "payment_status", "invoice__invoice_number")
+        )
+        return Response({
+            **CustomerSerializer(customer).data,
+            "open_sales": [{
+                "sale_id": row["id"],
+                "created_at": row["created_at"],
+                "due_date": row["due_date"],
+                "invoice_number": row["invoice__invoice_number"],
+                "total": str(row["total"]),
+                "amount_paid": str(row["amount_paid"]),
+                "balance_due": str(max(0, row["total"] - row["amount_paid"])),
+                "payment_status": row["payment_status"],
+            } for row in open_sales],
+        })
+
+    def patch(self, request, phone: str):
+        customer = self._customer(phone)
+        if customer is None:
+            return Response({"detail": "Customer not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = CustomerSerializer(customer, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+
+class MpesaCallbackAPIView(APIView):
+    """
+    M-Pesa C2B confirmation URL. Accepts one confirmation or a list; each
+    is stored once per TransID and applied to its sale in the background,
+    so the provider gets its answer after a single INSERT.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        # Fails closed: without a configured token only a DEBUG server accepts callbacks.
+        token = getattr(settings, "MPESA_CALLBACK_TOKEN", "")
+        if token:
+            if not hmac.compare_digest(request.query_params.get("token", ""), token):
+                return Response({"detail": "Invalid callback token."}, status=status.HTTP_403_FORBIDDEN)
+        elif not settings.DEBUG:
+            return Response({"detail": "M-Pesa callbacks are not configured."}, status=status.HTTP_403_FORBIDDEN)
+
+        payloads = request.data if isinstance(request.data, list) else [request.data]
+        try:
+            enqueue_confirmations(payloads)
+        except MpesaCallbackError as e:
+            return Response({"ResultCode": 1, "ResultDesc": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"ResultCode": 0, "ResultDesc": "Accepted"}, status=status.HTTP_200_OK)